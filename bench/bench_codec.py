@@ -0,0 +1,261 @@
+"""Codec and session benchmarks
+
+Times framing, PDU and message parse/pack, FEC and address list TLVs and a
+session taking a Label Mapping storm. Each case reports ops/s (and items/s
+where an op handles many prefixes or messages) plus the peak and retained
+bytes allocated by one op, measured with tracemalloc.
+
+    PYTHONPATH=./ python bench/bench_codec.py > baseline.json
+    PYTHONPATH=./ python bench/bench_codec.py --compare baseline.json
+
+Compare mode exits non-zero if any case got slower, or allocates more,
+than the baseline by more than --threshold.
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from array import array
+from ipaddress import IPv4Address
+from itertools import count
+
+from trasa.chopper import Chopper, BufferChopper
+from trasa.framer import PduFramer
+from trasa.ldp_pdu import LdpPdu, parse_ldp_pdu
+from trasa.ldp_message import LdpNotificationMessage, LdpHelloMessage, LdpInitialisationMessage, \
+    LdpAddressMessage, LdpAddressWithdrawMessage, LdpKeepaliveMessage, LdpLabelMappingMessage, \
+    LdpGenericMessage, pack_fec_tlv_columns, unpack_fec_tlv_columns, \
+    pack_address_list_tlv_column, unpack_address_list_tlv_column
+from trasa.ldp_session import LdpSession
+from trasa.ldp_state_machine import LdpStateMachine
+from trasa.ldp_route_db import LdpRouteDb
+
+import bench_memory
+
+LOCAL_IP = "172.26.1.106"
+PEER_IP = "172.26.1.112"
+FEC_SIZES = (1, 10, 100, 1000, 10000)
+# a FEC TLV's length is 16 bits, so a single message tops out around 9000 /24s
+MESSAGE_FEC_SIZES = (1, 10, 100, 1000, 5000)
+ADDRESS_SIZES = (1, 10, 100, 1000)
+STORM_PDUS = 100
+STORM_MESSAGES_PER_PDU = 50
+
+def fec_columns(size):
+    networks = array('I', [(0x0a000000 + (i << 8)) & 0xFFFFFFFF for i in range(size)])
+    prefix_lengths = array('B', [24] * size)
+    return networks, prefix_lengths
+
+def address_column(size):
+    return array('I', [0xac1a0000 + i for i in range(size)])
+
+def build_pdu(messages):
+    return LdpPdu(1, PEER_IP, 0, [message.pack() for message in messages]).pack()
+
+def sample_messages():
+    networks, prefix_lengths = fec_columns(2)
+    return [
+        LdpNotificationMessage(1, 1, 0, 0x0a, 7, 0x0201, {}),
+        LdpHelloMessage(1, 15, False, False, {0x0401: IPv4Address(PEER_IP).packed}),
+        LdpInitialisationMessage(1, 1, 180, 0, 0, 4096, LOCAL_IP, 0, {}),
+        LdpAddressMessage.from_address_column(1, address_column(2), {}),
+        LdpAddressWithdrawMessage.from_address_column(1, address_column(2), {}),
+        LdpKeepaliveMessage(1, {}),
+        LdpLabelMappingMessage.from_fec_columns(1, networks, prefix_lengths, 16, {}),
+        LdpGenericMessage(0x3e00, 1, {0x0001: b"\x00" * 4}),
+    ]
+
+def framing_cases():
+    serialised_pdus = b"".join(build_pdu([LdpKeepaliveMessage(i, {})]) for i in range(100))
+
+    def chopper():
+        for _ in Chopper(4, 2, 0, io.BytesIO(serialised_pdus)):
+            pass
+
+    def buffer_chopper():
+        for _ in BufferChopper(4, 2, 0, serialised_pdus):
+            pass
+
+    framer = PduFramer()
+    def pdu_framer():
+        framer.feed(serialised_pdus)
+
+    yield "framing/Chopper/100", chopper, 100
+    yield "framing/BufferChopper/100", buffer_chopper, 100
+    yield "framing/PduFramer/100", pdu_framer, 100
+
+def message_cases():
+    for message in sample_messages():
+        name = type(message).__name__
+        pdu = LdpPdu(1, PEER_IP, 0, [message.pack()])
+        serialised_pdu = pdu.pack()
+        yield "pack/%s" % name, lambda pdu=pdu: pdu.pack(), 1
+        yield "parse/%s" % name, lambda serialised_pdu=serialised_pdu: parse_ldp_pdu(serialised_pdu), 1
+        yield "parse_lazy/%s" % name, lambda serialised_pdu=serialised_pdu: parse_ldp_pdu(serialised_pdu, lazy=True), 1
+
+def fec_cases():
+    for size in FEC_SIZES:
+        networks, prefix_lengths = fec_columns(size)
+        packed_fecs = pack_fec_tlv_columns(networks, prefix_lengths)
+        yield "fec_tlv/pack/%d" % size, lambda c=(networks, prefix_lengths): pack_fec_tlv_columns(*c), size
+        yield "fec_tlv/unpack/%d" % size, lambda packed_fecs=packed_fecs: unpack_fec_tlv_columns(packed_fecs), size
+    for size in MESSAGE_FEC_SIZES:
+        networks, prefix_lengths = fec_columns(size)
+        message = LdpLabelMappingMessage.from_fec_columns(1, networks, prefix_lengths, 16, {})
+        serialised_pdu = build_pdu([message])
+        yield "label_mapping/pack/%d" % size, message.pack, size
+        yield "label_mapping/parse/%d" % size, lambda serialised_pdu=serialised_pdu: parse_ldp_pdu(serialised_pdu), size
+        yield "label_mapping/prefixes/%d" % size, \
+            lambda serialised_pdu=serialised_pdu: parse_ldp_pdu(serialised_pdu).messages[0].prefixes, size
+
+def address_cases():
+    for size in ADDRESS_SIZES:
+        addresses = address_column(size)
+        packed_addresses = pack_address_list_tlv_column(addresses)
+        message = LdpAddressMessage.from_address_column(1, addresses, {})
+        serialised_pdu = build_pdu([message])
+        yield "address_tlv/pack/%d" % size, lambda addresses=addresses: pack_address_list_tlv_column(addresses), size
+        yield "address_tlv/unpack/%d" % size, \
+            lambda packed_addresses=packed_addresses: unpack_address_list_tlv_column(packed_addresses), size
+        yield "address/parse/%d" % size, lambda serialised_pdu=serialised_pdu: parse_ldp_pdu(serialised_pdu), size
+
+def operational_session():
+    session = LdpSession(LOCAL_IP, PEER_IP, 646, count(1).__next__, route_db=LdpRouteDb())
+    session.pdus_received([
+        build_pdu([LdpInitialisationMessage(1, 1, 180, 0, 0, 0, LOCAL_IP, 0, {})]),
+        build_pdu([LdpKeepaliveMessage(2, {})]),
+    ])
+    session.send_queue.take()
+    return session
+
+def storm_cases():
+    # every op pushes STORM_PDUS PDUs of STORM_MESSAGES_PER_PDU label mappings
+    message_count = STORM_PDUS * STORM_MESSAGES_PER_PDU
+    message_ids = count(1000)
+    serialised_pdus = []
+    for _ in range(STORM_PDUS):
+        messages = []
+        for _ in range(STORM_MESSAGES_PER_PDU):
+            message_id = next(message_ids)
+            networks = array('I', [(0x0a000000 + (message_id << 8)) & 0xFFFFFFFF])
+            messages.append(LdpLabelMappingMessage.from_fec_columns(message_id, networks, array('B', [24]), 16, {}))
+        serialised_pdus.append(build_pdu(messages))
+
+    # every op starts from an empty LIB, so each one stores the same message_count bindings
+    session = operational_session()
+    def session_storm():
+        session.state_machine.route_db = LdpRouteDb()
+        session.pdus_received(serialised_pdus)
+        session.send_queue.take()
+        session.send_queue.sent(len(session.send_queue))
+
+    state_machine = LdpStateMachine(LOCAL_IP, PEER_IP, LdpRouteDb())
+    state_machine.peer_lsr_id = PEER_IP
+    state_machine.message_received(LdpInitialisationMessage(1, 1, 180, 0, 0, 0, LOCAL_IP, 0, {}))
+    state_machine.message_received(LdpKeepaliveMessage(2, {}))
+    decoded_messages = [message for serialised_pdu in serialised_pdus for message in parse_ldp_pdu(serialised_pdu).messages]
+    def state_machine_storm():
+        state_machine.route_db = LdpRouteDb()
+        for message in decoded_messages:
+            state_machine.message_received(message)
+
+    yield "storm/LdpSession/%d" % message_count, session_storm, message_count
+    yield "storm/LdpStateMachine/%d" % message_count, state_machine_storm, message_count
+
+def all_cases():
+    for cases in (framing_cases, message_cases, fec_cases, address_cases, storm_cases):
+        for case in cases():
+            yield case
+
+def ops_per_second(func, min_time):
+    # grow the batch until one batch takes long enough to time reliably
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return batch / elapsed
+        if elapsed < min_time / 10:
+            batch *= 10
+        else:
+            # close enough to scale straight to just past min_time
+            batch = int(batch * 1.2 * min_time / elapsed) + 1
+
+def allocations(func):
+    # one warm call first so caches and lazily built state aren't counted
+    func()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    result = func()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak - before, after - before
+
+def run(min_time=0.2, name_filter=None):
+    results = []
+    for name, func, items in all_cases():
+        if name_filter and name_filter not in name:
+            continue
+        peak_bytes, retained_bytes = allocations(func)
+        rate = ops_per_second(func, min_time)
+        results.append({
+            "name": name,
+            "ops_per_second": round(rate, 1),
+            "items_per_second": round(rate * items, 1),
+            "alloc_peak_bytes": peak_bytes,
+            "alloc_retained_bytes": retained_bytes,
+        })
+    return results
+
+def compare(results, baseline, threshold):
+    # returns (name, metric, baseline value, new value) for every regression
+    baseline_by_name = dict((result["name"], result) for result in baseline["results"])
+    regressions = []
+    for result in results:
+        old = baseline_by_name.get(result["name"])
+        if old is None:
+            continue
+        if result["ops_per_second"] < old["ops_per_second"] * (1 - threshold):
+            regressions.append((result["name"], "ops_per_second", old["ops_per_second"], result["ops_per_second"]))
+        # small allocations are noisy, so allow some slack in absolute terms too
+        if result["alloc_peak_bytes"] > old["alloc_peak_bytes"] * (1 + threshold) + 256:
+            regressions.append((result["name"], "alloc_peak_bytes", old["alloc_peak_bytes"], result["alloc_peak_bytes"]))
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="trasa codec and session benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to time each case for")
+    parser.add_argument("--filter", help="only run cases whose name contains this")
+    parser.add_argument("--memory", action="store_true", help="include the per-instance memory benchmark")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression, as a fraction")
+    args = parser.parse_args(argv)
+
+    output = {
+        "python": sys.version.split()[0],
+        "results": run(args.min_time, args.filter),
+    }
+    if args.memory:
+        output["memory"] = bench_memory.run()
+    json.dump(output, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(output["results"], baseline, args.threshold)
+        for name, metric, old, new in regressions:
+            sys.stderr.write("REGRESSION %s %s: %s -> %s\n" % (name, metric, old, new))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
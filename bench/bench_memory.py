@@ -0,0 +1,79 @@
+"""Memory benchmark for the slotted message, PDU and IP types
+
+Builds a batch of each type and a dict-backed class with the same fields,
+and reports the bytes per instance of both, measured with tracemalloc.
+
+    PYTHONPATH=./ python bench/bench_memory.py
+"""
+
+import json
+import sys
+import tracemalloc
+from array import array
+
+from trasa.identifier import Identifier
+from trasa.ip import IP4Address, IP4Prefix
+from trasa.ldp_message import LdpKeepaliveMessage, LdpHelloMessage, LdpLabelMappingMessage
+from trasa.ldp_pdu import LdpPdu
+
+COUNT = 100000
+
+def dict_backed(name, fields):
+    # same fields, but stored in a per-instance __dict__
+    def __init__(self, *args):
+        for field, value in zip(fields, args):
+            setattr(self, field, value)
+    return type(name, (object,), {"__init__": __init__})
+
+DictIdentifier = dict_backed("DictIdentifier", ("router_id", "label_space_id"))
+DictIP4Address = dict_backed("DictIP4Address", ("address",))
+DictIP4Prefix = dict_backed("DictIP4Prefix", ("prefix", "length"))
+DictKeepaliveMessage = dict_backed("DictKeepaliveMessage", ("message_id", "tlvs"))
+DictHelloMessage = dict_backed("DictHelloMessage", ("message_id", "hold_time", "targeted", "request_targeted", "tlvs"))
+DictLabelMappingMessage = dict_backed("DictLabelMappingMessage", ("message_id", "prefixes", "label", "tlvs", "fec_columns"))
+DictLdpPdu = dict_backed("DictLdpPdu", ("version", "lsr_id", "label_space_id", "messages"))
+
+TLVS = {}
+FEC_COLUMNS = (array('I', [0x0a000008]), array('B', [30]))
+
+CASES = [
+    ("Identifier", lambda i: Identifier("10.0.0.1", i), lambda i: DictIdentifier("10.0.0.1", i)),
+    ("IP4Address", lambda i: IP4Address(i), lambda i: DictIP4Address(i.to_bytes(4, "big"))),
+    ("IP4Prefix", lambda i: IP4Prefix(i << 8, 24), lambda i: DictIP4Prefix((i << 8).to_bytes(4, "big"), 24)),
+    ("LdpKeepaliveMessage", lambda i: LdpKeepaliveMessage(i, TLVS), lambda i: DictKeepaliveMessage(i, TLVS)),
+    ("LdpHelloMessage", lambda i: LdpHelloMessage(i, 15, False, False, TLVS), lambda i: DictHelloMessage(i, 15, False, False, TLVS)),
+    ("LdpLabelMappingMessage",
+        lambda i: LdpLabelMappingMessage.from_fec_columns(i, FEC_COLUMNS[0], FEC_COLUMNS[1], 16, TLVS),
+        lambda i: DictLabelMappingMessage(i, None, 16, TLVS, (FEC_COLUMNS[0], FEC_COLUMNS[1]))),
+    ("LdpPdu", lambda i: LdpPdu(1, "10.0.0.1", 0, TLVS), lambda i: DictLdpPdu(1, "10.0.0.1", 0, TLVS)),
+]
+
+def bytes_per_instance(factory, count):
+    # values are built outside the measured window so only the instances count
+    values = list(range(1, count + 1))
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    instances = [factory(value) for value in values]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # don't count the list holding the instances
+    list_size = sys.getsizeof(instances)
+    del instances
+    return (after - before - list_size) / count
+
+def run(count=COUNT):
+    results = []
+    for name, slotted_factory, dict_factory in CASES:
+        slotted = bytes_per_instance(slotted_factory, count)
+        dict_based = bytes_per_instance(dict_factory, count)
+        results.append({
+            "name": name,
+            "slotted_bytes": round(slotted, 1),
+            "dict_bytes": round(dict_based, 1),
+            "saving": round(1 - slotted / dict_based, 3),
+        })
+    return results
+
+if __name__ == "__main__":
+    json.dump(run(), sys.stdout, indent=2)
+    sys.stdout.write("\n")
@@ -0,0 +1,217 @@
+"""Synthetic LDP peers for load testing a trasa instance over loopback
+
+Opens one TCP session per simulated peer, each from its own loopback source
+address, and runs the Initialization/Keepalive handshake. Once a session is
+up, it sends bursts of Label Mapping and Address messages at the target
+rate, plus a Keepalive probe every --keepalive-interval seconds. trasa
+echoes each Keepalive but renumbers it, and sends Keepalives of its own, so
+each session keeps at most one probe outstanding: the next Keepalive back
+closes it and gives the round-trip time, any that arrive with no probe out
+are dropped, and a probe that's due while the last is still out is skipped.
+Only a Keepalive of trasa's own landing inside a probe's round trip can
+still cut that one short, at most once per keepalive period (a minute at
+the negotiated 180s). A JSON report goes to stdout at the end.
+
+    PYTHONPATH=./ python bench/load_generator.py --target 127.0.0.1 --sessions 200 --rate 20000
+
+Peers bind 127.1.0.1, 127.1.0.2, ... by default (see --source-base), so
+every session looks like a different LSR.
+"""
+
+import argparse
+import json
+import sys
+from array import array
+from ipaddress import IPv4Address
+from itertools import count
+from time import monotonic
+
+import eventlet
+from eventlet.green import socket
+
+from trasa.framer import PduFramer
+from trasa.ldp_pdu import LdpPduBuilder, parse_ldp_pdu
+from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage, LdpAddressMessage, \
+    LdpLabelMappingMessage
+from trasa.error import SocketClosedError
+
+class SyntheticPeer(object):
+    """One simulated LSR with a single TCP session to the target"""
+
+    def __init__(self, source_ip, target_ip, port, messages_per_second, burst_size, prefixes_per_mapping, address_ratio):
+        self.source_ip = source_ip
+        self.target_ip = target_ip
+        self.port = port
+        self.messages_per_second = messages_per_second
+        self.burst_size = burst_size
+        self.prefixes_per_mapping = prefixes_per_mapping
+        # every Nth message of a burst is an Address message, 0 for none
+        self.address_every = int(round(1 / address_ratio)) if address_ratio > 0 else 0
+        self.message_ids = count(1)
+        self.socket = None
+        self.framer = PduFramer()
+        self.pdu_builder = LdpPduBuilder(source_ip, 0)
+        self.setup_time = None
+        self.error = None
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        # when the outstanding Keepalive probe went out, None if there isn't one
+        self.probe_sent_at = None
+        self.keepalive_rtts = []
+        self.probes_skipped = 0
+        self.unsolicited_keepalives = 0
+        self.network = int(IPv4Address(source_ip)) << 8 & 0xFFFFFFFF
+
+    def send(self, messages):
+        for message in messages:
+            message.message_id = next(self.message_ids)
+            self.pdu_builder.add(message.pack())
+        self.bytes_sent += self.pdu_builder.flush(self.socket)
+        self.messages_sent += len(messages)
+
+    def receive(self):
+        messages = []
+        for serialised_pdu in self.framer.recv_into(self.socket):
+            messages.extend(parse_ldp_pdu(serialised_pdu, lazy=True).messages)
+        return messages
+
+    def wait_for(self, message_class):
+        while True:
+            for message in self.receive():
+                if isinstance(message, message_class):
+                    return
+
+    def connect(self):
+        started_at = monotonic()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind((self.source_ip, 0))
+        self.socket.connect((self.target_ip, self.port))
+        self.send([LdpInitialisationMessage(0, 1, 180, 0, 0, 0, self.target_ip, 0, {})])
+        self.wait_for(LdpInitialisationMessage)
+        self.send([LdpKeepaliveMessage(0, {})])
+        self.wait_for(LdpKeepaliveMessage)
+        self.setup_time = monotonic() - started_at
+
+    def build_burst(self):
+        messages = []
+        for _ in range(self.burst_size):
+            if self.address_every and len(messages) % self.address_every == 0:
+                addresses = array('I', [int(IPv4Address(self.source_ip))])
+                messages.append(LdpAddressMessage.from_address_column(0, addresses, {}))
+            else:
+                networks = array('I', [(self.network + (i << 8)) & 0xFFFFFFFF for i in range(self.prefixes_per_mapping)])
+                prefix_lengths = array('B', [24] * self.prefixes_per_mapping)
+                messages.append(LdpLabelMappingMessage.from_fec_columns(0, networks, prefix_lengths, 16, {}))
+                self.network = (self.network + (self.prefixes_per_mapping << 8)) & 0xFFFFFFFF
+        return messages
+
+    def read_keepalives(self):
+        try:
+            while True:
+                for message in self.receive():
+                    if not isinstance(message, LdpKeepaliveMessage):
+                        continue
+                    if self.probe_sent_at is None:
+                        self.unsolicited_keepalives += 1
+                    else:
+                        self.keepalive_rtts.append(monotonic() - self.probe_sent_at)
+                        self.probe_sent_at = None
+        except (SocketClosedError, OSError):
+            pass
+
+    def run(self, duration, keepalive_interval):
+        try:
+            self.connect()
+        except (SocketClosedError, OSError) as e:
+            self.error = str(e)
+            return
+        reader = eventlet.spawn(self.read_keepalives)
+        burst_interval = self.burst_size / self.messages_per_second
+        started_at = monotonic()
+        next_burst_at = started_at
+        next_keepalive_at = started_at
+        try:
+            while monotonic() - started_at < duration:
+                now = monotonic()
+                if now >= next_keepalive_at:
+                    if self.probe_sent_at is None:
+                        self.probe_sent_at = monotonic()
+                        self.send([LdpKeepaliveMessage(0, {})])
+                    else:
+                        self.probes_skipped += 1
+                    next_keepalive_at += keepalive_interval
+                if now >= next_burst_at:
+                    self.send(self.build_burst())
+                    next_burst_at += burst_interval
+                eventlet.sleep(max(min(next_burst_at, next_keepalive_at) - monotonic(), 0))
+            # give the last probe a chance to come back
+            eventlet.sleep(min(keepalive_interval, 1.0))
+        except OSError as e:
+            self.error = str(e)
+        reader.kill()
+        self.socket.close()
+
+def summarise(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "min": values[0],
+        "mean": sum(values) / len(values),
+        "p50": values[len(values) // 2],
+        "p99": values[min(int(len(values) * 0.99), len(values) - 1)],
+        "max": values[-1],
+    }
+
+def source_addresses(source_base, session_count):
+    base = int(IPv4Address(source_base))
+    return [str(IPv4Address(base + i)) for i in range(session_count)]
+
+def run(args):
+    per_session_rate = args.rate / args.sessions
+    peers = [SyntheticPeer(source_ip, args.target, args.port, per_session_rate, args.burst,
+                           args.prefixes_per_mapping, args.address_ratio)
+             for source_ip in source_addresses(args.source_base, args.sessions)]
+    pool = eventlet.GreenPool(args.sessions)
+    started_at = monotonic()
+    for peer in peers:
+        pool.spawn(peer.run, args.duration, args.keepalive_interval)
+    pool.waitall()
+    elapsed = monotonic() - started_at
+
+    established = [peer for peer in peers if peer.setup_time is not None]
+    messages_sent = sum(peer.messages_sent for peer in peers)
+    return {
+        "sessions": args.sessions,
+        "established": len(established),
+        "errors": sorted(set(peer.error for peer in peers if peer.error)),
+        "setup_time": summarise([peer.setup_time for peer in established]),
+        "messages_sent": messages_sent,
+        "bytes_sent": sum(peer.bytes_sent for peer in peers),
+        "messages_per_second": messages_sent / elapsed,
+        "keepalive_rtt": summarise([rtt for peer in peers for rtt in peer.keepalive_rtts]),
+        "keepalive_probes_skipped": sum(peer.probes_skipped for peer in peers),
+        "unsolicited_keepalives": sum(peer.unsolicited_keepalives for peer in peers),
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="synthetic LDP peer load generator")
+    parser.add_argument("--target", default="127.0.0.1", help="address trasa listens on")
+    parser.add_argument("--port", type=int, default=646)
+    parser.add_argument("--sessions", type=int, default=10, help="number of simulated peers")
+    parser.add_argument("--source-base", default="127.1.0.1", help="first loopback source address")
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second across all sessions")
+    parser.add_argument("--burst", type=int, default=50, help="messages per burst")
+    parser.add_argument("--prefixes-per-mapping", type=int, default=1)
+    parser.add_argument("--address-ratio", type=float, default=0.1, help="fraction of messages that are Address messages")
+    parser.add_argument("--keepalive-interval", type=float, default=1.0, help="seconds between keepalive probes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to send for once a session is up")
+    args = parser.parse_args(argv)
+
+    json.dump(run(args), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
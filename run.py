@@ -1,11 +1,14 @@
 import sys
 import yaml
 import signal
+import logging
+import json
 
-from eventlet import GreenPool
-import eventlet.greenthread as greenthread
-
-from trasa.ldp import Ldp
+from trasa.log import start_queue_logging
+from trasa.metrics import REGISTRY, MetricsServer, parse_metrics_address
+from trasa.tracing import Tracer
+from trasa.supervisor import Supervisor
+from trasa.decode_offload import DecodeOffload
 
 def printmsg(msg):
     sys.stderr.write("%s\n" % msg)
@@ -16,22 +19,114 @@ class Server(object):
         self.peering_hosts = []
         self.greenlets = set()
         self.trasas = []
+        self.queue_logging = None
+        self.metrics_server = None
+        self.decode_offload = None
+        # the one discovery socket and Hello timer every router in the process shares
+        self.discovery = None
+
+    def run(self, config=None):
+        if config is None:
+            with open("config.yml") as file:
+                config = yaml.safe_load(file.read())
+        if config.get("multiprocess"):
+            self.run_supervisor(config)
+            return
+
+        # log output is written from a listener thread so it can't stall the routers
+        self.queue_logging = start_queue_logging(getattr(logging, config.get("log_level", "INFO").upper()))
+        if "metrics_address" in config:
+            # "host:port" or the path of a Unix socket
+            self.metrics_server = MetricsServer(REGISTRY, parse_metrics_address(config["metrics_address"]))
+            self.metrics_server.start()
+
+        if "decode_offload_threshold" in config:
+            # PDUs at least this many bytes long are decoded in worker processes
+            self.decode_offload = DecodeOffload(config["decode_offload_threshold"], config.get("decode_workers"))
+
+        # engine: eventlet (the default) or asyncio
+        if config.get("engine", "eventlet") == "asyncio":
+            self.run_asyncio(config)
+        else:
+            self.run_eventlet(config)
+
+        if self.decode_offload:
+            self.decode_offload.shutdown()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.queue_logging.stop()
+
+    def run_supervisor(self, config):
+        # one worker process per router, each running this same Server with a
+        # single router in its config
+        self.queue_logging = start_queue_logging(getattr(logging, config.get("log_level", "INFO").upper()))
+        worker_config = dict(config, multiprocess=False)
+        del worker_config["routers"]
+        supervisor = Supervisor(run_worker, [dict(worker_config, routers=[router]) for router in config["routers"]])
+        if "metrics_address" in config:
+            # serves the supervisor's metrics and every worker's, labelled by worker
+            self.metrics_server = MetricsServer(supervisor, parse_metrics_address(config["metrics_address"]))
+            self.metrics_server.start()
+        signal.signal(signal.SIGINT, lambda _signal, _frame: supervisor.shutdown())
+        printmsg("Starting %d worker processes" % len(supervisor.workers))
+        supervisor.run()
+        printmsg("All workers gone, exiting")
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.queue_logging.stop()
+
+    def build_tracer(self, config):
+        # trace_sample_every: trace one inbound PDU in every N, 0 (the default) is off
+        return Tracer(config.get("trace_sample_every", 0), config.get("trace_slowest", 32))
+
+    def run_eventlet(self, config):
+        # each engine is only imported when it's used, so asyncio runs don't load eventlet
+        from eventlet import GreenPool
+        from trasa.ldp import Ldp, EventletDiscovery
 
-    def run(self):
         signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGUSR1, self.dump_traces_handler)
         pool = GreenPool()
-
-        with open("config.yml") as file:
-            config = yaml.load(file.read())
+        self.discovery = EventletDiscovery()
         for router in config["routers"]:
             printmsg("Starting trasa on %s" % router["local_address"])
-            trasa = Ldp(router["local_address"])
+            trasa = Ldp(router["local_address"], self.build_tracer(config), self.decode_offload, self.discovery)
             self.trasas.append(trasa)
             pool.spawn(self.call_handler, trasa)
+        # spawned last, so the routers have registered by the time it binds
+        pool.spawn(self.discovery.run)
         pool.waitall()
         printmsg("All greenlets gone, exiting")
 
+    def run_asyncio(self, config):
+        import asyncio
+        from trasa.ldp_asyncio import AsyncLdp, AsyncDiscovery
+
+        if config.get("uvloop"):
+            # optional, any asyncio loop will do
+            try:
+                import uvloop
+                uvloop.install()
+            except ImportError:
+                printmsg("uvloop isn't installed, using the default asyncio loop")
+
+        async def run_routers():
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGINT, self.signal_handler, signal.SIGINT, None)
+            loop.add_signal_handler(signal.SIGUSR1, self.dump_traces_handler, signal.SIGUSR1, None)
+            self.discovery = AsyncDiscovery()
+            self.discovery.start()
+            for router in config["routers"]:
+                printmsg("Starting trasa on %s" % router["local_address"])
+                self.trasas.append(AsyncLdp(router["local_address"], self.build_tracer(config), self.decode_offload,
+                                            self.discovery))
+            await asyncio.gather(*[trasa.run() for trasa in self.trasas])
+
+        asyncio.run(run_routers())
+        printmsg("All routers stopped, exiting")
+
     def call_handler(self, trasa):
+        import eventlet.greenthread as greenthread
         self.greenlets.add(greenthread.getcurrent())
         trasa.run()
         self.greenlets.remove(greenthread.getcurrent())
@@ -40,10 +135,16 @@ class Server(object):
         printmsg("[SIGINT] Shutting down")
         self.shutdown()
 
+    def dump_traces_handler(self, _signal, _frame):
+        for trasa in self.trasas:
+            printmsg("[SIGUSR1] Traces for %s: %s" % (trasa.listen_ip, json.dumps(trasa.dump_traces(), sort_keys=True)))
+
     def shutdown(self):
         for trasa in self.trasas:
             printmsg("Shutting down trasa %s" % trasa)
             trasa.shutdown()
+        if self.discovery:
+            self.discovery.shutdown()
 
     def peer_up_handler(self, peer_ip, peer_as):
         printmsg("[Peer up] %s %d" % (peer_ip, peer_as))
@@ -60,6 +161,9 @@ class Server(object):
         else:
             printmsg("[Route handler] New route received: %s" % route_update)
 
+def run_worker(config):
+    Server().run(config)
+
 if __name__ == "__main__":
     server = Server()
     server.run()
@@ -0,0 +1,128 @@
+from trasa.binding_store import BindingStore, DELETED
+
+from array import array
+from random import Random
+import unittest
+
+class BindingStoreTestCase(unittest.TestCase):
+    def test_insert_and_lookup(self):
+        store = BindingStore()
+        store.insert(0x0a000000, 24, 0, 100)
+        store.insert(0x0a000000, 24, 1, 200)
+        store.insert(0x0a000000, 16, 0, 300)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.label_for(0x0a000000, 24, 1), 200)
+        self.assertEqual(store.label_for(0x0a000000, 16, 0), 300)
+        self.assertIsNone(store.label_for(0x0a000000, 8, 0))
+        store.insert(0x0a000000, 24, 1, 201)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.label_for(0x0a000000, 24, 1), 201)
+
+    def test_insert_columns_grows_index(self):
+        store = BindingStore()
+        networks = array('I', [i << 8 for i in range(5000)])
+        store.insert_columns(networks, array('B', [24]) * 5000, 3, 16)
+        self.assertEqual(len(store), 5000)
+        self.assertLessEqual(store.index_used * 2, len(store.index))
+        self.assertTrue(all(store.label_for(network, 24, 3) == 16 for network in networks))
+
+    def test_delete_leaves_tombstone(self):
+        store = BindingStore()
+        store.insert(0x0a000000, 24, 0, 100)
+        store.insert(0x0a000100, 24, 0, 101)
+        self.assertTrue(store.delete(0x0a000000, 24, 0))
+        self.assertFalse(store.delete(0x0a000000, 24, 0))
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.peers[0], DELETED)
+        self.assertEqual(store.label_for(0x0a000100, 24, 0), 101)
+        # the tombstone's slot and the free row both get reused
+        store.insert(0x0a000000, 24, 0, 102)
+        self.assertEqual(store.index_used, 2)
+        self.assertEqual(len(store.peers), 2)
+        self.assertEqual(list(store), [(0x0a000000, 24, 0, 102), (0x0a000100, 24, 0, 101)])
+
+    def test_delete_columns_and_peer(self):
+        store = BindingStore()
+        store.insert_columns(array('I', [0x0a000000, 0x0a000100]), array('B', [24, 24]), 0, 100)
+        store.insert_columns(array('I', [0x0a000000, 0x0a000100]), array('B', [24, 24]), 1, 200)
+        self.assertEqual(store.delete_columns(array('I', [0x0a000000, 0x0b000000]), array('B', [24, 24]), 0), 1)
+        self.assertEqual(store.delete_peer(1), 2)
+        self.assertEqual(store.delete_peer(1), 0)
+        self.assertEqual(list(store), [(0x0a000100, 24, 0, 100)])
+
+    def test_chains_per_fec_and_peer(self):
+        store = BindingStore()
+        store.insert_columns(array('I', [0x0a000000, 0x0a000100]), array('B', [24, 24]), 0, 100)
+        store.insert(0x0a000000, 24, 1, 200)
+        store.insert(0x0a000000, 24, 2, 300)
+        self.assertEqual(store.fec_rows(0x0a000000, 24), [(2, 300), (1, 200), (0, 100)])
+        self.assertEqual(store.fec_rows(0x0b000000, 24), [])
+        self.assertEqual(store.peer_rows(0), [(0x0a000100, 24, 100), (0x0a000000, 24, 100)])
+        # from the middle of a FEC's chain
+        self.assertTrue(store.delete(0x0a000000, 24, 1))
+        self.assertEqual(store.fec_rows(0x0a000000, 24), [(2, 300), (0, 100)])
+        self.assertEqual(store.delete_peer(0), 2)
+        self.assertEqual(store.fec_rows(0x0a000000, 24), [(2, 300)])
+        self.assertEqual(store.fec_rows(0x0a000100, 24), [])
+        self.assertEqual(store.peer_rows(0), [])
+        self.assertEqual(store.fec_count, 1)
+
+    def test_delete_peer_only_visits_its_rows(self):
+        store = BindingStore()
+        store.insert_columns(array('I', [i << 8 for i in range(1000)]), array('B', [24]) * 1000, 0, 16)
+        store.insert(0xc0000000, 8, 1, 17)
+        visited = []
+        delete_row = store.delete_row
+        store.delete_row = lambda row, unlink_peer=True: visited.append(row) or delete_row(row, unlink_peer)
+        self.assertEqual(store.delete_peer(1), 1)
+        self.assertEqual(visited, [1000])
+        self.assertEqual(len(store), 1000)
+
+    def test_compacts_after_mass_withdraw(self):
+        store = BindingStore()
+        networks = array('I', [i << 8 for i in range(5000)])
+        store.insert_columns(networks, array('B', [24]) * 5000, 0, 16)
+        store.insert_columns(networks[:100], array('B', [24]) * 100, 1, 17)
+        index_size = len(store.index)
+        self.assertEqual(store.delete_peer(0), 5000)
+        # the columns shrink to the live rows and the index loses its tombstones
+        self.assertEqual(len(store.peers), 100)
+        self.assertEqual(len(store.free_rows), 0)
+        self.assertLess(len(store.index), index_size)
+        self.assertEqual(store.index_used, store.fec_count)
+        self.assertEqual(store.peer_rows(1)[-1], (0, 24, 17))
+        self.assertEqual(store.fec_rows(networks[99], 24), [(1, 17)])
+        self.assertIsNone(store.label_for(networks[100], 24, 0))
+        store.insert(networks[0], 24, 0, 18)
+        self.assertEqual(store.fec_rows(networks[0], 24), [(0, 18), (1, 17)])
+        self.assertEqual(store.delete_peer(1), 100)
+        self.assertEqual(list(store), [(networks[0], 24, 0, 18)])
+
+    def test_snapshot_is_a_copy(self):
+        store = BindingStore()
+        store.insert(0x0a000000, 24, 0, 100)
+        networks, prefix_lengths, peers, labels = store.snapshot()
+        store.insert(0x0a000100, 24, 0, 101)
+        store.delete(0x0a000000, 24, 0)
+        self.assertEqual((list(networks), list(peers), list(labels)), ([0x0a000000], [0], [100]))
+
+    def test_random_operations_match_dict(self):
+        random = Random(20)
+        store = BindingStore()
+        expected = {}
+        for step in range(20000):
+            network, prefix_length, peer = random.randrange(512) << 8, random.choice((16, 24)), random.randrange(4)
+            operation = random.random()
+            if operation < 0.5:
+                store.insert(network, prefix_length, peer, step)
+                expected[(network, prefix_length, peer)] = step
+            elif operation < 0.98:
+                self.assertEqual(store.delete(network, prefix_length, peer), expected.pop((network, prefix_length, peer), None) is not None)
+            else:
+                self.assertEqual(store.delete_peer(peer), len([key for key in expected if key[2] == peer]))
+                expected = dict((key, label) for key, label in expected.items() if key[2] != peer)
+            if step % 1000 == 0:
+                self.assertEqual(sorted(store), sorted(key + (label,) for key, label in expected.items()))
+        self.assertEqual(len(store), len(expected))
+        for (network, prefix_length, peer), label in expected.items():
+            self.assertEqual(store.label_for(network, prefix_length, peer), label)
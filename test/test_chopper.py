@@ -1,4 +1,5 @@
-from trasa.chopper import Chopper
+from trasa.chopper import Chopper, BufferChopper
+from trasa.error import ParseError
 import struct
 import unittest
 from io import BytesIO
@@ -37,3 +38,55 @@ class ChopperTestCase(unittest.TestCase):
         serialised_messages = list(chopper)
 
         self.assertEqual(serialised_messages, [serialised_data])
+
+    def test_pdu_chop_with_padding_length(self):
+        serialised_data = struct.pack("!HH6s",
+            0x0001,
+            6,
+            b"six by",
+        )
+        input_stream = BytesIO(serialised_data + serialised_data)
+        serialised_messages = list(Chopper(4, 2, 0, input_stream))
+
+        self.assertEqual(serialised_messages, [serialised_data, serialised_data])
+
+class BufferChopperTestCase(unittest.TestCase):
+    def test_tlv_chop(self):
+        serialised_data = struct.pack("!HH10sHH3s",
+            0x1234,
+            10,
+            b"ten bytes!",
+            0x5678,
+            3,
+            b"abc",
+        )
+        chunks = list(BufferChopper(4, 2, 0, serialised_data))
+
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(all(isinstance(chunk, memoryview) for chunk in chunks))
+        self.assertEqual(bytes(chunks[0]), serialised_data[:14])
+        self.assertEqual(bytes(chunks[1]), serialised_data[14:])
+
+    def test_chunks_share_memory(self):
+        serialised_data = bytearray(struct.pack("!HH4s", 0x1234, 4, b"abcd"))
+        chunk, = BufferChopper(4, 2, 0, serialised_data)
+        serialised_data[4] = ord("z")
+
+        self.assertEqual(bytes(chunk[4:]), b"zbcd")
+
+    def test_offset_and_end(self):
+        serialised_data = b"junk" + struct.pack("!HH2s", 0x1234, 2, b"ok") + b"trailing"
+        chunks = list(BufferChopper(4, 2, 0, serialised_data, 4, 10))
+
+        self.assertEqual([bytes(chunk) for chunk in chunks], [serialised_data[4:10]])
+
+    def test_truncated_body(self):
+        serialised_data = struct.pack("!HH4s", 0x1234, 10, b"abcd")
+        chopper = BufferChopper(4, 2, 0, serialised_data)
+
+        self.assertRaises(ParseError, chopper.next)
+
+    def test_truncated_header(self):
+        chopper = BufferChopper(4, 2, 0, b"\x12\x34\x00")
+
+        self.assertRaises(ParseError, chopper.next)
@@ -0,0 +1,78 @@
+from trasa.decode_offload import DecodeOffload, decode_pdu
+from trasa.ldp_session import LdpSession
+from trasa.ldp_state_machine import LdpStateMachine
+from trasa.ldp_pdu import LdpPdu, parse_ldp_pdu
+from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage, LdpLabelMappingMessage, \
+                              LdpAddressMessage
+from trasa.framer import PduFramer
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from itertools import count
+
+import pickle
+import unittest
+
+def build_pdu(*serialised_messages):
+    return LdpPdu(1, "172.26.1.112", 0, list(serialised_messages)).pack()
+
+def label_mapping(message_id, size):
+    networks = array('I', [0x0a000000 + (i << 8) for i in range(size)])
+    return LdpLabelMappingMessage.from_fec_columns(message_id, networks, array('B', [24] * size), 16, {}).pack()
+
+class DecodeOffloadTestCase(unittest.TestCase):
+    def test_decode_pdu_result_pickles(self):
+        unknown_message = bytes.fromhex("3e00000c000000070001000400000000")
+        pdu = pickle.loads(pickle.dumps(decode_pdu(build_pdu(label_mapping(1, 100), unknown_message))))
+        label_mapping_message, unknown = pdu.messages
+        self.assertEqual(len(label_mapping_message.fec_columns[0]), 100)
+        self.assertEqual(label_mapping_message.label, 16)
+        self.assertFalse(unknown.decoded)
+        self.assertEqual(unknown.pack(), unknown_message)
+
+    def test_only_large_batches_are_submitted(self):
+        with ThreadPoolExecutor(1) as executor:
+            decode_offload = DecodeOffload(1000, executor=executor)
+            serialised_pdus = [build_pdu(LdpKeepaliveMessage(1, {}).pack()), build_pdu(label_mapping(2, 500))]
+            futures = decode_offload.submit(serialised_pdus)
+            self.assertEqual(list(futures), [0, 1])
+            self.assertEqual(len(futures[1].result().messages[0].fec_columns[0]), 500)
+            self.assertIsNone(decode_offload.submit(serialised_pdus[:1]))
+            self.assertIsNone(decode_offload.submit([]))
+
+    def test_default_threshold_offloads_a_lib_dump(self):
+        with ThreadPoolExecutor(1) as executor:
+            decode_offload = DecodeOffload(executor=executor)
+            # PDUs no bigger than the max PDU length we negotiate
+            serialised_pdus = [build_pdu(label_mapping(index, 500)) for index in range(1, 6)]
+            self.assertTrue(all(len(serialised_pdu) <= LdpStateMachine.DEFAULT_MAX_PDU_LENGTH for serialised_pdu in serialised_pdus))
+            self.assertIsNone(decode_offload.submit(serialised_pdus[:1]))
+            futures = decode_offload.submit(serialised_pdus)
+            self.assertEqual(list(futures), [0, 1, 2, 3, 4])
+            self.assertEqual(futures[4].result().messages[0].message_id, 5)
+
+    def test_session_takes_decoded_pdus_in_order(self):
+        session = LdpSession("172.26.1.106", "172.26.1.112", 646, count(1).__next__)
+        serialised_pdus = [
+            build_pdu(LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {}).pack()),
+            build_pdu(LdpKeepaliveMessage(2, {}).pack()),
+        ]
+        session.pdus_received(serialised_pdus, decoded_pdus={1: decode_pdu(serialised_pdus[1])})
+
+        messages = []
+        for serialised_pdu in PduFramer().feed(session.send_queue.take()):
+            messages.extend(parse_ldp_pdu(serialised_pdu).messages)
+        self.assertEqual([type(message) for message in messages], [
+            LdpInitialisationMessage,
+            LdpKeepaliveMessage,
+            LdpAddressMessage,
+            LdpLabelMappingMessage,
+            LdpLabelMappingMessage,
+        ])
+
+    def test_process_pool(self):
+        decode_offload = DecodeOffload(0, max_workers=1)
+        try:
+            futures = decode_offload.submit([build_pdu(label_mapping(1, 1000))])
+            self.assertEqual(len(futures[0].result(timeout=30).messages[0].fec_columns[0]), 1000)
+        finally:
+            decode_offload.shutdown()
@@ -0,0 +1,120 @@
+from trasa.discovery_reactor import DiscoveryReactor, DATAGRAM_ERRORS
+from trasa.multicast_socket import Datagram
+from trasa.ldp_pdu import parse_ldp_pdu
+from trasa.ldp_discovery import build_hello_pdu
+from trasa.ldp import Ldp
+
+import unittest
+
+class FakeRouter(object):
+    def __init__(self, listen_ip):
+        self.listen_ip = listen_ip
+        self.last_message_id = 0
+        self.received = []
+
+    def get_message_id(self):
+        self.last_message_id += 1
+        return self.last_message_id
+
+    def datagram_received(self, data, datagram):
+        self.received.append((data, datagram))
+
+class BrokenRouter(FakeRouter):
+    def datagram_received(self, data, datagram):
+        raise ValueError("Broken router")
+
+class FakeMulticastSocket(object):
+    def __init__(self):
+        self.listen_ips = []
+        self.sent = []
+
+    def join(self, listen_ip):
+        pass
+
+    def send(self, data, listen_ip=None):
+        self.sent.append((data, listen_ip))
+
+def datagram(source_ip, interface=None, local_address=None, destination="224.0.0.2"):
+    return Datagram((source_ip, 646), interface, local_address, destination)
+
+class DiscoveryReactorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.reactor = DiscoveryReactor()
+        self.routers = dict((listen_ip, FakeRouter(listen_ip)) for listen_ip in ("10.0.0.1", "10.0.0.2", "10.1.0.1"))
+        for router in self.routers.values():
+            self.reactor.register(router)
+
+    def received_by(self):
+        return sorted(listen_ip for listen_ip, router in self.routers.items() if router.received)
+
+    def test_learns_interfaces_from_our_own_hellos(self):
+        self.reactor.datagram_received(b"hello", datagram("10.0.0.1", "eth0", "10.0.0.1"))
+        # nobody hears themselves, and 10.0.0.2 isn't known to be on eth0 yet
+        self.assertEqual(self.received_by(), [])
+        self.reactor.datagram_received(b"hello", datagram("10.0.0.2", "eth0", "10.0.0.1"))
+        self.assertEqual(self.received_by(), ["10.0.0.1"])
+        self.assertEqual(self.reactor.router_interfaces, {"10.0.0.1": "eth0", "10.0.0.2": "eth0"})
+        self.reactor.datagram_received(b"hello", datagram("10.0.0.9", "eth0", "10.0.0.1"))
+        self.assertEqual(self.received_by(), ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(self.routers["10.1.0.1"].received, [])
+
+    def test_falls_back_to_local_address(self):
+        self.reactor.datagram_received(b"hello", datagram("10.1.0.9", "eth1", "10.1.0.1"))
+        self.assertEqual(self.received_by(), ["10.1.0.1"])
+
+    def test_drops_what_isnt_for_us(self):
+        self.reactor.datagram_received(b"hello", datagram("10.2.0.9", "eth2", "10.2.0.1"))
+        self.assertEqual(self.received_by(), [])
+
+    def test_everyone_gets_it_without_pktinfo(self):
+        self.reactor.datagram_received(b"hello", datagram("10.0.0.1"))
+        self.assertEqual(self.received_by(), ["10.0.0.2", "10.1.0.1"])
+
+    def test_unicast_goes_to_its_destination(self):
+        self.reactor.datagram_received(b"hello", datagram("10.2.0.9", "eth2", "10.2.0.1", "10.0.0.2"))
+        self.assertEqual(self.received_by(), ["10.0.0.2"])
+
+    def test_unregister(self):
+        self.reactor.datagram_received(b"hello", datagram("10.0.0.1", "eth0", "10.0.0.1"))
+        self.reactor.unregister(self.routers["10.0.0.1"])
+        self.reactor.datagram_received(b"hello", datagram("10.0.0.9", "eth0", "10.0.0.1"))
+        self.assertEqual(self.received_by(), [])
+        self.assertEqual(self.reactor.interface_routers, {"eth0": set()})
+
+    def test_one_pass_sends_every_hello(self):
+        multicast_socket = self.reactor.multicast_socket = FakeMulticastSocket()
+        self.reactor.send_hellos()
+        self.reactor.send_hellos()
+        self.assertEqual([listen_ip for _, listen_ip in multicast_socket.sent], ["10.0.0.1", "10.0.0.2", "10.1.0.1"] * 2)
+        pdu = parse_ldp_pdu(multicast_socket.sent[-1][0])
+        self.assertEqual((pdu.lsr_id, pdu.messages[0].message_id), ("10.1.0.1", 2))
+
+    def test_late_router_says_hello_straight_away(self):
+        multicast_socket = self.reactor.multicast_socket = FakeMulticastSocket()
+        self.reactor.register(FakeRouter("10.3.0.1"))
+        self.assertEqual([listen_ip for _, listen_ip in multicast_socket.sent], ["10.3.0.1"])
+        self.assertEqual(multicast_socket.listen_ips, ["10.3.0.1"])
+
+    def test_hello_delay_is_jittered(self):
+        delays = [self.reactor.hello_delay() for _ in range(100)]
+        self.assertTrue(all(4.5 <= delay <= 5 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_bad_datagram_doesnt_stop_discovery(self):
+        router = Ldp("10.4.0.1")
+        self.reactor.register(router)
+        with self.assertLogs("trasa", "WARNING"):
+            self.reactor.datagram_received(b"\x00\x01\x00\x02\x00\x00", datagram("10.4.0.9", "eth4", "10.4.0.1"))
+        self.reactor.datagram_received(build_hello_pdu("10.4.0.9", 1), datagram("10.4.0.9", "eth4", "10.4.0.1"))
+        self.assertIsNotNone(router.adjacencies.get("10.4.0.9", 0, "eth4"))
+        router.adjacencies.clear()
+
+    def test_router_errors_are_counted(self):
+        self.reactor.register(BrokenRouter("10.5.0.1"))
+        errors = DATAGRAM_ERRORS.child.value
+        with self.assertLogs("trasa.discovery_reactor", "ERROR"):
+            self.reactor.datagram_received(b"hello", datagram("10.5.0.9", "eth5", "10.5.0.1"))
+        self.assertEqual(DATAGRAM_ERRORS.child.value, errors + 1)
+        # the other routers still hear what's for them
+        self.reactor.datagram_received(b"hello", datagram("10.1.0.9", "eth1", "10.1.0.1"))
+        self.assertEqual(self.received_by(), ["10.1.0.1"])
@@ -0,0 +1,72 @@
+from trasa.framer import PduFramer
+from trasa.error import SocketClosedError
+import socket
+import struct
+import unittest
+
+def build_pdu(body):
+    return struct.pack("!HH", 1, len(body)) + body
+
+class PduFramerTestCase(unittest.TestCase):
+    def test_single_pdu(self):
+        pdu = build_pdu(b"ten bytes!")
+        framer = PduFramer()
+
+        self.assertEqual(framer.feed(pdu), [pdu])
+        self.assertEqual(framer.pending, 0)
+
+    def test_many_pdus_in_one_feed(self):
+        pdus = [build_pdu(b"a" * length) for length in (6, 10, 0, 300)]
+        framer = PduFramer()
+
+        self.assertEqual(framer.feed(b"".join(pdus)), pdus)
+
+    def test_partial_pdu_is_kept(self):
+        pdu = build_pdu(b"ten bytes!")
+        framer = PduFramer()
+
+        self.assertEqual(framer.feed(pdu[:3]), [])
+        self.assertEqual(framer.feed(pdu[3:8]), [])
+        self.assertEqual(framer.pending, 8)
+        self.assertEqual(framer.feed(pdu[8:] + pdu[:1]), [pdu])
+        self.assertEqual(framer.pending, 1)
+        self.assertEqual(framer.feed(pdu[1:]), [pdu])
+
+    def test_byte_at_a_time(self):
+        pdus = [build_pdu(b"x" * length) for length in (1, 2, 3)]
+        data = b"".join(pdus)
+        framer = PduFramer()
+
+        framed = []
+        for i in range(len(data)):
+            framed.extend(framer.feed(data[i:i+1]))
+        self.assertEqual(framed, pdus)
+
+    def test_buffer_is_reused_and_grown(self):
+        small_pdu = build_pdu(b"s" * 20)
+        big_pdu = build_pdu(b"b" * 200)
+        framer = PduFramer(buffer_size=64)
+        buffer = framer.buffer
+
+        for _ in range(20):
+            self.assertEqual(framer.feed(small_pdu + small_pdu[:10]), [small_pdu])
+            self.assertEqual(framer.feed(small_pdu[10:]), [small_pdu])
+        self.assertIs(framer.buffer, buffer)
+
+        self.assertEqual(framer.feed(big_pdu), [big_pdu])
+        self.assertGreaterEqual(len(framer.buffer), len(big_pdu))
+
+    def test_recv_into(self):
+        left, right = socket.socketpair()
+        try:
+            pdus = [build_pdu(b"m" * length) for length in (4, 40)]
+            left.sendall(b"".join(pdus) + pdus[0][:2])
+            framer = PduFramer()
+
+            self.assertEqual(framer.recv_into(right), pdus)
+            self.assertEqual(framer.pending, 2)
+
+            left.close()
+            self.assertRaises(SocketClosedError, framer.recv_into, right)
+        finally:
+            right.close()
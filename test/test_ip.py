@@ -0,0 +1,88 @@
+from trasa.ip import IPAddress, IPPrefix, IP4Address, IP4Prefix, IP6Address, IP6Prefix
+import pickle
+import unittest
+
+class IPAddressTestCase(unittest.TestCase):
+    def test_ipv4_address(self):
+        address = IPAddress.from_string("10.1.2.3")
+        self.assertTrue(isinstance(address, IP4Address))
+        self.assertEqual(address.value, 0x0a010203)
+        self.assertEqual(address.address, b"\x0a\x01\x02\x03")
+        self.assertEqual(int(address), 0x0a010203)
+        self.assertEqual(str(address), "10.1.2.3")
+        self.assertEqual(repr(address), "IP4Address.from_string(\"10.1.2.3\")")
+
+    def test_ipv6_address(self):
+        address = IPAddress.from_string("2001:db8::1")
+        self.assertTrue(isinstance(address, IP6Address))
+        self.assertEqual(address.value, 0x20010db8000000000000000000000001)
+        self.assertEqual(str(address), "2001:db8::1")
+
+    def test_address_from_int(self):
+        self.assertEqual(IP4Address(0x0a010203), IPAddress.from_string("10.1.2.3"))
+
+    def test_address_equality_and_hash(self):
+        self.assertEqual(IPAddress.from_string("10.1.2.3"), IPAddress.from_string("10.1.2.3"))
+        self.assertNotEqual(IPAddress.from_string("10.1.2.3"), IPAddress.from_string("10.1.2.4"))
+        self.assertNotEqual(IP4Address(1), IP6Address(1))
+        self.assertEqual(len(set([IP4Address(1), IP4Address(1), IP6Address(1)])), 2)
+
+    def test_address_ordering(self):
+        addresses = [IPAddress.from_string(x) for x in ("10.0.0.2", "::1", "9.255.255.255", "10.0.0.1")]
+        self.assertEqual([str(x) for x in sorted(addresses)], ["9.255.255.255", "10.0.0.1", "10.0.0.2", "::1"])
+
+    def test_address_is_immutable(self):
+        address = IPAddress.from_string("10.1.2.3")
+        self.assertRaises(AttributeError, setattr, address, "value", 1)
+        self.assertFalse(hasattr(address, "__dict__"))
+
+    def test_address_pickles(self):
+        address = IPAddress.from_string("10.1.2.3")
+        self.assertEqual(pickle.loads(pickle.dumps(address)), address)
+
+class IPPrefixTestCase(unittest.TestCase):
+    def test_ipv4_prefix(self):
+        prefix = IPPrefix.from_string("10.1.0.0/16")
+        self.assertTrue(isinstance(prefix, IP4Prefix))
+        self.assertEqual(prefix.value, 0x0a010000)
+        self.assertEqual(prefix.length, 16)
+        self.assertEqual(prefix.prefix, b"\x0a\x01\x00\x00")
+        self.assertEqual(str(prefix), "10.1.0.0/16")
+
+    def test_ipv6_prefix(self):
+        prefix = IPPrefix.from_string("2001:db8::/32")
+        self.assertTrue(isinstance(prefix, IP6Prefix))
+        self.assertEqual(prefix.length, 32)
+        self.assertEqual(str(prefix), "2001:db8::/32")
+
+    def test_bad_prefix_length(self):
+        self.assertRaises(ValueError, IP4Prefix, 0, 33)
+
+    def test_prefix_equality_and_hash(self):
+        self.assertEqual(IPPrefix.from_string("10.1.0.0/16"), IP4Prefix(0x0a010000, 16))
+        self.assertNotEqual(IPPrefix.from_string("10.1.0.0/16"), IPPrefix.from_string("10.1.0.0/17"))
+        self.assertEqual(hash(IPPrefix.from_string("10.1.0.0/16")), hash(IP4Prefix(0x0a010000, 16)))
+        self.assertEqual(len(set([IPPrefix.from_string("10.1.0.0/16"), IP4Prefix(0x0a010000, 16)])), 1)
+
+    def test_prefix_ordering(self):
+        prefixes = [IPPrefix.from_string(x) for x in ("10.1.0.0/24", "10.1.0.0/16", "10.0.0.0/8", "::/0")]
+        self.assertEqual([str(x) for x in sorted(prefixes)], ["10.0.0.0/8", "10.1.0.0/16", "10.1.0.0/24", "::/0"])
+
+    def test_prefixes_and_addresses_dont_compare(self):
+        self.assertNotEqual(IP4Prefix(1, 32), IP4Address(1))
+        self.assertRaises(TypeError, lambda: IP4Prefix(1, 32) < IP4Address(1))
+
+    def test_prefix_network(self):
+        self.assertEqual(IPPrefix.from_string("10.1.2.3/16").network(), IP4Prefix(0x0a010000, 16))
+        self.assertEqual(IPPrefix.from_string("2001:db8::1/32").network(), IPPrefix.from_string("2001:db8::/32"))
+        self.assertEqual(IP4Prefix(0x0a010203, 0).network(), IP4Prefix(0, 0))
+
+    def test_prefix_contains(self):
+        prefix = IPPrefix.from_string("10.1.0.0/16")
+        self.assertTrue(IPAddress.from_string("10.1.255.1") in prefix)
+        self.assertFalse(IPAddress.from_string("10.2.0.1") in prefix)
+        self.assertTrue(IPPrefix.from_string("10.1.2.0/24") in prefix)
+        self.assertTrue(prefix in prefix)
+        self.assertFalse(IPPrefix.from_string("10.0.0.0/8") in prefix)
+        self.assertFalse(IPAddress.from_string("::a01:1") in prefix)
+        self.assertTrue(IPAddress.from_string("::1") in IPPrefix.from_string("::/0"))
@@ -0,0 +1,76 @@
+from trasa.label_manager import LabelManager, LabelPool, LabelSpaceExhaustedError, MIN_LABEL, MAX_LABEL
+
+from random import Random
+import unittest
+
+class LabelPoolTestCase(unittest.TestCase):
+    def test_allocate_and_free(self):
+        pool = LabelPool("test", 100, 102)
+        self.assertEqual([pool.allocate() for _ in range(3)], [100, 101, 102])
+        self.assertRaises(LabelSpaceExhaustedError, pool.allocate)
+        pool.free(101)
+        self.assertFalse(pool.is_allocated(101))
+        self.assertEqual(pool.allocated, 2)
+        self.assertEqual(pool.allocate(), 101)
+        self.assertTrue(pool.is_allocated(101))
+
+    def test_freed_labels_are_reused_oldest_first(self):
+        pool = LabelPool("test", 100, 199)
+        labels = [pool.allocate() for _ in range(5)]
+        for label in (labels[3], labels[1]):
+            pool.free(label)
+        self.assertEqual([pool.allocate(), pool.allocate()], [labels[3], labels[1]])
+
+    def test_bad_free(self):
+        pool = LabelPool("test", 100, 199)
+        label = pool.allocate()
+        pool.free(label)
+        self.assertRaises(ValueError, pool.free, label)
+        self.assertRaises(ValueError, pool.free, 150)
+
+    def test_churn_matches_set(self):
+        random = Random(21)
+        pool = LabelPool("test", MIN_LABEL, MIN_LABEL + 999)
+        allocated = set()
+        for _ in range(20000):
+            if allocated and (random.random() < 0.5 or len(allocated) == pool.size):
+                label = random.choice(sorted(allocated)) if random.random() < 0.01 else allocated.pop()
+                allocated.discard(label)
+                pool.free(label)
+            else:
+                label = pool.allocate()
+                self.assertNotIn(label, allocated)
+                self.assertIn(label, pool)
+                allocated.add(label)
+            self.assertEqual(pool.allocated, len(allocated))
+
+class LabelManagerTestCase(unittest.TestCase):
+    def test_default_pool_covers_label_space(self):
+        manager = LabelManager()
+        self.assertEqual(manager.allocate(), MIN_LABEL)
+        self.assertEqual(manager.utilisation(), {"default": (1, MAX_LABEL - MIN_LABEL + 1)})
+
+    def test_pools(self):
+        manager = LabelManager([("ldp", 1000, 1999), ("static", 16, 999)])
+        self.assertEqual(manager.allocate("ldp"), 1000)
+        self.assertEqual(manager.allocate("static"), 16)
+        manager.free(1000)
+        self.assertEqual(manager.utilisation(), {"ldp": (0, 1000), "static": (1, 984)})
+        self.assertRaises(ValueError, manager.free, 5000)
+
+    def test_bad_pools(self):
+        self.assertRaises(ValueError, LabelManager, [("low", 3, 100)])
+        self.assertRaises(ValueError, LabelManager, [("high", 16, MAX_LABEL + 1)])
+        self.assertRaises(ValueError, LabelManager, [("a", 16, 100), ("b", 100, 200)])
+        self.assertRaises(ValueError, LabelManager, [("a", 16, 100), ("a", 200, 300)])
+
+    def test_fec_label_is_stable(self):
+        manager = LabelManager()
+        label = manager.label_for_fec(0x0a000000, 24)
+        self.assertEqual(manager.label_for_fec(0x0a000000, 24), label)
+        self.assertNotEqual(manager.label_for_fec(0x0a000000, 16), label)
+        self.assertEqual(manager.fec_label(0x0a000000, 24), label)
+        self.assertEqual(manager.release_fec(0x0a000000, 24), label)
+        self.assertIsNone(manager.release_fec(0x0a000000, 24))
+        self.assertIsNone(manager.fec_label(0x0a000000, 24))
+        self.assertEqual(manager.utilisation()["default"][0], 1)
@@ -0,0 +1,117 @@
+from eventlet.green import socket
+import eventlet
+
+from trasa.ldp import Ldp
+from trasa.ldp_pdu import LdpPdu, parse_ldp_pdu
+from trasa.ldp_message import LdpInitialisationMessage, LdpNotificationMessage
+from trasa.ldp_discovery import build_hello_pdu
+from trasa.framer import PduFramer
+from trasa.ldp_session import SESSIONS_ACTIVE
+from trasa.decode_offload import DecodeOffload
+from trasa.tracing import Tracer
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import time
+import unittest
+
+class BrokenExecutor(object):
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+class SlowExecutor(object):
+    def __init__(self, executor, delay):
+        self.executor = executor
+        self.delay = delay
+
+    def submit(self, fn, *args):
+        def slow_fn():
+            time.sleep(self.delay)
+            return fn(*args)
+        return self.executor.submit(slow_fn)
+
+class LdpTestCase(unittest.TestCase):
+    def test_bad_pdu_cleans_up_session(self):
+        ldp = Ldp("127.0.0.1")
+        ours, theirs = socket.socketpair()
+        sessions_active = SESSIONS_ACTIVE.child.value
+        handler = eventlet.spawn(ldp.handle_tcp, ours, ("127.0.0.2", 1234))
+        eventlet.sleep(0)
+        self.assertEqual(len(ldp.sessions), 1)
+        init = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        # a truncated message after a good one
+        theirs.sendall(LdpPdu(1, "127.0.0.2", 0, [init.pack(), bytes.fromhex("0201ffff00000005")]).pack())
+        with eventlet.Timeout(2):
+            with self.assertLogs("trasa.ldp", "WARNING"):
+                handler.wait()
+        self.assertEqual(ldp.sessions, {})
+        self.assertEqual(SESSIONS_ACTIVE.child.value, sessions_active)
+        self.assertEqual(len(ldp.timer_wheel), 0)
+        self.assertEqual(ours.fileno(), -1)
+        theirs.close()
+
+    def run_bad_session(self, ldp, data, level):
+        ours, theirs = socket.socketpair()
+        handler = eventlet.spawn(ldp.handle_tcp, ours, ("127.0.0.2", 1234))
+        theirs.sendall(data)
+        with eventlet.Timeout(5):
+            with self.assertLogs("trasa.ldp", level):
+                # returns rather than raising out of the green thread
+                handler.wait()
+        self.assertEqual(ldp.sessions, {})
+        theirs.close()
+
+    def test_runt_message_is_a_parse_error(self):
+        self.run_bad_session(Ldp("127.0.0.1"), LdpPdu(1, "127.0.0.2", 0, [bytes.fromhex("020100020000")]).pack(), "WARNING")
+
+    def test_broken_decode_offload_cleans_up_session(self):
+        ldp = Ldp("127.0.0.1", decode_offload=DecodeOffload(0, executor=BrokenExecutor()))
+        init = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        self.run_bad_session(ldp, LdpPdu(1, "127.0.0.2", 0, [init.pack()]).pack(), "ERROR")
+
+    def test_traces_start_at_the_socket_read(self):
+        tracer = Tracer(1)
+        with ThreadPoolExecutor(1) as executor:
+            ldp = Ldp("127.0.0.1", tracer=tracer, decode_offload=DecodeOffload(0, executor=SlowExecutor(executor, 0.2)))
+            ours, theirs = socket.socketpair()
+            handler = eventlet.spawn(ldp.handle_tcp, ours, ("127.0.0.2", 1234))
+            init = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+            theirs.sendall(LdpPdu(1, "127.0.0.2", 0, [init.pack()]).pack())
+            with eventlet.Timeout(5):
+                while not tracer.traces_finished:
+                    eventlet.sleep(0.05)
+            theirs.close()
+            with eventlet.Timeout(5):
+                handler.wait()
+        # the wait for the pool is part of the trace
+        self.assertGreaterEqual(tracer.slowest_traces()[0]["stages"]["batch"], 0.2)
+
+    def test_last_adjacency_down_closes_session(self):
+        ldp = Ldp("127.0.0.1")
+        ours, theirs = socket.socketpair()
+        handler = eventlet.spawn(ldp.handle_tcp, ours, ("127.0.0.2", 1234))
+        init = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        theirs.sendall(LdpPdu(1, "127.0.0.2", 0, [init.pack()]).pack())
+        first = ldp.adjacencies.hello_received(build_hello_pdu("127.0.0.2", 1), "eth0")
+        second = ldp.adjacencies.hello_received(build_hello_pdu("127.0.0.2", 2), "eth1")
+        eventlet.sleep(0.1)
+        ldp.adjacencies.remove(first)
+        eventlet.sleep(0.1)
+        self.assertEqual(len(ldp.sessions), 1)
+        ldp.adjacencies.remove(second)
+        with eventlet.Timeout(2):
+            handler.wait()
+        self.assertEqual(ldp.sessions, {})
+        framer = PduFramer()
+        received = b""
+        while True:
+            data = theirs.recv(4096)
+            if not data:
+                break
+            received += data
+        messages = [message for serialised_pdu in framer.feed(received) for message in parse_ldp_pdu(serialised_pdu).messages]
+        self.assertEqual(type(messages[-1]), LdpNotificationMessage)
+        self.assertEqual(messages[-1].status_data, 0x0a)
+        theirs.close()
@@ -0,0 +1,144 @@
+from trasa.ldp_asyncio import AsyncLdp
+from trasa.ldp_pdu import LdpPdu, parse_ldp_pdu
+from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage, LdpAddressMessage, \
+                              LdpLabelMappingMessage, LdpNotificationMessage
+from trasa.framer import PduFramer
+from trasa.decode_offload import DecodeOffload
+from trasa.tracing import Tracer
+from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import asyncio
+import time
+import unittest
+
+class EphemeralPortAsyncLdp(AsyncLdp):
+    LISTEN_PORT = 0
+
+def build_pdu(*messages):
+    return LdpPdu(1, "127.0.0.2", 0, [message.pack() for message in messages]).pack()
+
+async def read_messages(reader, count):
+    framer = PduFramer()
+    messages = []
+    while len(messages) < count:
+        data = await reader.read(4096)
+        if not data:
+            break
+        for serialised_pdu in framer.feed(data):
+            messages.extend(parse_ldp_pdu(serialised_pdu).messages)
+    return messages
+
+class BrokenExecutor(object):
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+class SlowExecutor(object):
+    def __init__(self, executor, delay):
+        self.executor = executor
+        self.delay = delay
+
+    def submit(self, fn, *args):
+        def slow_fn():
+            time.sleep(self.delay)
+            return fn(*args)
+        return self.executor.submit(slow_fn)
+
+class AsyncLdpTestCase(unittest.TestCase):
+    def run_session(self, pdus, expected_count, decode_offload=None, tracer=None):
+        async def session():
+            ldp = EphemeralPortAsyncLdp("127.0.0.1", tracer=tracer, decode_offload=decode_offload)
+            await ldp.start_tcp()
+            port = ldp.server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"".join(pdus))
+            messages = await asyncio.wait_for(read_messages(reader, expected_count), 5)
+            session_count = len(ldp.sessions)
+            writer.close()
+            ldp.shutdown()
+            await ldp.server.wait_closed()
+            return messages, session_count
+        return asyncio.run(session())
+
+    def test_session_comes_up(self):
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        keepalive_message = LdpKeepaliveMessage(2, {})
+        messages, session_count = self.run_session([build_pdu(init_message), build_pdu(keepalive_message)], 5)
+
+        self.assertEqual([type(message) for message in messages], [
+            LdpInitialisationMessage,
+            LdpKeepaliveMessage,
+            LdpAddressMessage,
+            LdpLabelMappingMessage,
+            LdpLabelMappingMessage,
+        ])
+        self.assertEqual(session_count, 1)
+
+    def test_bad_first_message_closes_session(self):
+        messages, _ = self.run_session([build_pdu(LdpKeepaliveMessage(2, {}))], 2)
+
+        self.assertEqual([type(message) for message in messages], [LdpNotificationMessage])
+
+    def test_session_comes_up_with_decode_offload(self):
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        keepalive_message = LdpKeepaliveMessage(2, {})
+        with ThreadPoolExecutor(1) as executor:
+            # every PDU gets offloaded
+            decode_offload = DecodeOffload(0, executor=executor)
+            messages, _ = self.run_session([build_pdu(init_message), build_pdu(keepalive_message)], 5, decode_offload)
+
+        self.assertEqual([type(message) for message in messages], [
+            LdpInitialisationMessage,
+            LdpKeepaliveMessage,
+            LdpAddressMessage,
+            LdpLabelMappingMessage,
+            LdpLabelMappingMessage,
+        ])
+
+    def test_broken_decode_offload_closes_session(self):
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        with self.assertLogs("trasa.ldp_asyncio", "ERROR"):
+            messages, _ = self.run_session([build_pdu(init_message)], 1, DecodeOffload(0, executor=BrokenExecutor()))
+        # the connection was closed rather than left paused until the hold timer
+        self.assertEqual(messages, [])
+
+    def test_offloaded_runt_message_closes_session(self):
+        runt_pdu = LdpPdu(1, "127.0.0.2", 0, [bytes.fromhex("020100020000")]).pack()
+        with ThreadPoolExecutor(1) as executor:
+            with self.assertLogs("trasa.ldp_asyncio", "WARNING"):
+                messages, _ = self.run_session([runt_pdu], 1, DecodeOffload(0, executor=executor))
+        self.assertEqual(messages, [])
+
+    def test_traces_start_at_the_socket_read(self):
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "127.0.0.1", 0, {})
+        tracer = Tracer(1)
+        with ThreadPoolExecutor(1) as executor:
+            decode_offload = DecodeOffload(0, executor=SlowExecutor(executor, 0.2))
+            self.run_session([build_pdu(init_message), build_pdu(LdpKeepaliveMessage(2, {}))], 5, decode_offload, tracer)
+        # the wait for the pool is part of the trace
+        self.assertGreaterEqual(tracer.slowest_traces()[0]["stages"]["batch"], 0.2)
+
+    def test_silent_peer_times_out(self):
+        async def session():
+            ldp = EphemeralPortAsyncLdp("127.0.0.1")
+            await ldp.start_tcp()
+            ldp.tick()
+            port = ldp.server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # a 1s keepalive time, then nothing more
+            writer.write(build_pdu(LdpInitialisationMessage(1, 1, 1, 0, 0, 0, "127.0.0.1", 0, {})) +
+                         build_pdu(LdpKeepaliveMessage(2, {})))
+            # reads until trasa closes the connection
+            messages = await asyncio.wait_for(read_messages(reader, 100), 5)
+            session_count = len(ldp.sessions)
+            writer.close()
+            ldp.shutdown()
+            await ldp.server.wait_closed()
+            return messages, session_count
+        messages, session_count = asyncio.run(session())
+
+        self.assertEqual(type(messages[-1]), LdpNotificationMessage)
+        self.assertEqual(messages[-1].status_data, 0x14)
+        self.assertEqual(session_count, 0)
@@ -0,0 +1,88 @@
+from trasa.ldp_discovery import build_hello_pdu, peek_hello, parse_hello, AdjacencyTable, HELLOS_FAST_PATH
+from trasa.ldp_pdu import LdpPdu
+from trasa.ldp_message import LdpHelloMessage, LdpKeepaliveMessage
+from trasa.timer_wheel import TimerWheel
+
+import socket
+import unittest
+
+def hello_pdu(lsr_id, hold_time, label_space_id=0, tlvs=None):
+    message = LdpHelloMessage(1, hold_time, False, False, tlvs or {})
+    return LdpPdu(1, lsr_id, label_space_id, [message.pack()]).pack()
+
+class HelloParsingTestCase(unittest.TestCase):
+    def test_peek_hello(self):
+        self.assertEqual(peek_hello(build_hello_pdu("10.0.0.1", 7)), (socket.inet_aton("10.0.0.1"), 0, 15))
+        self.assertEqual(peek_hello(hello_pdu("10.0.0.2", 30, 2)), (socket.inet_aton("10.0.0.2"), 2, 30))
+
+    def test_peek_hello_leaves_anything_odd_to_the_full_parse(self):
+        self.assertIsNone(peek_hello(b"\x00\x01"))
+        self.assertIsNone(peek_hello(hello_pdu("10.0.0.2", 30)[:-1]))
+        keepalive = LdpPdu(1, "10.0.0.2", 0, [LdpKeepaliveMessage(1, {}).pack()] * 3).pack()
+        self.assertIsNone(peek_hello(keepalive))
+        two_hellos = LdpPdu(1, "10.0.0.2", 0, [LdpHelloMessage(1, 15, False, False, {}).pack()] * 2).pack()
+        self.assertIsNone(peek_hello(two_hellos))
+
+    def test_parse_hello(self):
+        pdu = parse_hello(build_hello_pdu("10.0.0.1", 7), ("10.0.0.1", 646))
+        self.assertEqual(pdu.lsr_id, "10.0.0.1")
+        self.assertEqual(pdu.messages[0].hold_time, 15)
+        with self.assertLogs("trasa.discovery", "WARNING"):
+            self.assertIsNone(parse_hello(LdpPdu(1, "10.0.0.2", 0, [LdpKeepaliveMessage(1, {}).pack()]).pack(), None))
+        with self.assertLogs("trasa.discovery", "WARNING"):
+            self.assertIsNone(parse_hello(LdpPdu(1, "10.0.0.2", 0, []).pack(), None))
+
+class AdjacencyTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.wheel = TimerWheel(0.1, lambda: self.now)
+        self.events = []
+        self.table = AdjacencyTable(self.wheel, on_up=lambda adjacency: self.events.append(("up", str(adjacency))),
+                                    on_down=lambda adjacency: self.events.append(("down", str(adjacency))))
+
+    def run_until(self, now):
+        while self.now < now:
+            self.now += 0.1
+            self.wheel.advance()
+
+    def test_adjacency_comes_up_and_times_out(self):
+        adjacency = self.table.hello_received(build_hello_pdu("10.0.0.1", 1), "eth0")
+        self.assertEqual(self.events, [("up", "10.0.0.1:0 via eth0")])
+        self.assertEqual(adjacency.transport_address, "172.26.1.106")
+        self.assertEqual(adjacency.hold_time, 15)
+        self.assertIs(self.table.get("10.0.0.1", 0, "eth0"), adjacency)
+        self.run_until(10)
+        fast_path_hellos = HELLOS_FAST_PATH.child.value
+        self.assertIs(self.table.hello_received(build_hello_pdu("10.0.0.1", 2), "eth0"), adjacency)
+        self.assertEqual(HELLOS_FAST_PATH.child.value, fast_path_hellos + 1)
+        # the second Hello restarted the hold timer
+        self.run_until(24.5)
+        self.assertEqual(len(self.table), 1)
+        self.run_until(25.5)
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual(self.events[-1], ("down", "10.0.0.1:0 via eth0"))
+
+    def test_hold_time_is_the_smaller(self):
+        self.assertEqual(self.table.hello_received(hello_pdu("10.0.0.1", 5), "eth0").hold_time, 5)
+        self.assertEqual(self.table.hello_received(hello_pdu("10.0.0.2", 60), "eth0").hold_time, 15)
+        self.assertEqual(self.table.hello_received(hello_pdu("10.0.0.3", 0), "eth0").hold_time, 15)
+
+    def test_keyed_by_label_space_and_source(self):
+        self.table.hello_received(hello_pdu("10.0.0.1", 15), "eth0")
+        self.table.hello_received(hello_pdu("10.0.0.1", 15), "eth1")
+        self.table.hello_received(hello_pdu("10.0.0.1", 15, 1), "eth0")
+        self.table.hello_received(hello_pdu("10.0.0.1", 15), "eth0")
+        self.assertEqual(len(self.table), 3)
+        self.assertIsNone(self.table.get("10.0.0.1", 0, "eth2"))
+
+    def test_not_a_hello(self):
+        with self.assertLogs("trasa.discovery", "WARNING"):
+            self.assertIsNone(self.table.hello_received(LdpPdu(1, "10.0.0.2", 0, [LdpKeepaliveMessage(1, {}).pack()]).pack(), "eth0"))
+        self.assertEqual(len(self.table), 0)
+
+    def test_clear(self):
+        self.table.hello_received(hello_pdu("10.0.0.1", 15), "eth0")
+        self.table.clear()
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual(len(self.wheel), 0)
+        self.assertEqual(self.events[-1][0], "down")
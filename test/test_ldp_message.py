@@ -1,9 +1,17 @@
 from trasa.ldp_message import LdpMessage, LdpHelloMessage, LdpInitialisationMessage, LdpAddressMessage, \
-                              LdpMessageParser, LdpLabelMappingMessage, LdpNotificationMessage
+                              LdpAddressWithdrawMessage, unpack_address_list_tlv_column, pack_address_list_tlv_column, \
+                              LdpMessageParser, LdpLabelMappingMessage, LdpNotificationMessage, \
+                              unpack_fec_tlv, pack_fec_tlv, unpack_fec_tlv_columns, pack_fec_tlv_columns, \
+                              LdpGenericMessage, LdpMessageCodecRegistry, LdpKeepaliveMessage
+from trasa.error import ParseError
+from trasa.packing_tools import UINT32
+from copy import copy
+import pickle
 import socket
 import struct
 import unittest
 from ipaddress import IPv4Address, IPv4Network
+from array import array
 
 def build_byte_string(hex_stream):
     values = [int(x, 16) for x in map(''.join, zip(*[iter(hex_stream)]*2))]
@@ -103,6 +111,31 @@ class LdpMessageTestCase(unittest.TestCase):
         serialised_message = message.pack()
         self.assertEqual(serialised_message, expected_serialised_message)
 
+    def test_address_message_parses_into_address_column(self):
+        serialised_message = build_byte_string("0300001a000000030101001200010a0143060a0138060606060642060606")
+        message = LdpMessageParser().parse(serialised_message)
+        self.assertEqual(message.address_column.typecode, UINT32)
+        self.assertEqual(list(message.address_column), [
+            int(IPv4Address('10.1.67.6')),
+            int(IPv4Address('10.1.56.6')),
+            int(IPv4Address('6.6.6.6')),
+            int(IPv4Address('66.6.6.6'))
+        ])
+        self.assertEqual(message.pack(), serialised_message)
+
+    def test_address_withdraw_message_parses(self):
+        serialised_message = build_byte_string("0301000e000000040101000600010a014306")
+        message = LdpMessageParser().parse(serialised_message)
+        self.assertTrue(isinstance(message, LdpAddressWithdrawMessage))
+        self.assertEqual(message.message_id, 4)
+        self.assertEqual(message.addresses, [IPv4Address('10.1.67.6')])
+        self.assertEqual(message.tlvs, {})
+
+    def test_address_withdraw_message_packs(self):
+        expected_serialised_message = build_byte_string("0301000e000000040101000600010a014306")
+        message = LdpAddressWithdrawMessage(4, [IPv4Address('10.1.67.6')], {})
+        self.assertEqual(message.pack(), expected_serialised_message)
+
     def test_label_mapping_message_parses(self):
         serialised_message = build_byte_string("0400001800000005010000080200011e0a0000080200000400000003")
         message = LdpMessageParser().parse(serialised_message)
@@ -144,3 +177,210 @@ class LdpMessageTestCase(unittest.TestCase):
         serialised_message = message.pack()
         self.assertEqual(serialised_message, expected_serialised_message)
 
+    def test_label_mapping_message_parses_into_fec_columns(self):
+        serialised_message = build_byte_string("0400001800000005010000080200011e0a0000080200000400000003")
+        message = LdpMessageParser().parse(serialised_message)
+        networks, prefix_lengths = message.fec_columns
+        self.assertEqual(list(networks), [int(IPv4Address('10.0.0.8'))])
+        self.assertEqual(list(prefix_lengths), [30])
+        self.assertEqual(message.pack(), serialised_message)
+
+    def test_keepalive_message_parses(self):
+        serialised_message = build_byte_string("0201000400000009")
+        message = LdpMessageParser().parse(serialised_message)
+        self.assertTrue(isinstance(message, LdpKeepaliveMessage))
+        self.assertEqual(message.message_id, 9)
+        self.assertEqual(message.tlvs, {})
+        self.assertEqual(message.pack(), serialised_message)
+
+    def test_unknown_message_parses_as_generic(self):
+        serialised_message = build_byte_string("3e00000c000000070401000400000001")
+        message = LdpMessageParser().parse(serialised_message)
+        self.assertTrue(isinstance(message, LdpGenericMessage))
+        self.assertEqual(message.message_type, 0x3e00)
+        self.assertEqual(message.message_id, 7)
+        self.assertEqual(message.tlvs, {0x0401: build_byte_string("00000001")})
+        self.assertEqual(message.pack(), serialised_message)
+
+    def test_missing_mandatory_tlv(self):
+        # hello message with only an IPv4 transport address TLV
+        serialised_message = build_byte_string("0100000c0000000804010004ac1a0165")
+        self.assertRaises(ParseError, LdpMessageParser().parse, serialised_message)
+
+    def test_mandatory_tlvs_are_found_out_of_order(self):
+        serialised_message = build_byte_string("0400001800000005020000040000000301000008020001" + "1e0a000008")
+        message = LdpMessageParser().parse(serialised_message)
+        self.assertEqual(message.label, 3)
+        self.assertEqual(message.prefixes, [IPv4Network('10.0.0.8/30')])
+
+    def test_registry_only_decodes_registered_types(self):
+        registry = LdpMessageCodecRegistry()
+        registry.register(LdpKeepaliveMessage)
+        parser = LdpMessageParser(registry)
+        self.assertTrue(isinstance(parser.parse(build_byte_string("0201000400000009")), LdpKeepaliveMessage))
+        self.assertTrue(isinstance(parser.parse(build_byte_string("0100000c000000080400000400" + "2dc000")), LdpGenericMessage))
+
+class LazyLdpMessageTestCase(unittest.TestCase):
+    def test_lazy_hello_message_decodes_on_access(self):
+        serialised_message = build_byte_string("0100001c0000000804000004002dc00004010004ac1a01650402000400000001")
+        message = LdpMessageParser(lazy=True).parse(serialised_message)
+        self.assertTrue(isinstance(message, LdpHelloMessage))
+        self.assertEqual(message.message_id, 8)
+        self.assertFalse(message.decoded)
+        self.assertEqual(message.hold_time, 45)
+        self.assertTrue(message.targeted)
+        self.assertEqual(message.tlvs, {
+            0x0401 : build_byte_string("ac1a0165"),
+            0x0402 : build_byte_string("00000001"),
+        })
+        self.assertEqual(message.pack(), serialised_message)
+
+    def test_lazy_label_mapping_message_decodes_on_access(self):
+        serialised_message = build_byte_string("0400001800000005010000080200011e0a0000080200000400000003")
+        message = LdpMessageParser(lazy=True).parse(serialised_message)
+        self.assertEqual(message.prefixes, [IPv4Network('10.0.0.8/30')])
+        self.assertEqual(message.label, 3)
+
+    def test_lazy_message_packs_undecoded_with_new_message_id(self):
+        serialised_message = build_byte_string("02010009000000098506000180")
+        message = LdpMessageParser(lazy=True).parse(serialised_message)
+        reply_message = copy(message)
+        reply_message.message_id = 10
+        self.assertEqual(reply_message.pack(), build_byte_string("020100090000000a8506000180"))
+        self.assertFalse(reply_message.decoded)
+
+    def test_writes_to_lazy_message_are_kept(self):
+        serialised_message = build_byte_string("0100001c0000000804000004002dc00004010004ac1a01650402000400000001")
+        message = LdpMessageParser(lazy=True).parse(serialised_message)
+        message.hold_time = 99
+        self.assertEqual(message.hold_time, 99)
+        # reading another field decodes the rest, and leaves the written one alone
+        self.assertTrue(message.targeted)
+        self.assertTrue(message.decoded)
+        self.assertEqual(message.hold_time, 99)
+        reparsed_message = LdpMessageParser().parse(message.pack())
+        self.assertEqual((reparsed_message.hold_time, reparsed_message.message_id), (99, 8))
+
+        serialised_message = build_byte_string("0400001800000005010000080200011e0a0000080200000400000003")
+        message = LdpMessageParser(lazy=True).parse(serialised_message)
+        message.label = 77
+        reparsed_message = LdpMessageParser().parse(message.pack())
+        self.assertEqual(reparsed_message.label, 77)
+        self.assertEqual(reparsed_message.prefixes, [IPv4Network('10.0.0.8/30')])
+
+        message = LdpMessageParser().parse(build_byte_string("3e00000c000000070401000400000001"))
+        message.tlvs = {0x0401: build_byte_string("00000002")}
+        self.assertEqual(message.pack(), build_byte_string("3e00000c000000070401000400000002"))
+
+    def test_unknown_message_keeps_raw_bytes(self):
+        serialised_message = build_byte_string("3e00000c000000070401000400000001")
+        message = LdpMessageParser().parse(serialised_message)
+        self.assertFalse(message.decoded)
+        self.assertEqual(message.pack(), serialised_message)
+        self.assertEqual(message.tlvs, {0x0401: build_byte_string("00000001")})
+
+    def test_lazy_message_reports_errors_on_access(self):
+        serialised_message = build_byte_string("0100000c0000000804010004ac1a0165")
+        message = LdpMessageParser(lazy=True).parse(serialised_message)
+        self.assertEqual(message.message_id, 8)
+        self.assertRaises(ParseError, getattr, message, "hold_time")
+
+    def test_truncated_messages_raise_parse_error(self):
+        truncated_messages = [
+            # no room for the message ID
+            "020100020000",
+            "3e0000020000",
+            # mandatory TLVs of the wrong length
+            "0100000a0000000804000002002d",
+            "0001000c00000001030000040000000a",
+            "0200000c000000010500000400010000",
+            "0400001600000005010000080200011e0a000008020000020003",
+        ]
+        for hex_stream in truncated_messages:
+            serialised_message = build_byte_string(hex_stream)
+            with self.subTest(message=hex_stream):
+                self.assertRaises(ParseError, LdpMessageParser().parse, serialised_message)
+                try:
+                    message = LdpMessageParser(lazy=True).parse(serialised_message)
+                except ParseError:
+                    continue
+                self.assertRaises(ParseError, message.decode)
+
+    def test_lazy_message_pickles_without_decoding(self):
+        serialised_message = build_byte_string("0400001800000005010000080200011e0a0000080200000400000003")
+        message = pickle.loads(pickle.dumps(LdpMessageParser(lazy=True).parse(serialised_message)))
+        self.assertFalse(message.decoded)
+        self.assertEqual(message.label, 3)
+        self.assertTrue(message.decoded)
+
+    def test_messages_have_no_instance_dict(self):
+        message = LdpHelloMessage(8, 45, True, True, {})
+        self.assertFalse(hasattr(message, "__dict__"))
+        self.assertRaises(AttributeError, setattr, message, "not_a_field", 1)
+
+    def test_missing_attribute_still_raises(self):
+        message = LdpKeepaliveMessage(2, {})
+        self.assertRaises(AttributeError, getattr, message, "no_such_field")
+
+class FecTlvTestCase(unittest.TestCase):
+    def test_fec_tlv_columns_parse(self):
+        packed_fecs = build_byte_string("020001000200010801020001200a0000010200011e0a000008")
+        networks, prefix_lengths = unpack_fec_tlv_columns(packed_fecs)
+        self.assertEqual(networks.typecode, UINT32)
+        self.assertEqual(prefix_lengths.typecode, 'B')
+        self.assertEqual(list(networks), [0, int(IPv4Address('1.0.0.0')), int(IPv4Address('10.0.0.1')), int(IPv4Address('10.0.0.8'))])
+        self.assertEqual(list(prefix_lengths), [0, 8, 32, 30])
+
+    def test_fec_tlv_columns_mask_host_bits(self):
+        packed_fecs = build_byte_string("0200011e0a00000b")
+        networks, prefix_lengths = unpack_fec_tlv_columns(packed_fecs)
+        self.assertEqual(list(networks), [int(IPv4Address('10.0.0.8'))])
+
+    def test_fec_tlv_columns_pack(self):
+        expected_packed_fecs = build_byte_string("020001000200010801020001200a0000010200011e0a000008")
+        networks = array('I', [0, int(IPv4Address('1.0.0.0')), int(IPv4Address('10.0.0.1')), int(IPv4Address('10.0.0.8'))])
+        prefix_lengths = array('B', [0, 8, 32, 30])
+        self.assertEqual(pack_fec_tlv_columns(networks, prefix_lengths), expected_packed_fecs)
+
+    def test_fec_tlv_round_trips(self):
+        prefixes = [IPv4Network((index << 8, 24)) for index in range(1, 5000)]
+        packed_fecs = pack_fec_tlv(prefixes)
+        self.assertEqual(unpack_fec_tlv(packed_fecs), prefixes)
+
+    def test_fec_tlv_truncated(self):
+        packed_fecs = build_byte_string("0200011e0a00")
+        self.assertRaises(ParseError, unpack_fec_tlv_columns, packed_fecs)
+
+    def test_fec_tlv_truncated_header(self):
+        packed_fecs = build_byte_string("0200011e0a0000080200")
+        self.assertRaises(ParseError, unpack_fec_tlv_columns, packed_fecs)
+
+    def test_fec_tlv_bad_prefix_length(self):
+        packed_fecs = build_byte_string("020001210a00000800")
+        self.assertRaises(ParseError, unpack_fec_tlv_columns, packed_fecs)
+
+    def test_fec_tlv_bad_fec_type(self):
+        packed_fecs = build_byte_string("0300011e0a000008")
+        self.assertRaises(ParseError, unpack_fec_tlv_columns, packed_fecs)
+
+class AddressListTlvTestCase(unittest.TestCase):
+    def test_address_list_column_parses(self):
+        packed_addresses = build_byte_string("00010a0143060a0138060606060642060606")
+        addresses = unpack_address_list_tlv_column(packed_addresses)
+        self.assertEqual(list(addresses), [0x0a014306, 0x0a013806, 0x06060606, 0x42060606])
+
+    def test_address_list_column_packs(self):
+        addresses = array('I', [0x0a014306, 0x0a013806, 0x06060606, 0x42060606])
+        packed_addresses = pack_address_list_tlv_column(addresses)
+        self.assertEqual(packed_addresses, build_byte_string("00010a0143060a0138060606060642060606"))
+        # the caller's column is left alone
+        self.assertEqual(addresses[0], 0x0a014306)
+
+    def test_address_list_rejects_other_families(self):
+        self.assertRaises(ParseError, unpack_address_list_tlv_column, build_byte_string("00020a014306"))
+
+    def test_address_list_rejects_partial_address(self):
+        self.assertRaises(ParseError, unpack_address_list_tlv_column, build_byte_string("00010a0143"))
+
+    def test_address_list_rejects_truncated_family(self):
+        self.assertRaises(ParseError, unpack_address_list_tlv_column, build_byte_string("00"))
@@ -1,4 +1,6 @@
-from trasa.ldp_pdu import LdpPdu, parse_ldp_pdu
+from trasa.ldp_pdu import LdpPdu, LdpPduBuilder, parse_ldp_pdu
+from trasa.framer import PduFramer
+from trasa.error import ParseError
 import socket
 import struct
 import unittest
@@ -16,6 +18,9 @@ class LdpPduTestCase(unittest.TestCase):
         self.assertEqual(pdu.label_space_id, 0)
         self.assertEqual(len(pdu.messages), 1)
 
+    def test_truncated_header_raises_parse_error(self):
+        self.assertRaises(ParseError, parse_ldp_pdu, build_byte_string("00010026ac1a"))
+
     def test_single_message_packs(self):
         messages = [build_byte_string("0100001c0000000804000004002dc00004010004ac1a01650402000400000001")]
         expected_serialised_pdu = build_byte_string("00010026ac1a016500000100001c0000000804000004002dc00004010004ac1a01650402000400000001")
@@ -30,3 +35,58 @@ class LdpPduTestCase(unittest.TestCase):
         self.assertEqual(pdu.lsr_id, "66.6.6.6")
         self.assertEqual(pdu.label_space_id, 0)
         self.assertEqual(len(pdu.messages), 15)
+
+class LdpPduBuilderTestCase(unittest.TestCase):
+    def test_messages_share_a_pdu(self):
+        messages = [
+            build_byte_string("0201000400000001"),
+            build_byte_string("0100001c0000000804000004002dc00004010004ac1a01650402000400000001")
+        ]
+        builder = LdpPduBuilder("172.26.1.101", 0)
+        for message in messages:
+            self.assertFalse(builder.add(message))
+        self.assertEqual(builder.take(), LdpPdu(1, "172.26.1.101", 0, messages).pack())
+        self.assertEqual(builder.take(), b"")
+
+    def test_pdus_split_at_max_pdu_length(self):
+        message = build_byte_string("0201000400000001")
+        # identifier plus three 8 byte messages
+        builder = LdpPduBuilder("172.26.1.101", 0, 6 + 3 * len(message))
+        for _ in range(7):
+            builder.add(message)
+        pdus = PduFramer().feed(builder.take())
+        self.assertEqual([len(parse_ldp_pdu(pdu).messages) for pdu in pdus], [3, 3, 1])
+        self.assertTrue(all(len(pdu) - 4 <= 6 + 3 * len(message) for pdu in pdus))
+
+    def test_zero_max_pdu_length_means_default(self):
+        builder = LdpPduBuilder("172.26.1.101", 0, 0)
+        self.assertEqual(builder.max_pdu_length, 4096)
+
+    def test_oversized_message_goes_in_its_own_pdu(self):
+        builder = LdpPduBuilder("172.26.1.101", 0, 16)
+        builder.add(build_byte_string("0201000400000001"))
+        builder.add(build_byte_string("3e00000c000000070401000400000001"))
+        pdus = PduFramer().feed(builder.take())
+        self.assertEqual(len(pdus), 2)
+
+    def test_add_asks_for_flush_at_threshold(self):
+        builder = LdpPduBuilder("172.26.1.101", 0, flush_threshold=20)
+        self.assertFalse(builder.add(build_byte_string("0201000400000001")))
+        self.assertTrue(builder.add(build_byte_string("0201000400000002")))
+
+    def test_flush_writes_once(self):
+        class FakeSocket(object):
+            def __init__(self):
+                self.writes = []
+
+            def sendall(self, data):
+                self.writes.append(data)
+
+        socket = FakeSocket()
+        builder = LdpPduBuilder("172.26.1.101", 0)
+        builder.add(build_byte_string("0201000400000001"))
+        builder.add(build_byte_string("0201000400000002"))
+        self.assertEqual(builder.flush(socket), 26)
+        self.assertEqual(len(socket.writes), 1)
+        self.assertEqual(builder.flush(socket), 0)
+        self.assertEqual(len(socket.writes), 1)
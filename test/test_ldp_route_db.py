@@ -1,6 +1,8 @@
 from trasa.ldp_route_db import LdpRouteDb
 
 from ipaddress import IPv4Address, IPv4Network
+from array import array
+from random import Random
 import unittest
 
 class LdpRouteDbTestCase(unittest.TestCase):
@@ -17,3 +19,92 @@ class LdpRouteDbTestCase(unittest.TestCase):
         self.assertEqual(len(route_db.routes), 1)
         route_db.remove_route((IPv4Network('10.0.0.8/30'), 16))
         self.assertEqual(len(route_db.routes), 0)
+
+    def test_bindings_by_fec_and_peer(self):
+        route_db = LdpRouteDb()
+        route_db.add_binding(0x0a000000, 24, "1.1.1.1", 100)
+        route_db.add_binding(0x0a000000, 24, "2.2.2.2", 200)
+        route_db.add_binding(0x0a000100, 24, "1.1.1.1", 101)
+        self.assertEqual(len(route_db), 3)
+        self.assertEqual(sorted(route_db.bindings_for(0x0a000000, 24)), [("1.1.1.1", 100), ("2.2.2.2", 200)])
+        self.assertEqual(route_db.bindings_for(0x0a000000, 16), [])
+        self.assertEqual(route_db.label_for(0x0a000100, 24, "1.1.1.1"), 101)
+        self.assertIsNone(route_db.label_for(0x0a000100, 24, "2.2.2.2"))
+        self.assertEqual(sorted(route_db.peer_bindings("1.1.1.1")), [(0x0a000000, 24, 100), (0x0a000100, 24, 101)])
+
+    def test_new_mapping_replaces_label(self):
+        route_db = LdpRouteDb()
+        route_db.add_binding(0x0a000000, 24, "1.1.1.1", 100)
+        route_db.add_binding(0x0a000000, 24, "1.1.1.1", 300)
+        self.assertEqual(len(route_db), 1)
+        self.assertEqual(route_db.bindings_for(0x0a000000, 24), [("1.1.1.1", 300)])
+
+    def test_repeated_fec_in_one_mapping(self):
+        route_db = LdpRouteDb()
+        route_db.add_binding(0x0a000000, 24, "2.2.2.2", 200)
+        route_db.add_bindings(array('I', [0x0a000000, 0x0a000000]), array('B', [24, 24]), "1.1.1.1", 100)
+        self.assertEqual(len(route_db), 2)
+        self.assertEqual(route_db.bindings_for(0x0a000000, 24), [("1.1.1.1", 100), ("2.2.2.2", 200)])
+
+    def test_withdraw_peer(self):
+        route_db = LdpRouteDb()
+        route_db.add_bindings(array('I', [0x0a000000, 0x0a000100, 0x0a000200]), array('B', [24, 24, 24]), "1.1.1.1", 100)
+        route_db.add_binding(0x0a000100, 24, "2.2.2.2", 200)
+        self.assertEqual(route_db.withdraw_peer("1.1.1.1"), 3)
+        self.assertEqual(route_db.withdraw_peer("1.1.1.1"), 0)
+        self.assertEqual(route_db.withdraw_peer("3.3.3.3"), 0)
+        self.assertEqual(len(route_db), 1)
+        self.assertEqual(route_db.bindings_for(0x0a000100, 24), [("2.2.2.2", 200)])
+        self.assertEqual(route_db.bindings_for(0x0a000000, 24), [])
+        # freed slots get reused
+        route_db.add_binding(0x0b000000, 8, "1.1.1.1", 100)
+        self.assertEqual(len(route_db.fec_keys), 4)
+
+    def test_remove_binding(self):
+        route_db = LdpRouteDb()
+        route_db.add_binding(0x0a000000, 24, "1.1.1.1", 100)
+        route_db.add_binding(0x0a000000, 24, "2.2.2.2", 200)
+        route_db.add_binding(0x0a000000, 24, "3.3.3.3", 300)
+        self.assertTrue(route_db.remove_binding(0x0a000000, 24, "2.2.2.2"))
+        self.assertFalse(route_db.remove_binding(0x0a000000, 24, "2.2.2.2"))
+        self.assertEqual(sorted(route_db.bindings_for(0x0a000000, 24)), [("1.1.1.1", 100), ("3.3.3.3", 300)])
+        self.assertEqual(list(route_db.peer_bindings("3.3.3.3")), [(0x0a000000, 24, 300)])
+
+    def test_remove_bindings(self):
+        route_db = LdpRouteDb()
+        route_db.add_bindings(array('I', [0x0a000000, 0x0a000100, 0x0a000200]), array('B', [24, 24, 24]), "1.1.1.1", 100)
+        self.assertEqual(route_db.remove_bindings(array('I', [0x0a000000, 0x0a000200, 0x0a000300]), array('B', [24, 24, 24]), "1.1.1.1"), 2)
+        self.assertEqual(route_db.remove_bindings(array('I', [0x0a000100]), array('B', [24]), "2.2.2.2"), 0)
+        self.assertEqual(list(route_db.peer_bindings("1.1.1.1")), [(0x0a000100, 24, 100)])
+
+    def test_iterates_in_prefix_order(self):
+        route_db = LdpRouteDb()
+        route_db.add_binding(0x0b000000, 8, "1.1.1.1", 1)
+        route_db.add_binding(0x0a000000, 24, "1.1.1.1", 2)
+        route_db.add_binding(0x0a000000, 16, "1.1.1.1", 3)
+        self.assertEqual([(network, prefix_length) for network, prefix_length, _, _ in route_db], [
+            (0x0a000000, 16),
+            (0x0a000000, 24),
+            (0x0b000000, 8),
+        ])
+
+    def test_random_operations_match_dict(self):
+        random = Random(1)
+        route_db = LdpRouteDb()
+        expected = {}
+        peers = ["1.1.1.1", "2.2.2.2", "3.3.3.3"]
+        for _ in range(2000):
+            network, peer = random.randrange(16) << 8, random.choice(peers)
+            operation = random.random()
+            if operation < 0.6:
+                label = random.randrange(16, 1000)
+                route_db.add_binding(network, 24, peer, label)
+                expected[(network, peer)] = label
+            elif operation < 0.95:
+                self.assertEqual(route_db.remove_binding(network, 24, peer), expected.pop((network, peer), None) is not None)
+            else:
+                route_db.withdraw_peer(peer)
+                expected = dict((key, label) for key, label in expected.items() if key[1] != peer)
+        self.assertEqual(len(route_db), len(expected))
+        self.assertEqual(sorted((network, peer, label) for network, _, peer, label in route_db),
+                         sorted((network, peer, label) for (network, peer), label in expected.items()))
@@ -0,0 +1,122 @@
+from trasa.ldp_session import LdpSession
+from trasa.ldp_pdu import LdpPdu, parse_ldp_pdu
+from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage, LdpAddressMessage, \
+                              LdpLabelMappingMessage, LdpNotificationMessage
+from trasa.framer import PduFramer
+from trasa.timer_wheel import TimerWheel
+from trasa.ldp_route_db import LdpRouteDb
+from ipaddress import IPv4Network
+from itertools import count
+
+import unittest
+
+def build_pdu(*messages):
+    return LdpPdu(1, "172.26.1.112", 0, [message.pack() for message in messages]).pack()
+
+def sent_messages(session):
+    messages = []
+    for serialised_pdu in PduFramer().feed(session.send_queue.take()):
+        messages.extend(parse_ldp_pdu(serialised_pdu).messages)
+    return messages
+
+class LdpSessionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = LdpSession("172.26.1.106", "172.26.1.112", 646, count(1).__next__)
+
+    def test_session_comes_up(self):
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {})
+        keepalive_message = LdpKeepaliveMessage(2, {})
+        self.session.pdus_received([build_pdu(init_message), build_pdu(keepalive_message)])
+
+        messages = sent_messages(self.session)
+        self.assertEqual([type(message) for message in messages], [
+            LdpInitialisationMessage,
+            LdpKeepaliveMessage,
+            LdpAddressMessage,
+            LdpLabelMappingMessage,
+            LdpLabelMappingMessage,
+        ])
+        self.assertEqual([message.message_id for message in messages], [1, 2, 3, 4, 5])
+        self.assertEqual(self.session.state_machine.state, "OPERATIONAL")
+        self.assertFalse(self.session.closed)
+
+    def test_replies_to_a_batch_share_a_pdu(self):
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {})
+        keepalive_message = LdpKeepaliveMessage(2, {})
+        self.session.pdus_received([build_pdu(init_message, keepalive_message)])
+
+        self.assertEqual(len(PduFramer().feed(self.session.send_queue.take())), 1)
+
+    def test_bad_first_message_closes_session(self):
+        self.session.pdus_received([build_pdu(LdpKeepaliveMessage(2, {}))])
+
+        messages = sent_messages(self.session)
+        self.assertEqual([type(message) for message in messages], [LdpNotificationMessage])
+        self.assertTrue(self.session.closed)
+
+    def test_bindings_are_keyed_by_lsr_id(self):
+        route_db = LdpRouteDb()
+        # the peer's transport address isn't its LSR ID
+        session = LdpSession("172.26.1.106", "192.0.2.1", 646, count(1).__next__, route_db=route_db)
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {})
+        mapping_message = LdpLabelMappingMessage(3, [IPv4Network("10.1.0.0/16")], 100, {})
+        session.pdus_received([build_pdu(init_message), build_pdu(LdpKeepaliveMessage(2, {})), build_pdu(mapping_message)])
+        self.assertEqual(route_db.bindings_for(0x0a010000, 16), [("172.26.1.112", 100)])
+        route_db.add_binding(0x0a010000, 16, "192.0.2.1", 200)
+        session.close()
+        self.assertEqual(route_db.bindings_for(0x0a010000, 16), [("192.0.2.1", 200)])
+
+    def test_queue_depth(self):
+        self.assertEqual(self.session.queue_depth, 0)
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {})
+        self.session.pdus_received([build_pdu(init_message)])
+        self.assertGreater(self.session.queue_depth, 0)
+
+class LdpSessionTimersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.wheel = TimerWheel(0.1, lambda: self.now)
+        self.session = LdpSession("172.26.1.106", "172.26.1.112", 646, count(1).__next__)
+        self.closed = []
+        self.session.on_close = lambda: self.closed.append(self.now)
+        self.session.start_timers(self.wheel)
+
+    def run_until(self, now):
+        while self.now < now:
+            self.now += 0.1
+            self.wheel.advance()
+
+    def bring_up(self, keepalive_time):
+        init_message = LdpInitialisationMessage(1, 1, keepalive_time, 0, 0, 0, "172.26.1.106", 0, {})
+        self.session.pdus_received([build_pdu(init_message), build_pdu(LdpKeepaliveMessage(2, {}))])
+        sent_messages(self.session)
+
+    def test_keepalives_at_a_third_of_negotiated_time(self):
+        self.bring_up(30)
+        self.assertEqual(self.session.state_machine.keepalive_time, 30)
+        self.run_until(25)
+        messages = sent_messages(self.session)
+        # 10s less up to 10% jitter each
+        self.assertIn(len(messages), (2, 3))
+        self.assertTrue(all(isinstance(message, LdpKeepaliveMessage) for message in messages))
+        self.assertEqual(self.closed, [])
+
+    def test_hold_timer_closes_silent_session(self):
+        self.bring_up(30)
+        self.run_until(20)
+        # hearing from the peer restarts the hold timer
+        self.session.pdus_received([build_pdu(LdpKeepaliveMessage(3, {}))])
+        self.run_until(49)
+        self.assertEqual(self.closed, [])
+        sent_messages(self.session)
+        self.run_until(51)
+        self.assertEqual(len(self.closed), 1)
+        self.assertTrue(self.session.closed)
+        messages = sent_messages(self.session)
+        self.assertEqual(type(messages[-1]), LdpNotificationMessage)
+        self.assertEqual(messages[-1].status_data, 0x14)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_close_stops_timers(self):
+        self.session.close()
+        self.assertEqual(len(self.wheel), 0)
@@ -1,5 +1,7 @@
 from trasa.ldp_state_machine import LdpStateMachine
-from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage, LdpNotificationMessage
+from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage, LdpNotificationMessage, LdpLabelMappingMessage
+from trasa.label_manager import LabelManager
+from trasa.event import EventTimerExpired
 
 import unittest
 
@@ -54,3 +56,52 @@ class LdpStateMachineTestCase(unittest.TestCase):
         message = LdpKeepaliveMessage(2, {})
         outbound_messages = state_machine.message_received(message)
         self.assertEqual(state_machine.state, "OPERATIONAL")
+
+    def test_max_pdu_length_negotiated(self):
+        state_machine = LdpStateMachine("172.26.1.106", "172.26.1.112")
+        self.assertEqual(state_machine.max_pdu_length, 4096)
+        message = LdpInitialisationMessage(1, 1, 180, 0, 0, 1500, "172.26.1.112", 0, {})
+        state_machine.message_received(message)
+        self.assertEqual(state_machine.max_pdu_length, 1500)
+
+    def test_small_max_pdu_length_means_default(self):
+        state_machine = LdpStateMachine("172.26.1.106", "172.26.1.112")
+        message = LdpInitialisationMessage(1, 1, 180, 0, 0, 255, "172.26.1.112", 0, {})
+        state_machine.message_received(message)
+        self.assertEqual(state_machine.max_pdu_length, 4096)
+
+    def test_mappings_use_allocated_labels(self):
+        label_manager = LabelManager()
+        labels = []
+        for remote_ip in ("172.26.1.112", "172.26.1.113"):
+            state_machine = LdpStateMachine("172.26.1.106", remote_ip, label_manager=label_manager)
+            state_machine.message_received(LdpInitialisationMessage(1, 1, 180, 0, 0, 0, remote_ip, 0, {}))
+            outbound_messages = state_machine.message_received(LdpKeepaliveMessage(2, {}))
+            labels.append([message.label for message in outbound_messages if isinstance(message, LdpLabelMappingMessage)])
+        # a label per FEC, the same for every peer
+        self.assertEqual(len(set(labels[0])), 2)
+        self.assertEqual(labels[0], labels[1])
+        self.assertEqual(label_manager.utilisation()["default"][0], 2)
+
+    def test_keepalive_time_negotiated(self):
+        state_machine = LdpStateMachine("172.26.1.106", "172.26.1.112")
+        self.assertEqual(state_machine.keepalive_time, 180)
+        outbound_messages = state_machine.message_received(LdpInitialisationMessage(1, 1, 30, 0, 0, 0, "172.26.1.112", 0, {}))
+        self.assertEqual(state_machine.keepalive_time, 30)
+        self.assertEqual(outbound_messages[0].keepalive_time, 180)
+
+    def test_hold_timer_expiry(self):
+        state_machine = LdpStateMachine("172.26.1.106", "172.26.1.112")
+        self.assertEqual(state_machine.timer_expired(EventTimerExpired("keepalive")), [])
+        outbound_messages = state_machine.timer_expired(EventTimerExpired("hold"))
+        self.assertEqual([type(message) for message in outbound_messages], [LdpNotificationMessage])
+        self.assertEqual(outbound_messages[0].status_data, 0x14)
+        self.assertEqual(state_machine.state, "NONEXISTENT")
+
+    def test_shutdown(self):
+        state_machine = LdpStateMachine("172.26.1.106", "172.26.1.112")
+        outbound_messages = state_machine.shutdown()
+        self.assertEqual([type(message) for message in outbound_messages], [LdpNotificationMessage])
+        self.assertEqual(outbound_messages[0].status_data, 0x0a)
+        self.assertEqual(state_machine.state, "NONEXISTENT")
+        self.assertEqual(state_machine.shutdown(), [])
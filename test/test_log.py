@@ -0,0 +1,43 @@
+from trasa.log import get_logger, QueueLogging
+
+import logging
+import unittest
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class LogTestCase(unittest.TestCase):
+    def test_subsystem_loggers(self):
+        parent_logger = logging.getLogger("trasa")
+        logger = get_logger("session")
+        self.assertEqual(logger.name, "trasa.session")
+        self.assertIs(logger.parent, parent_logger)
+
+    def test_queue_logging_delivers_records(self):
+        handler = ListHandler()
+        queue_logging = QueueLogging([handler], logging.DEBUG, "trasa_test")
+        queue_logging.start()
+        try:
+            logging.getLogger("trasa_test.codec").debug("Message type: %s", 0x100)
+        finally:
+            queue_logging.stop()
+        self.assertEqual([record.getMessage() for record in handler.records], ["Message type: 256"])
+
+    def test_disabled_debug_is_not_formatted(self):
+        class Exploding(object):
+            def __str__(self):
+                raise AssertionError("formatted while disabled")
+
+        handler = ListHandler()
+        queue_logging = QueueLogging([handler], logging.INFO, "trasa_test")
+        queue_logging.start()
+        try:
+            logging.getLogger("trasa_test.codec").debug("Message: %s", Exploding())
+        finally:
+            queue_logging.stop()
+        self.assertEqual(handler.records, [])
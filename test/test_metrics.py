@@ -0,0 +1,77 @@
+from trasa.metrics import MetricsRegistry, MetricsServer, parse_metrics_address
+
+import unittest
+import urllib.request
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("ldp_things", "Things seen")
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(registry.render(),
+            "# HELP ldp_things Things seen\n"
+            "# TYPE ldp_things counter\n"
+            "ldp_things_total 3\n")
+
+    def test_registering_twice_returns_the_same_family(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("ldp_things", "Things seen")
+        self.assertIs(registry.counter("ldp_things", "Things seen"), counter)
+        with self.assertRaises(ValueError):
+            registry.gauge("ldp_things", "Things seen")
+
+    def test_labels(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("ldp_messages", "Messages", ("type",))
+        counter.labels("Hello").inc()
+        counter.labels("Hello").inc()
+        counter.labels('a"b').inc()
+        lines = registry.render().splitlines()
+        self.assertIn('ldp_messages_total{type="Hello"} 2', lines)
+        self.assertIn('ldp_messages_total{type="a\\"b"} 1', lines)
+        with self.assertRaises(ValueError):
+            counter.labels("Hello", "extra")
+
+    def test_gauge_callback(self):
+        registry = MetricsRegistry()
+        gauge = registry.gauge("ldp_depth", "Depth", ("peer",))
+        callback = lambda: [(("1.1.1.1",), 10)]
+        gauge.add_callback(callback)
+        self.assertIn('ldp_depth{peer="1.1.1.1"} 10', registry.render().splitlines())
+        gauge.remove_callback(callback)
+        self.assertNotIn('ldp_depth{peer="1.1.1.1"} 10', registry.render().splitlines())
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("ldp_size", "Sizes", (10, 100))
+        histogram.observe(5)
+        histogram.observe(10)
+        histogram.observe(50)
+        histogram.observe(500)
+        self.assertEqual(registry.render().splitlines()[2:], [
+            'ldp_size_bucket{le="10"} 2',
+            'ldp_size_bucket{le="100"} 3',
+            'ldp_size_bucket{le="+Inf"} 4',
+            'ldp_size_sum 565',
+            'ldp_size_count 4',
+        ])
+
+class MetricsServerTestCase(unittest.TestCase):
+    def test_parse_metrics_address(self):
+        self.assertEqual(parse_metrics_address("127.0.0.1:9646"), ("127.0.0.1", 9646))
+        self.assertEqual(parse_metrics_address("[::1]:9646"), ("::1", 9646))
+        self.assertEqual(parse_metrics_address("/tmp/trasa.sock"), "/tmp/trasa.sock")
+
+    def test_scrape(self):
+        registry = MetricsRegistry()
+        registry.counter("ldp_things", "Things seen").inc()
+        server = MetricsServer(registry, ("127.0.0.1", 0))
+        server.start()
+        try:
+            port = server.server.server_address[1]
+            with urllib.request.urlopen("http://127.0.0.1:%d/metrics" % port) as response:
+                body = response.read().decode("utf-8")
+        finally:
+            server.stop()
+        self.assertIn("ldp_things_total 1", body.splitlines())
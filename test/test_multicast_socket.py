@@ -0,0 +1,54 @@
+from trasa.multicast_socket import MulticastSocket
+from trasa.error import SocketClosedError
+
+import time
+import unittest
+
+class MulticastSocketTestCase(unittest.TestCase):
+    def setUp(self):
+        self.multicast_socket = MulticastSocket("224.0.0.2", 0, "127.0.0.1")
+        try:
+            self.multicast_socket.bind()
+        except OSError as e:
+            self.skipTest("No multicast on loopback: %s" % e)
+        # sends loop back to us on the port we were given
+        self.multicast_socket.port = self.multicast_socket.socket.getsockname()[1]
+        self.received = []
+
+    def tearDown(self):
+        self.multicast_socket.shutdown()
+
+    def handler(self, data, datagram):
+        self.received.append((bytes(data), datagram))
+
+    def send(self, count):
+        for i in range(count):
+            self.multicast_socket.send(b"packet %d" % i)
+        time.sleep(0.05)
+
+    def test_drains_everything_queued(self):
+        self.send(5)
+        self.assertEqual(self.multicast_socket.drain(self.handler), 5)
+        self.assertEqual([data for data, _ in self.received], [b"packet %d" % i for i in range(5)])
+        datagram = self.received[0][1]
+        self.assertEqual(datagram.source[0], "127.0.0.1")
+        self.assertEqual(datagram.interface, "lo")
+        self.assertEqual(datagram.local_address, "127.0.0.1")
+        self.assertEqual(datagram.destination, "224.0.0.2")
+        # nothing left, and it doesn't block
+        self.assertEqual(self.multicast_socket.drain(self.handler), 0)
+
+    def test_batches_are_limited(self):
+        self.send(10)
+        self.assertEqual([self.multicast_socket.drain(self.handler, 4) for _ in range(4)], [4, 4, 2, 0])
+        self.assertEqual(len(self.received), 10)
+
+    def test_data_is_a_view_of_one_buffer(self):
+        self.send(2)
+        views = []
+        self.multicast_socket.drain(lambda data, _: views.append(data))
+        self.assertTrue(all(view.obj is self.multicast_socket.buffer for view in views))
+
+    def test_closed_socket(self):
+        self.multicast_socket.shutdown()
+        self.assertRaises(SocketClosedError, self.multicast_socket.drain, self.handler)
@@ -0,0 +1,108 @@
+from trasa.prefix_trie import PrefixTrie
+from trasa.ip import IPAddress, IPPrefix, IP4Address, IP4Prefix, IP6Address, IP6Prefix
+from random import Random
+import unittest
+
+def random_prefix(random, prefix_class):
+    # clustered under a few networks so prefixes nest and share branches
+    bit_length = prefix_class.BIT_LENGTH
+    length = random.randint(0, bit_length)
+    value = (random.randrange(4) << (bit_length - 8)) | random.getrandbits(bit_length - 8)
+    return prefix_class(value, length).network()
+
+class PrefixTrieTestCase(unittest.TestCase):
+    def test_exact_match(self):
+        trie = PrefixTrie()
+        trie[IPPrefix.from_string("10.0.0.0/8")] = 1
+        trie[IPPrefix.from_string("10.1.0.0/16")] = 2
+        self.assertEqual(trie[IPPrefix.from_string("10.1.0.0/16")], 2)
+        self.assertEqual(trie.get(IPPrefix.from_string("10.1.0.0/17")), None)
+        self.assertRaises(KeyError, lambda: trie[IPPrefix.from_string("10.0.0.0/9")])
+        self.assertTrue(IPPrefix.from_string("10.0.0.0/8") in trie)
+        self.assertFalse(IPPrefix.from_string("::/0") in trie)
+        self.assertEqual(len(trie), 2)
+
+    def test_host_bits_are_ignored(self):
+        trie = PrefixTrie()
+        trie[IPPrefix.from_string("10.1.2.3/16")] = 1
+        self.assertEqual(trie[IPPrefix.from_string("10.1.0.0/16")], 1)
+        self.assertEqual(list(trie), [IPPrefix.from_string("10.1.0.0/16")])
+
+    def test_longest_match(self):
+        trie = PrefixTrie()
+        trie[IPPrefix.from_string("0.0.0.0/0")] = "default"
+        trie[IPPrefix.from_string("10.0.0.0/8")] = "eight"
+        trie[IPPrefix.from_string("10.1.2.0/24")] = "twenty four"
+        trie[IPPrefix.from_string("2001:db8::/32")] = "v6"
+        self.assertEqual(trie.longest_match(IPAddress.from_string("10.1.2.3")), (IPPrefix.from_string("10.1.2.0/24"), "twenty four"))
+        self.assertEqual(trie.longest_match(IPAddress.from_string("10.1.3.3"))[1], "eight")
+        self.assertEqual(trie.longest_match(IPAddress.from_string("11.1.3.3"))[1], "default")
+        self.assertEqual(trie.longest_match(IPPrefix.from_string("10.1.0.0/16"))[1], "eight")
+        self.assertEqual(trie.longest_match(IPAddress.from_string("2001:db8::1"))[1], "v6")
+        self.assertEqual(trie.longest_match(IPAddress.from_string("2001:db9::1")), None)
+
+    def test_covering(self):
+        trie = PrefixTrie()
+        for string in ("10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", "10.2.0.0/16"):
+            trie[IPPrefix.from_string(string)] = string
+        self.assertEqual([item for _, item in trie.covering(IPAddress.from_string("10.1.2.3"))],
+                         ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24"])
+        self.assertEqual(trie.covering(IPAddress.from_string("11.0.0.1")), [])
+
+    def test_subtree(self):
+        trie = PrefixTrie()
+        for string in ("10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", "10.2.0.0/16", "11.0.0.0/8"):
+            trie[IPPrefix.from_string(string)] = string
+        self.assertEqual([item for _, item in trie.subtree(IPPrefix.from_string("10.0.0.0/8"))],
+                         ["10.0.0.0/8", "10.1.0.0/16", "10.1.2.0/24", "10.2.0.0/16"])
+        self.assertEqual([item for _, item in trie.subtree(IPPrefix.from_string("10.0.0.0/14"))],
+                         ["10.1.0.0/16", "10.1.2.0/24", "10.2.0.0/16"])
+        self.assertEqual(list(trie.subtree(IPPrefix.from_string("12.0.0.0/8"))), [])
+
+    def test_delete(self):
+        trie = PrefixTrie()
+        trie[IPPrefix.from_string("10.1.0.0/16")] = 1
+        trie[IPPrefix.from_string("10.2.0.0/16")] = 2
+        del trie[IPPrefix.from_string("10.1.0.0/16")]
+        self.assertEqual(list(trie.items()), [(IPPrefix.from_string("10.2.0.0/16"), 2)])
+        self.assertRaises(KeyError, trie.__delitem__, IPPrefix.from_string("10.1.0.0/16"))
+        self.assertRaises(KeyError, trie.__delitem__, IPPrefix.from_string("10.0.0.0/8"))
+        # the branch point that joined them is gone too
+        self.assertTrue(trie.roots[IP4Prefix.INET_TYPE].zero is not None)
+        self.assertEqual(trie.roots[IP4Prefix.INET_TYPE].zero.length, 16)
+
+    def test_iterates_in_prefix_order(self):
+        trie = PrefixTrie()
+        prefixes = [IPPrefix.from_string(x) for x in ("10.1.0.0/24", "::/0", "10.1.0.0/16", "10.0.0.0/8", "9.0.0.0/8")]
+        for prefix in prefixes:
+            trie[prefix] = None
+        self.assertEqual(list(trie), sorted(prefixes))
+
+    def test_random_operations_match_brute_force(self):
+        random = Random(19)
+        for prefix_class, address_class in ((IP4Prefix, IP4Address), (IP6Prefix, IP6Address)):
+            trie = PrefixTrie()
+            expected = {}
+            for step in range(1500):
+                prefix = random_prefix(random, prefix_class)
+                if random.random() < 0.3 and expected:
+                    prefix = random.choice(sorted(expected))
+                    del trie[prefix]
+                    del expected[prefix]
+                else:
+                    trie[prefix] = step
+                    expected[prefix] = step
+                if step % 50:
+                    continue
+                self.assertEqual(len(trie), len(expected))
+                self.assertEqual(list(trie.items()), sorted(expected.items()))
+                for _ in range(10):
+                    key = random_prefix(random, prefix_class)
+                    address = address_class(key.value | random.getrandbits(prefix_class.BIT_LENGTH - key.length))
+                    for query in (key, address):
+                        covering = sorted((p, i) for p, i in expected.items() if query in p)
+                        covering.sort(key=lambda pair: pair[0].length)
+                        self.assertEqual(trie.covering(query), covering)
+                        self.assertEqual(trie.longest_match(query), covering[-1] if covering else None)
+                    self.assertEqual(trie.get(key), expected.get(key))
+                    self.assertEqual(list(trie.subtree(key)), sorted((p, i) for p, i in expected.items() if p in key))
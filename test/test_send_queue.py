@@ -0,0 +1,60 @@
+from trasa.send_queue import SendQueue
+
+import unittest
+
+class SendQueueTestCase(unittest.TestCase):
+    def test_put_and_take(self):
+        send_queue = SendQueue()
+        send_queue.put(b"abc")
+        send_queue.put(b"")
+        send_queue.put(b"def")
+        self.assertEqual(len(send_queue), 6)
+        self.assertEqual(send_queue.take(), b"abcdef")
+        # still counted until the writer has sent it
+        self.assertEqual(len(send_queue), 6)
+        self.assertEqual(send_queue.take(), b"")
+        send_queue.sent(6)
+        self.assertEqual(len(send_queue), 0)
+
+    def test_pauses_at_high_watermark_and_resumes_at_low(self):
+        resumes = []
+        send_queue = SendQueue(high_watermark=10, low_watermark=4)
+        send_queue.on_resume = lambda: resumes.append(True)
+        self.assertFalse(send_queue.put(b"12345"))
+        self.assertTrue(send_queue.put(b"67890"))
+        self.assertTrue(send_queue.paused)
+        self.assertEqual(send_queue.pause_count, 1)
+        data = send_queue.take()
+        self.assertTrue(send_queue.paused)
+        send_queue.sent(5)
+        self.assertTrue(send_queue.paused)
+        send_queue.sent(len(data) - 5)
+        self.assertFalse(send_queue.paused)
+        self.assertEqual(resumes, [True])
+
+    def test_bytes_in_flight_keep_queue_paused(self):
+        send_queue = SendQueue(high_watermark=10, low_watermark=4)
+        send_queue.put(b"1234567890")
+        in_flight = send_queue.take()
+        self.assertTrue(send_queue.put(b"ab"))
+        self.assertEqual(len(send_queue), 12)
+        send_queue.sent(len(in_flight))
+        self.assertFalse(send_queue.paused)
+        self.assertEqual(len(send_queue), 2)
+
+    def test_on_data_is_called(self):
+        calls = []
+        send_queue = SendQueue()
+        send_queue.on_data = lambda: calls.append(len(send_queue))
+        send_queue.put(b"abc")
+        send_queue.put(b"")
+        self.assertEqual(calls, [3])
+
+    def test_closed_queue_drops_data(self):
+        send_queue = SendQueue()
+        send_queue.close()
+        self.assertFalse(send_queue.put(b"abc"))
+        self.assertEqual(len(send_queue), 0)
+
+    def test_bad_watermarks(self):
+        self.assertRaises(ValueError, SendQueue, 10, 20)
@@ -0,0 +1,81 @@
+from trasa.supervisor import Supervisor, add_label, merge_metrics
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import unittest
+
+def exit_straight_away(config):
+    pass
+
+def wait_for_sigint(config):
+    signal.signal(signal.SIGINT, lambda _signal, _frame: None)
+    signal.pause()
+
+class FastSupervisor(Supervisor):
+    POLL_INTERVAL = 0.05
+    MIN_RESTART_DELAY = 0.05
+
+class MergeMetricsTestCase(unittest.TestCase):
+    def test_add_label(self):
+        self.assertEqual(add_label("ldp_things_total 3", "worker", 1), 'ldp_things_total{worker="1"} 3')
+        self.assertEqual(add_label('ldp_messages_total{type="Hello"} 3', "worker", 1),
+            'ldp_messages_total{worker="1",type="Hello"} 3')
+
+    def test_merge_groups_families(self):
+        rendered = (
+            "# HELP ldp_a A\n"
+            "# TYPE ldp_a counter\n"
+            "ldp_a_total 1\n"
+            "# HELP ldp_b B\n"
+            "# TYPE ldp_b gauge\n"
+            "ldp_b 2\n"
+        )
+        self.assertEqual(merge_metrics([(None, "# HELP trasa_x X\n# TYPE trasa_x gauge\ntrasa_x 5\n"), (0, rendered), (1, rendered)]).splitlines(), [
+            "# HELP ldp_a A",
+            "# TYPE ldp_a counter",
+            'ldp_a_total{worker="0"} 1',
+            'ldp_a_total{worker="1"} 1',
+            "# HELP ldp_b B",
+            "# TYPE ldp_b gauge",
+            'ldp_b{worker="0"} 2',
+            'ldp_b{worker="1"} 2',
+            "# HELP trasa_x X",
+            "# TYPE trasa_x gauge",
+            "trasa_x 5",
+        ])
+
+class SupervisorTestCase(unittest.TestCase):
+    def test_restarts_workers_that_exit(self):
+        supervisor = FastSupervisor(exit_straight_away, [{}], multiprocessing.get_context("fork"))
+        supervisor.running = True
+        supervisor.start_worker(supervisor.workers[0])
+        first_pid = supervisor.workers[0].process.pid
+        deadline = time.monotonic() + 5
+        while supervisor.workers[0].process.pid == first_pid and time.monotonic() < deadline:
+            supervisor.poll()
+        self.assertNotEqual(supervisor.workers[0].process.pid, first_pid)
+        supervisor.shutdown()
+        supervisor.stop_workers()
+
+    def test_shutdown_forwards_sigint(self):
+        supervisor = FastSupervisor(wait_for_sigint, [{}, {}], multiprocessing.get_context("fork"))
+        for worker in supervisor.workers:
+            supervisor.start_worker(worker)
+        # give the workers time to install their handlers
+        time.sleep(0.2)
+        supervisor.stop_workers()
+        self.assertEqual([worker.process.exitcode for worker in supervisor.workers], [0, 0])
+
+    def test_run_removes_metrics_dir(self):
+        supervisor = FastSupervisor(wait_for_sigint, [{}], multiprocessing.get_context("fork"))
+        self.assertTrue(os.path.isdir(supervisor.metrics_dir))
+        thread = threading.Thread(target=supervisor.run)
+        thread.start()
+        time.sleep(0.2)
+        supervisor.shutdown()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(supervisor.metrics_dir))
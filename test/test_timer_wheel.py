@@ -0,0 +1,112 @@
+from trasa.timer_wheel import TimerWheel, WHEEL_SIZE
+
+from random import Random
+import unittest
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TimerWheelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.wheel = TimerWheel(0.1, self.clock, Random(22))
+        self.fired = []
+
+    def run_until(self, now, step=0.1):
+        while self.clock.now < now:
+            self.clock.now = min(self.clock.now + step, now)
+            self.wheel.advance()
+
+    def record(self, name):
+        self.fired.append((name, round(self.clock.now, 3)))
+
+    def test_one_shot(self):
+        self.wheel.schedule(1.0, self.record, ("a",))
+        self.wheel.schedule(0.25, self.record, ("b",))
+        self.assertEqual(len(self.wheel), 2)
+        self.run_until(1005)
+        self.assertEqual(self.fired, [("b", 1000.3), ("a", 1001.1)])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancel_and_reschedule(self):
+        a = self.wheel.schedule(1.0, self.record, ("a",))
+        b = self.wheel.schedule(1.0, self.record, ("b",))
+        a.cancel()
+        self.assertFalse(a.active)
+        self.run_until(1000.5)
+        b.reschedule(1.0)
+        self.run_until(1005)
+        self.assertEqual(self.fired, [("b", 1001.6)])
+        # a fired or cancelled timer can be put back
+        a.reschedule(0.15)
+        self.run_until(1006)
+        self.assertEqual(self.fired[-1], ("a", 1005.2))
+
+    def test_callback_can_cancel_a_timer_due_on_the_same_tick(self):
+        timers = []
+        def cancel_the_other(name):
+            self.record(name)
+            for timer in timers:
+                timer.cancel()
+        timers.append(self.wheel.schedule(1.0, cancel_the_other, ("a",)))
+        timers.append(self.wheel.schedule(1.0, cancel_the_other, ("b",)))
+        self.run_until(1002)
+        self.assertEqual(len(self.fired), 1)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_failing_callback_doesnt_strand_others(self):
+        def fail():
+            raise ValueError("oops")
+        self.wheel.schedule(1.0, fail)
+        self.wheel.schedule(1.0, self.record, ("a",))
+        with self.assertLogs("trasa.timer_wheel", "ERROR"):
+            self.run_until(1002)
+        self.assertEqual([name for name, _ in self.fired], ["a"])
+
+    def test_periodic_with_jitter(self):
+        timer = self.wheel.schedule_periodic(5.0, self.record, ("hello",), jitter=0.2, first_delay=0)
+        self.run_until(1100)
+        times = [now for _, now in self.fired]
+        self.assertEqual(times[0], 1000.1)
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        self.assertTrue(all(3.95 <= gap <= 5.05 for gap in gaps))
+        # actually jittered
+        self.assertGreater(len(set(round(gap, 1) for gap in gaps)), 3)
+        timer.cancel()
+        self.run_until(1200)
+        self.assertEqual(len(self.fired), len(times))
+
+    def test_late_advance_catches_up(self):
+        self.wheel.schedule(1.0, self.record, ("a",))
+        self.wheel.schedule(3.0, self.record, ("b",))
+        self.clock.now = 1010
+        self.assertEqual(self.wheel.advance(), 2)
+        self.assertEqual([name for name, _ in self.fired], ["a", "b"])
+
+    def test_random_timers_never_fire_early_or_late(self):
+        # spread over every level of the wheel
+        random = Random(22)
+        due = {}
+        for index in range(3000):
+            delay = random.choice((random.uniform(0, 6), random.uniform(6, 400), random.uniform(400, 30000)))
+            timer = self.wheel.schedule(delay, self.record, (index,))
+            due[index] = self.clock.now + delay
+            if random.random() < 0.1:
+                timer.cancel()
+                del due[index]
+        self.run_until(1000 + 30001, step=0.7)
+        self.assertEqual(sorted(name for name, _ in self.fired), sorted(due))
+        for name, now in self.fired:
+            # no earlier than due, and no later than one step plus a tick after
+            self.assertGreaterEqual(now, due[name])
+            self.assertLessEqual(now, due[name] + 0.81)
+
+    def test_levels(self):
+        self.wheel.schedule(0.5, self.record, ("near",))
+        self.wheel.schedule(WHEEL_SIZE * 0.1 * 2, self.record, ("level 1",))
+        self.wheel.schedule(WHEEL_SIZE * WHEEL_SIZE * 0.1 * 2, self.record, ("level 2",))
+        self.assertEqual([sum(len(bucket) for bucket in level) for level in self.wheel.levels], [1, 1, 1, 0])
@@ -1,4 +1,4 @@
-from trasa.tlv import parse_tlv, pack_tlv
+from trasa.tlv import parse_tlv, pack_tlv, iterate_tlvs
 import socket
 import struct
 import unittest
@@ -17,4 +17,12 @@ class TlvMessageTestCase(unittest.TestCase):
     def test_tlv_packs(self):
         expected_tlv = build_byte_string("04000004002dc000")
         tlv = pack_tlv(0x0400, build_byte_string('002dc000'))
-        self.assertEqual(tlv, expected_tlv)
\ No newline at end of file
+        self.assertEqual(tlv, expected_tlv)
+
+    def test_tlvs_iterate(self):
+        tlvs = build_byte_string("04000004002dc00004010004ac1a0165")
+        parsed_tlvs = [(key, bytes(value)) for key, value in iterate_tlvs(tlvs)]
+        self.assertEqual(parsed_tlvs, [
+            (0x0400, build_byte_string("002dc000")),
+            (0x0401, build_byte_string("ac1a0165")),
+        ])
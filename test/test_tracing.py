@@ -0,0 +1,59 @@
+from trasa.tracing import Tracer, PduTrace, summarise_latencies
+from trasa.ldp_session import LdpSession
+from trasa.ldp_pdu import LdpPdu
+from trasa.ldp_message import LdpInitialisationMessage, LdpKeepaliveMessage
+from itertools import count
+
+import unittest
+
+def build_pdu(*messages):
+    return LdpPdu(1, "172.26.1.112", 0, [message.pack() for message in messages]).pack()
+
+class TracerTestCase(unittest.TestCase):
+    def test_disabled_by_default(self):
+        tracer = Tracer()
+        self.assertFalse(tracer.sample_every)
+
+    def test_samples_every_nth(self):
+        tracer = Tracer(3)
+        self.assertEqual([tracer.sample() for _ in range(6)], [False, False, True, False, False, True])
+
+    def test_stage_durations(self):
+        trace = PduTrace("peer", 10, 1.0)
+        trace.stamps.extend([("parse", 1.5), ("state_machine", 2.0), ("pack", 2.25), ("state_machine", 3.0), ("pack", 3.25)])
+        self.assertEqual(trace.stage_durations(), {"parse": 0.5, "state_machine": 1.25, "pack": 0.5})
+        self.assertEqual(trace.total, 2.25)
+
+    def test_keeps_slowest(self):
+        tracer = Tracer(1, slowest_count=2)
+        stage_latencies = {}
+        for total in (3.0, 1.0, 5.0, 2.0):
+            trace = PduTrace("peer", 10, 0.0)
+            trace.stamps.append(("parse", total))
+            tracer.finish(trace, stage_latencies)
+        self.assertEqual([trace["total"] for trace in tracer.slowest_traces()], [5.0, 3.0])
+        self.assertEqual(tracer.traces_finished, 4)
+        self.assertEqual(summarise_latencies(stage_latencies)["parse"]["count"], 4)
+
+class SessionTracingTestCase(unittest.TestCase):
+    def test_session_traces_through_to_send(self):
+        tracer = Tracer(1)
+        session = LdpSession("172.26.1.106", "172.26.1.112", 646, count(1).__next__, tracer=tracer)
+        init_message = LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {})
+        keepalive_message = LdpKeepaliveMessage(2, {})
+        session.pdus_received([build_pdu(init_message), build_pdu(keepalive_message)])
+
+        session.send_queue.take()
+        traces = session.take_traces()
+        self.assertEqual(len(traces), 2)
+        session.traces_sent(traces)
+        stages = [stage for stage, _ in traces[1].stamps]
+        self.assertEqual(stages, ["read", "batch", "parse", "state_machine", "pack", "pack", "pack", "pack", "queue", "dequeue", "send"])
+        self.assertEqual(session.latency_summary()["send"]["count"], 2)
+        self.assertEqual(len(tracer.slowest_traces()), 2)
+
+    def test_untraced_session_keeps_nothing(self):
+        session = LdpSession("172.26.1.106", "172.26.1.112", 646, count(1).__next__)
+        session.pdus_received([build_pdu(LdpInitialisationMessage(1, 1, 180, 0, 0, 0, "172.26.1.106", 0, {}))])
+        self.assertEqual(session.take_traces(), [])
+        self.assertEqual(session.latency_summary(), {})
@@ -0,0 +1,302 @@
+from array import array
+from itertools import compress
+
+from .packing_tools import UINT32
+
+# peer column value for a free row
+DELETED = 0xFFFFFFFF
+# end of a chain
+NO_ROW = -1
+# index entries: a never used slot, and one whose FEC was deleted, which
+# lookups have to probe past
+EMPTY = -1
+TOMBSTONE = -2
+
+MIN_INDEX_SIZE = 8
+# stores smaller than this just reuse their free rows
+MIN_COMPACT_ROWS = 1024
+
+def index_hash(network, prefix_length):
+    # multiplicative hash; the high bits mix every input bit
+    return ((network << 8 | prefix_length) * 0x9E3779B97F4A7C15) >> 32
+
+class BindingStore(object):
+    """Columnar store of (network, prefix_length, peer, label) bindings
+
+    Rows live in parallel arrays: the binding itself in 13 bytes, and 12
+    more of row numbers threading each row onto two chains, one through
+    every binding for its FEC and one through every binding from its
+    peer. An open-addressing hash index on (network, prefix_length), an
+    array('i') probed linearly and kept at most half full, holds the head
+    of each FEC's chain, and a dict holds the head of each peer's. A FEC
+    has one binding per peer at most, so finding a binding is a probe and
+    a short walk, and a peer's bindings are withdrawn in time proportional
+    to how many it has, without looking at anyone else's. Deleted rows go
+    on a free list and are reused, and once free rows outnumber live ones
+    (after a big peer's withdrawn, say) the columns are compacted and the
+    index rebuilt without its tombstones, so the cost is spread over the
+    deletes that freed them. A binding costs a few tens of bytes rather
+    than the few hundred of an IPv4Network and a tuple.
+
+    Peers are small ints, it's up to the caller to map them to LSR IDs.
+    """
+
+    def __init__(self):
+        self.networks = array(UINT32)
+        self.prefix_lengths = array('B')
+        self.peers = array(UINT32)
+        self.labels = array(UINT32)
+        self.next_by_fec = array('i')
+        self.next_by_peer = array('i')
+        self.prev_by_peer = array('i')
+        self.peer_heads = {}
+        self.free_rows = array('i')
+        self.index = array('i', [EMPTY]) * MIN_INDEX_SIZE
+        # index slots that aren't EMPTY, tombstones included
+        self.index_used = 0
+        self.fec_count = 0
+
+    def __len__(self):
+        return len(self.peers) - len(self.free_rows)
+
+    def find_fec(self, network, prefix_length):
+        """Returns the index slot holding this FEC's chain, or the slot it would go in as ~slot"""
+
+        index = self.index
+        mask = len(index) - 1
+        slot = index_hash(network, prefix_length) & mask
+        free_slot = None
+        while True:
+            row = index[slot]
+            if row == EMPTY:
+                return ~(slot if free_slot is None else free_slot)
+            if row == TOMBSTONE:
+                if free_slot is None:
+                    free_slot = slot
+            elif self.networks[row] == network and self.prefix_lengths[row] == prefix_length:
+                return slot
+            slot = (slot + 1) & mask
+
+    def find_row(self, network, prefix_length, peer):
+        # the binding's row, or NO_ROW
+        slot = self.find_fec(network, prefix_length)
+        if slot < 0:
+            return NO_ROW
+        row = self.index[slot]
+        peers, next_by_fec = self.peers, self.next_by_fec
+        while row != NO_ROW and peers[row] != peer:
+            row = next_by_fec[row]
+        return row
+
+    def label_for(self, network, prefix_length, peer):
+        row = self.find_row(network, prefix_length, peer)
+        if row == NO_ROW:
+            return None
+        return self.labels[row]
+
+    def fec_rows(self, network, prefix_length):
+        # [(peer, label)] for one FEC, newest first
+        slot = self.find_fec(network, prefix_length)
+        if slot < 0:
+            return []
+        rows = []
+        row = self.index[slot]
+        while row != NO_ROW:
+            rows.append((self.peers[row], self.labels[row]))
+            row = self.next_by_fec[row]
+        return rows
+
+    def insert(self, network, prefix_length, peer, label):
+        """Adds a binding, or replaces the label of an existing one"""
+
+        slot = self.find_fec(network, prefix_length)
+        if slot >= 0:
+            head = row = self.index[slot]
+            peers, next_by_fec = self.peers, self.next_by_fec
+            while row != NO_ROW:
+                if peers[row] == peer:
+                    self.labels[row] = label
+                    return
+                row = next_by_fec[row]
+        else:
+            slot = ~slot
+            if self.index[slot] == EMPTY:
+                if (self.index_used + 1) * 2 > len(self.index):
+                    self.rebuild_index(self.fec_count + 1)
+                    slot = ~self.find_fec(network, prefix_length)
+                self.index_used += 1
+            self.fec_count += 1
+            head = NO_ROW
+        row = self.new_row(network, prefix_length, peer, label)
+        self.next_by_fec[row] = head
+        self.index[slot] = row
+
+    def insert_columns(self, networks, prefix_lengths, peer, label):
+        """Adds one binding per FEC, as in a Label Mapping's FEC TLV"""
+
+        # room for every FEC up front, so the index doesn't grow part way through
+        if (self.index_used + len(networks)) * 2 > len(self.index):
+            self.rebuild_index(self.fec_count + len(networks))
+        insert = self.insert
+        for network, prefix_length in zip(networks, prefix_lengths):
+            insert(network, prefix_length, peer, label)
+
+    def new_row(self, network, prefix_length, peer, label):
+        # a row linked onto the front of its peer's chain, reusing a free one if there is one
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.networks[row] = network
+            self.prefix_lengths[row] = prefix_length
+            self.peers[row] = peer
+            self.labels[row] = label
+        else:
+            row = len(self.peers)
+            self.networks.append(network)
+            self.prefix_lengths.append(prefix_length)
+            self.peers.append(peer)
+            self.labels.append(label)
+            self.next_by_fec.append(NO_ROW)
+            self.next_by_peer.append(NO_ROW)
+            self.prev_by_peer.append(NO_ROW)
+        head = self.peer_heads.get(peer, NO_ROW)
+        self.next_by_peer[row] = head
+        self.prev_by_peer[row] = NO_ROW
+        if head != NO_ROW:
+            self.prev_by_peer[head] = row
+        self.peer_heads[peer] = row
+        return row
+
+    def delete(self, network, prefix_length, peer):
+        """Removes a binding, returns False if there wasn't one"""
+
+        row = self.find_row(network, prefix_length, peer)
+        if row == NO_ROW:
+            return False
+        self.delete_row(row)
+        self.compact_if_sparse()
+        return True
+
+    def delete_columns(self, networks, prefix_lengths, peer):
+        """Removes one binding per FEC, as in a Label Withdraw's FEC TLV, and returns how many there were"""
+
+        deleted = 0
+        for network, prefix_length in zip(networks, prefix_lengths):
+            if self.delete(network, prefix_length, peer):
+                deleted += 1
+        return deleted
+
+    def delete_peer(self, peer):
+        """Removes every binding from a peer and returns how many there were"""
+
+        row = self.peer_heads.pop(peer, NO_ROW)
+        deleted = 0
+        while row != NO_ROW:
+            next_row = self.next_by_peer[row]
+            self.delete_row(row, unlink_peer=False)
+            row = next_row
+            deleted += 1
+        self.compact_if_sparse()
+        return deleted
+
+    def delete_row(self, row, unlink_peer=True):
+        network, prefix_length = self.networks[row], self.prefix_lengths[row]
+        slot = self.find_fec(network, prefix_length)
+        next_by_fec = self.next_by_fec
+        prev_row, fec_row = NO_ROW, self.index[slot]
+        while fec_row != row:
+            prev_row, fec_row = fec_row, next_by_fec[fec_row]
+        if prev_row != NO_ROW:
+            next_by_fec[prev_row] = next_by_fec[row]
+        elif next_by_fec[row] != NO_ROW:
+            self.index[slot] = next_by_fec[row]
+        else:
+            self.index[slot] = TOMBSTONE
+            self.fec_count -= 1
+
+        if unlink_peer:
+            next_row, prev_row = self.next_by_peer[row], self.prev_by_peer[row]
+            if prev_row == NO_ROW:
+                if next_row == NO_ROW:
+                    del self.peer_heads[self.peers[row]]
+                else:
+                    self.peer_heads[self.peers[row]] = next_row
+            else:
+                self.next_by_peer[prev_row] = next_row
+            if next_row != NO_ROW:
+                self.prev_by_peer[next_row] = prev_row
+
+        self.peers[row] = DELETED
+        self.free_rows.append(row)
+
+    def compact_if_sparse(self):
+        free_count = len(self.free_rows)
+        if free_count >= MIN_COMPACT_ROWS and free_count * 2 > len(self.peers):
+            self.compact()
+
+    def compact(self):
+        # drops the free rows, renumbering the rest in order, and rebuilds the index without tombstones
+        live = [peer != DELETED for peer in self.peers]
+        new_rows = array('i', [NO_ROW]) * len(live)
+        new_row = 0
+        for row, is_live in enumerate(live):
+            if is_live:
+                new_rows[row] = new_row
+                new_row += 1
+
+        def renumbered(rows):
+            return array('i', [row if row == NO_ROW else new_rows[row] for row in compress(rows, live)])
+
+        self.networks = array(UINT32, compress(self.networks, live))
+        self.prefix_lengths = array('B', compress(self.prefix_lengths, live))
+        self.peers = array(UINT32, compress(self.peers, live))
+        self.labels = array(UINT32, compress(self.labels, live))
+        self.next_by_fec = renumbered(self.next_by_fec)
+        self.next_by_peer = renumbered(self.next_by_peer)
+        self.prev_by_peer = renumbered(self.prev_by_peer)
+        self.peer_heads = dict((peer, new_rows[row]) for peer, row in self.peer_heads.items())
+        self.free_rows = array('i')
+        index = self.index
+        for slot, row in enumerate(index):
+            if row >= 0:
+                index[slot] = new_rows[row]
+        self.rebuild_index(self.fec_count)
+
+    def rebuild_index(self, fec_count):
+        # sized for fec_count at a quarter full, so it has room to fill before the next rebuild
+        size = MIN_INDEX_SIZE
+        while size < fec_count * 4:
+            size *= 2
+        old_index = self.index
+        index = self.index = array('i', [EMPTY]) * size
+        mask = size - 1
+        networks, prefix_lengths = self.networks, self.prefix_lengths
+        for row in old_index:
+            if row < 0:
+                continue
+            slot = index_hash(networks[row], prefix_lengths[row]) & mask
+            while index[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            index[slot] = row
+        self.index_used = self.fec_count
+
+    def snapshot(self):
+        """Copies of the live columns (networks, prefix_lengths, peers, labels), safe to use while the store changes"""
+
+        if not self.free_rows:
+            return array(UINT32, self.networks), array('B', self.prefix_lengths), array(UINT32, self.peers), array(UINT32, self.labels)
+        live = [peer != DELETED for peer in self.peers]
+        return array(UINT32, compress(self.networks, live)), array('B', compress(self.prefix_lengths, live)), \
+            array(UINT32, compress(self.peers, live)), array(UINT32, compress(self.labels, live))
+
+    def __iter__(self):
+        # (network, prefix_length, peer, label) in row order, from a snapshot
+        return zip(*self.snapshot())
+
+    def peer_rows(self, peer):
+        # [(network, prefix_length, label)] for every binding from one peer, newest first
+        rows = []
+        row = self.peer_heads.get(peer, NO_ROW)
+        while row != NO_ROW:
+            rows.append((self.networks[row], self.prefix_lengths[row], self.labels[row]))
+            row = self.next_by_peer[row]
+        return rows
@@ -1,5 +1,5 @@
 import struct
-from .error import SocketClosedError
+from .error import SocketClosedError, ParseError
 
 class Chopper(object):
     SIZE_TO_PACK_STRING = {
@@ -31,11 +31,59 @@ class Chopper(object):
         length_size = self.header_length - self.length_offset
         body_length, = struct.unpack(self.SIZE_TO_PACK_STRING[length_size], serialised_header[self.length_offset:])
         extra_data_length = body_length - self.length_adjustment
-        if extra_data_length > 0:
-            serialised_body = self.input_stream.read(extra_data_length)
-            if len(serialised_body) < extra_data_length:
-                raise SocketClosedError("Tried to read %d bytes but only got %d" % (extra_data_length, len(serialised_header)))
-        else:
-            serialised_body = b""
-
-        return serialised_header + serialised_body
+        if extra_data_length <= 0:
+            return serialised_header
+
+        # read the body straight in behind the header so we don't have to join them
+        serialised_data = bytearray(self.header_length + extra_data_length)
+        serialised_data[:self.header_length] = serialised_header
+        with memoryview(serialised_data) as view:
+            bytes_read = self.input_stream.readinto(view[self.header_length:])
+        if bytes_read < extra_data_length:
+            raise SocketClosedError("Tried to read %d bytes but only got %d" % (extra_data_length, bytes_read))
+
+        return serialised_data
+
+class BufferChopper(object):
+    """Chops length-prefixed chunks out of an in-memory buffer
+
+    Works on offsets into a single memoryview, so each chunk comes back as a
+    memoryview slice that shares memory with the original buffer. Nothing
+    is copied until the caller turns a slice into bytes.
+    """
+
+    SIZE_TO_STRUCT = {
+        1: struct.Struct("!B"),
+        2: struct.Struct("!H"),
+        4: struct.Struct("!I")
+    }
+
+    def __init__(self, header_length, length_offset, length_adjustment, buffer, offset=0, end=None):
+        self.header_length = header_length
+        self.length_offset = length_offset
+        self.length_adjustment = length_adjustment
+        self.length_struct = self.SIZE_TO_STRUCT[header_length - length_offset]
+        self.view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+        self.offset = offset
+        self.end = len(self.view) if end is None else end
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self):
+        offset = self.offset
+        if offset >= self.end:
+            raise StopIteration()
+        if offset + self.header_length > self.end:
+            raise ParseError("Tried to read %d header bytes but only %d left" % (self.header_length, self.end - offset))
+
+        body_length, = self.length_struct.unpack_from(self.view, offset + self.length_offset)
+        chunk_end = offset + self.header_length + max(body_length - self.length_adjustment, 0)
+        if chunk_end > self.end:
+            raise ParseError("Tried to read %d bytes but only %d left" % (chunk_end - offset, self.end - offset))
+
+        self.offset = chunk_end
+        return self.view[offset:chunk_end]
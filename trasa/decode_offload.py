@@ -0,0 +1,52 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .ldp_pdu import parse_ldp_pdu
+from .metrics import REGISTRY
+
+PDUS_OFFLOADED = REGISTRY.counter("ldp_pdus_offloaded", "LDP PDUs sent to a worker process to be decoded")
+
+def decode_pdu(serialised_pdu):
+    # runs in a worker process: everything is decoded here, so what comes back
+    # is plain fields and FEC/address columns rather than raw bytes to parse
+    pdu = parse_ldp_pdu(serialised_pdu)
+    for message in pdu.messages:
+        if not message.decoded:
+            # unknown message types stay undecoded for forwarding, and memoryviews don't pickle
+            message._serialised_message = bytes(message._serialised_message)
+    return pdu
+
+class DecodeOffload(object):
+    """Decodes large PDUs in a pool of worker processes
+
+    A peer dumping its whole LIB at session start sends PDUs full of Label
+    Mappings, and decoding those on the event loop holds up every other
+    session. No single PDU is ever big: the session caps the max PDU
+    length at 4096 bytes, so a dump shows up as read batches of many
+    full PDUs instead. submit() goes by the size of the whole batch: once
+    it comes to the threshold, every PDU in it is sent to the pool as raw
+    bytes, and their futures are handed back by position in the batch.
+    The engine waits for them without blocking its loop and then passes
+    the decoded PDUs to LdpSession.pdus_received(), which processes the
+    whole batch in order on the loop as usual.
+    """
+
+    # four full PDUs' worth in one read
+    DEFAULT_THRESHOLD = 16384
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_workers=None, executor=None):
+        self.threshold = threshold
+        # spawned rather than forked, as the parent has threads and an event loop running
+        self.executor = executor or ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, serialised_pdus):
+        # returns {index: future} for every PDU in a batch worth offloading, or None for a small batch
+        if not serialised_pdus or sum(map(len, serialised_pdus)) < self.threshold:
+            return None
+        submit = self.executor.submit
+        futures = dict((index, submit(decode_pdu, serialised_pdu)) for index, serialised_pdu in enumerate(serialised_pdus))
+        PDUS_OFFLOADED.child.value += len(futures)
+        return futures
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,135 @@
+from random import Random
+
+from .ldp_discovery import build_hello_pdu
+from .multicast_socket import MulticastSocket
+from .log import get_logger, DEBUG
+from .metrics import REGISTRY
+
+LOGGER = get_logger("discovery_reactor")
+
+DATAGRAM_ERRORS = REGISTRY.counter("ldp_discovery_datagram_errors", "Discovery datagrams a router failed to handle")
+
+MULTICAST_ADDRESS = '224.0.0.2'
+LISTEN_PORT = 646
+HELLO_INTERVAL = 5
+HELLO_JITTER = 0.1
+
+class DiscoveryReactor(object):
+    """The discovery socket and Hello timer shared by every router in a process
+
+    Routers register by their listen address. A single MulticastSocket
+    joins the group on each of those addresses, and every datagram it
+    reads is handed to the routers it belongs to, through their
+    datagram_received(data, datagram):
+    - a datagram sent to one of our addresses goes to that router;
+    - otherwise it goes to the routers on the interface it came in on.
+
+    We learn which interface a router is on from its own Hellos, which
+    the group sends back to us. Before that is known, a datagram goes to
+    the router whose address IP_PKTINFO gives as the local one. Without
+    IP_PKTINFO there is no telling, so every router gets it. A router
+    never gets its own Hellos. Anything a router raises is logged and
+    counted, and the next datagram is read as usual.
+
+    One timer sends every router's Hello in a single pass. This class has
+    no I/O loop of its own: an engine subclass waits for the socket to be
+    readable and calls readable(), and calls send_hellos() every
+    hello_delay() seconds.
+    """
+
+    def __init__(self, multicast_group=MULTICAST_ADDRESS, port=LISTEN_PORT, hello_interval=HELLO_INTERVAL,
+                 hello_jitter=HELLO_JITTER, random=None):
+        self.multicast_group = multicast_group
+        self.port = port
+        self.hello_interval = hello_interval
+        self.hello_jitter = hello_jitter
+        self.random = random or Random()
+        self.multicast_socket = None
+        # listen address to router
+        self.routers = {}
+        # interface name to the listen addresses on it, learned from our own Hellos
+        self.interface_routers = {}
+        self.router_interfaces = {}
+
+    def register(self, router):
+        self.routers[router.listen_ip] = router
+        if self.multicast_socket is not None:
+            self.multicast_socket.join(router.listen_ip)
+            self.multicast_socket.listen_ips.append(router.listen_ip)
+            # no waiting for the next round to be heard
+            self.send_hello(router.listen_ip, router)
+
+    def unregister(self, router):
+        if self.routers.get(router.listen_ip) is router:
+            del self.routers[router.listen_ip]
+            interface = self.router_interfaces.pop(router.listen_ip, None)
+            if interface is not None:
+                self.interface_routers[interface].discard(router.listen_ip)
+
+    def bind(self):
+        self.multicast_socket = MulticastSocket(self.multicast_group, self.port, list(self.routers))
+        self.multicast_socket.bind()
+
+    def hello_delay(self):
+        # each interval is cut by up to the jitter, so processes started together drift apart
+        return self.hello_interval - self.hello_interval * self.hello_jitter * self.random.random()
+
+    def send_hellos(self):
+        if self.multicast_socket is None:
+            return
+        for listen_ip, router in list(self.routers.items()):
+            self.send_hello(listen_ip, router)
+
+    def send_hello(self, listen_ip, router):
+        if LOGGER.isEnabledFor(DEBUG):
+            LOGGER.debug("Sending hello message from %s", listen_ip)
+        try:
+            self.multicast_socket.send(build_hello_pdu(listen_ip, router.get_message_id()), listen_ip)
+        except OSError as e:
+            LOGGER.warning("Couldn't send hello from %s: %s", listen_ip, e)
+
+    def readable(self):
+        # drains the socket, returns how many reads that took; raises SocketClosedError once it's closed
+        return self.multicast_socket.drain(self.datagram_received)
+
+    def learn_interface(self, listen_ip, interface):
+        if self.router_interfaces.get(listen_ip) == interface:
+            return
+        old_interface = self.router_interfaces.get(listen_ip)
+        if old_interface is not None:
+            self.interface_routers[old_interface].discard(listen_ip)
+        self.router_interfaces[listen_ip] = interface
+        self.interface_routers.setdefault(interface, set()).add(listen_ip)
+        LOGGER.info("Router %s is on interface %s", listen_ip, interface)
+
+    def routers_for(self, datagram):
+        if datagram.destination in self.routers:
+            return (datagram.destination,)
+        if datagram.interface is None:
+            return list(self.routers)
+        listen_ips = self.interface_routers.get(datagram.interface)
+        if listen_ips:
+            return list(listen_ips)
+        if datagram.local_address in self.routers:
+            return (datagram.local_address,)
+        return ()
+
+    def datagram_received(self, data, datagram):
+        source_ip = datagram.source[0]
+        if source_ip in self.routers and datagram.interface is not None:
+            self.learn_interface(source_ip, datagram.interface)
+        listen_ips = self.routers_for(datagram)
+        if not listen_ips and LOGGER.isEnabledFor(DEBUG):
+            LOGGER.debug("No router for datagram from %s on %s", datagram.source, datagram.interface)
+        for listen_ip in listen_ips:
+            if listen_ip != source_ip:
+                try:
+                    self.routers[listen_ip].datagram_received(data, datagram)
+                except Exception:
+                    # one bad datagram mustn't stop discovery for every router sharing the socket
+                    DATAGRAM_ERRORS.child.value += 1
+                    LOGGER.exception("Router %s failed to handle datagram from %s", listen_ip, datagram.source)
+
+    def shutdown(self):
+        if self.multicast_socket is not None:
+            self.multicast_socket.shutdown()
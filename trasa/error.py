@@ -5,3 +5,7 @@ class SocketClosedError(Exception):
 class IdleError(Exception):
     def __init__(self, msg):
         super(IdleError, self).__init__(msg)
+
+class ParseError(Exception):
+    def __init__(self, msg):
+        super(ParseError, self).__init__(msg)
@@ -4,9 +4,11 @@ class Event(object):
     SHUTDOWN = 3
 
 class EventTimerExpired(Event):
-    def __init__(self):
+    def __init__(self, timer_name=None):
         # will work but please do this properly
         self.type = self.TIMER_EXPIRED
+        # which of the receiver's timers went off
+        self.timer_name = timer_name
 
 class EventMessageReceived(Event):
     def __init__(self, message):
@@ -0,0 +1,105 @@
+import struct
+from .error import SocketClosedError
+
+class PduFramer(object):
+    """Push-style framer for a stream of length-prefixed PDUs
+
+    Bytes are pushed in with feed() (or read straight off a socket with
+    recv_into()) and every PDU completed so far comes back as a list. A
+    trailing partial PDU stays in a reusable receive buffer until the rest
+    of it arrives. Nothing here blocks, so the same framer works under
+    eventlet, asyncio or a plain selector loop.
+    """
+
+    SIZE_TO_STRUCT = {
+        1: struct.Struct("!B"),
+        2: struct.Struct("!H"),
+        4: struct.Struct("!I")
+    }
+    DEFAULT_BUFFER_SIZE = 65536
+    MIN_READ_SIZE = 4096
+
+    def __init__(self, header_length=4, length_offset=2, length_adjustment=0, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.header_length = header_length
+        self.length_offset = length_offset
+        self.length_adjustment = length_adjustment
+        self.length_struct = self.SIZE_TO_STRUCT[header_length - length_offset]
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        # unconsumed data lives in buffer[start:end]
+        self.start = 0
+        self.end = 0
+        # bytes we know we need before the next PDU is complete
+        self.needed = header_length
+
+    @property
+    def pending(self):
+        return self.end - self.start
+
+    def feed(self, data):
+        data_length = len(data)
+        self.reserve(data_length)
+        self.view[self.end:self.end+data_length] = data
+        self.end += data_length
+        return self.drain()
+
+    def get_buffer(self, size_hint=-1):
+        # writable view over the free space, for recv_into or BufferedProtocol
+        self.reserve(max(size_hint, self.needed - self.pending, self.MIN_READ_SIZE))
+        return self.view[self.end:]
+
+    def buffer_updated(self, bytes_written):
+        self.end += bytes_written
+        return self.drain()
+
+    def recv(self, socket):
+        # reads into the buffer without framing, so the caller can note when the data came in
+        bytes_read = socket.recv_into(self.get_buffer())
+        if not bytes_read:
+            if self.pending:
+                raise SocketClosedError("Socket closed with %d bytes of a partial PDU buffered" % self.pending)
+            raise SocketClosedError("Socket closed")
+        return bytes_read
+
+    def recv_into(self, socket):
+        return self.buffer_updated(self.recv(socket))
+
+    def reserve(self, size):
+        if len(self.buffer) - self.end >= size:
+            return
+        pending = self.pending
+        if pending + size > len(self.buffer):
+            # too big even once compacted, so swap in a larger buffer
+            new_buffer = bytearray(max(2 * len(self.buffer), pending + size))
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+        else:
+            # move the partial PDU back to the front of the buffer
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+        self.start = 0
+        self.end = pending
+
+    def drain(self):
+        pdus = []
+        view = self.view
+        start = self.start
+        end = self.end
+        while end - start >= self.header_length:
+            body_length, = self.length_struct.unpack_from(view, start + self.length_offset)
+            pdu_length = self.header_length + max(body_length - self.length_adjustment, 0)
+            if end - start < pdu_length:
+                self.needed = pdu_length
+                break
+            pdus.append(bytes(view[start:start+pdu_length]))
+            start += pdu_length
+        else:
+            self.needed = self.header_length
+
+        if start == end:
+            # everything consumed, rewind so the buffer gets reused from the front
+            start = end = 0
+        self.start = start
+        self.end = end
+        return pdus
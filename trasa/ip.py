@@ -8,20 +8,88 @@ def is_ipv6(address_string):
     return ":" in address_string
 
 class IPBase(object): # pylint: disable=too-few-public-methods
-    """Abstract base class for IP addresses and prefixes"""
+    """Abstract base class for IP addresses and prefixes
+
+    Addresses and prefixes are frozen value types: the address is held as a
+    single int, so hashing, equality and ordering never touch bytes.
+    Subclasses define _key(), the tuple they're ordered and pickled by.
+    """
+
+    __slots__ = ()
+
+    INET_TYPE = None
+    BIT_LENGTH = None
+    KIND = None
 
     def __repr__(self):
         return "%s.from_string(\"%s\")" % (self.__class__.__name__, self.__str__())
 
+    def __setattr__(self, name, value):
+        """Addresses and prefixes can't be changed once built"""
+
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        """Addresses and prefixes can't be changed once built"""
+
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __reduce__(self):
+        """Rebuilds from the int form when copied or pickled"""
+
+        return (self.__class__, self._key()[1:])
+
+    def _comparable(self, other):
+        """Addresses only order against addresses, prefixes against prefixes"""
+
+        return isinstance(other, IPBase) and other.KIND == self.KIND
+
+    def __lt__(self, other):
+        if not self._comparable(other):
+            return NotImplemented
+        return self._key() < other._key()
+
+    def __le__(self, other):
+        if not self._comparable(other):
+            return NotImplemented
+        return self._key() <= other._key()
+
+    def __gt__(self, other):
+        if not self._comparable(other):
+            return NotImplemented
+        return self._key() > other._key()
+
+    def __ge__(self, other):
+        if not self._comparable(other):
+            return NotImplemented
+        return self._key() >= other._key()
+
+def to_int(address, bit_length):
+    """Converts packed bytes (or an int) to an int"""
+
+    if isinstance(address, int):
+        return address
+    if len(address) * 8 != bit_length:
+        raise ValueError("Expected %d bytes, got %d" % (bit_length // 8, len(address)))
+    return int.from_bytes(address, "big")
+
 class IPAddress(IPBase): # pylint: disable=too-few-public-methods
     """Abstract base class for IP addresses"""
 
-    INET_TYPE = None
+    __slots__ = ("value",)
+
+    KIND = "address"
 
     def __init__(self, address):
-        """Common constructor for IP addresses"""
+        """Common constructor for IP addresses, takes packed bytes or an int"""
+
+        object.__setattr__(self, "value", to_int(address, self.BIT_LENGTH))
 
-        self.address = address
+    @property
+    def address(self):
+        """The address as packed bytes"""
+
+        return self.value.to_bytes(self.BIT_LENGTH // 8, "big")
 
     def __str__(self):
         """Common str() for IP addresses"""
@@ -29,15 +97,25 @@ class IPAddress(IPBase): # pylint: disable=too-few-public-methods
         address_string = socket.inet_ntop(self.INET_TYPE, self.address)
         return address_string
 
+    def __int__(self):
+        """The address as an int"""
+
+        return self.value
+
+    def _key(self):
+        return (self.INET_TYPE, self.value)
+
     def __eq__(self, other):
         """Common equality checker for IP addresses"""
 
-        return self.address == other.address
+        if not isinstance(other, IPAddress):
+            return NotImplemented
+        return self.value == other.value and self.INET_TYPE == other.INET_TYPE
 
     def __hash__(self):
         """Common hash method for IP addresses"""
 
-        return hash(self.address)
+        return hash((self.INET_TYPE, self.value))
 
     @staticmethod
     def from_string(string):
@@ -51,13 +129,23 @@ class IPAddress(IPBase): # pylint: disable=too-few-public-methods
 class IPPrefix(IPBase): # pylint: disable=too-few-public-methods
     """Abstract base class for IP prefixes"""
 
-    INET_TYPE = None
+    __slots__ = ("value", "length")
+
+    KIND = "prefix"
 
     def __init__(self, prefix, length):
-        """Common constructor for IP prefixes"""
+        """Common constructor for IP prefixes, takes packed bytes or an int"""
+
+        if not 0 <= length <= self.BIT_LENGTH:
+            raise ValueError("Bad prefix length %s" % length)
+        object.__setattr__(self, "value", to_int(prefix, self.BIT_LENGTH))
+        object.__setattr__(self, "length", length)
+
+    @property
+    def prefix(self):
+        """The prefix as packed bytes"""
 
-        self.prefix = prefix
-        self.length = length
+        return self.value.to_bytes(self.BIT_LENGTH // 8, "big")
 
     def __str__(self):
         """Common str() for IP prefixes"""
@@ -65,10 +153,38 @@ class IPPrefix(IPBase): # pylint: disable=too-few-public-methods
         prefix_string = socket.inet_ntop(self.INET_TYPE, self.prefix)
         return "%s/%d" % (prefix_string, self.length)
 
+    def _key(self):
+        return (self.INET_TYPE, self.value, self.length)
+
     def __eq__(self, other):
         """Common equality checker for IP prefixes"""
 
-        return self.prefix == other.prefix and self.length == other.length
+        if not isinstance(other, IPPrefix):
+            return NotImplemented
+        return self.value == other.value and self.length == other.length and self.INET_TYPE == other.INET_TYPE
+
+    def __hash__(self):
+        """Common hash method for IP prefixes"""
+
+        return hash((self.INET_TYPE, self.value, self.length))
+
+    def network(self):
+        """The same prefix with any bits past the prefix length cleared"""
+
+        value = self.value >> (self.BIT_LENGTH - self.length) << (self.BIT_LENGTH - self.length)
+        if value == self.value:
+            return self
+        return self.__class__(value, self.length)
+
+    def __contains__(self, other):
+        """Checks if an address, or a prefix of the same or greater length, falls within this prefix"""
+
+        if not isinstance(other, IPBase) or other.INET_TYPE != self.INET_TYPE:
+            return False
+        if isinstance(other, IPPrefix) and other.length < self.length:
+            return False
+        shift = self.BIT_LENGTH - self.length
+        return other.value >> shift == self.value >> shift
 
     @staticmethod
     def from_string(string):
@@ -82,7 +198,10 @@ class IPPrefix(IPBase): # pylint: disable=too-few-public-methods
 class IP4Address(IPAddress): # pylint: disable=too-few-public-methods
     """An IPv4 address"""
 
+    __slots__ = ()
+
     INET_TYPE = socket.AF_INET
+    BIT_LENGTH = 32
 
     @classmethod
     def build_from_string(cls, address_string):
@@ -95,7 +214,10 @@ class IP4Address(IPAddress): # pylint: disable=too-few-public-methods
 class IP4Prefix(IPPrefix): # pylint: disable=too-few-public-methods
     """An IPv4 prefix"""
 
+    __slots__ = ()
+
     INET_TYPE = socket.AF_INET
+    BIT_LENGTH = 32
 
     @classmethod
     def build_from_string(cls, string):
@@ -109,7 +231,10 @@ class IP4Prefix(IPPrefix): # pylint: disable=too-few-public-methods
 class IP6Address(IPAddress): # pylint: disable=too-few-public-methods
     """An IPv6 address"""
 
+    __slots__ = ()
+
     INET_TYPE = socket.AF_INET6
+    BIT_LENGTH = 128
 
     @classmethod
     def build_from_string(cls, address_string):
@@ -122,7 +247,10 @@ class IP6Address(IPAddress): # pylint: disable=too-few-public-methods
 class IP6Prefix(IPPrefix): # pylint: disable=too-few-public-methods
     """An IPv6 prefix"""
 
+    __slots__ = ()
+
     INET_TYPE = socket.AF_INET6
+    BIT_LENGTH = 128
 
     @classmethod
     def build_from_string(cls, string):
@@ -0,0 +1,123 @@
+from collections import deque
+
+from .metrics import REGISTRY
+
+# 0-15 are reserved (RFC 3032), labels are 20 bits
+MIN_LABEL = 16
+MAX_LABEL = 1048575
+DEFAULT_POOLS = (("default", MIN_LABEL, MAX_LABEL),)
+
+LABELS_ALLOCATED = REGISTRY.gauge("ldp_labels_allocated", "Local labels currently allocated", ("local", "pool"))
+
+class LabelSpaceExhaustedError(Exception):
+    def __init__(self, msg):
+        super(LabelSpaceExhaustedError, self).__init__(msg)
+
+class LabelPool(object):
+    """A range of labels handed out and taken back in O(1)
+
+    Labels that have never been used come off a watermark, so a pool
+    costs nothing up front however big its range is. Freed labels go on a
+    FIFO list and are handed out again before the watermark moves on;
+    first in first out means a freed label is reused as late as possible,
+    which gives peers time to drop it during a flap. A byte per label up
+    to the watermark records which are in use, to catch double frees.
+    """
+
+    def __init__(self, name, first, last):
+        self.name = name
+        self.first = first
+        self.last = last
+        self.next_unused = first
+        self.free_labels = deque()
+        self.in_use = bytearray()
+        self.allocated = 0
+
+    @property
+    def size(self):
+        return self.last - self.first + 1
+
+    def __contains__(self, label):
+        return self.first <= label <= self.last
+
+    def is_allocated(self, label):
+        offset = label - self.first
+        return 0 <= offset < len(self.in_use) and self.in_use[offset] == 1
+
+    def allocate(self):
+        if self.free_labels:
+            label = self.free_labels.popleft()
+            self.in_use[label - self.first] = 1
+        elif self.next_unused <= self.last:
+            label = self.next_unused
+            self.next_unused += 1
+            self.in_use.append(1)
+        else:
+            raise LabelSpaceExhaustedError("No labels left in pool %s" % self.name)
+        self.allocated += 1
+        return label
+
+    def free(self, label):
+        if not self.is_allocated(label):
+            raise ValueError("Label %d isn't allocated from pool %s" % (label, self.name))
+        self.in_use[label - self.first] = 0
+        self.free_labels.append(label)
+        self.allocated -= 1
+
+class LabelManager(object):
+    """Local label space, split into named pools
+
+    Pools are given as (name, first, last) ranges, which have to sit within
+    16..1048575 and not overlap. label_for_fec() gives each FEC one label
+    and keeps handing back the same one until release_fec(), so a FEC keeps
+    its label however many times it's advertised, to however many peers.
+    """
+
+    def __init__(self, pools=DEFAULT_POOLS):
+        self.pools = {}
+        ranges = []
+        for name, first, last in pools:
+            if not MIN_LABEL <= first <= last <= MAX_LABEL:
+                raise ValueError("Bad label range %d-%d for pool %s" % (first, last, name))
+            if name in self.pools:
+                raise ValueError("Duplicate label pool %s" % name)
+            self.pools[name] = LabelPool(name, first, last)
+            ranges.append((first, last, name))
+        ranges.sort()
+        for (_, last, name), (first, _, other_name) in zip(ranges, ranges[1:]):
+            if first <= last:
+                raise ValueError("Label pools %s and %s overlap" % (name, other_name))
+        # FEC key (network << 8 | prefix length) to label
+        self.fec_labels = {}
+
+    def allocate(self, pool="default"):
+        return self.pools[pool].allocate()
+
+    def free(self, label):
+        for pool in self.pools.values():
+            if label in pool:
+                pool.free(label)
+                return
+        raise ValueError("Label %d isn't in any pool" % label)
+
+    def label_for_fec(self, network, prefix_length, pool="default"):
+        key = network << 8 | prefix_length
+        label = self.fec_labels.get(key)
+        if label is None:
+            label = self.fec_labels[key] = self.pools[pool].allocate()
+        return label
+
+    def fec_label(self, network, prefix_length):
+        # the FEC's label if it has one, without allocating
+        return self.fec_labels.get(network << 8 | prefix_length)
+
+    def release_fec(self, network, prefix_length):
+        # frees the FEC's label and returns it, or None if it didn't have one
+        label = self.fec_labels.pop(network << 8 | prefix_length, None)
+        if label is not None:
+            self.free(label)
+        return label
+
+    def utilisation(self):
+        # pool name to (allocated, size); read from the metrics render thread too
+        return dict((name, (pool.allocated, pool.size)) for name, pool in list(self.pools.items()))
@@ -1,33 +1,99 @@
 from eventlet.green import socket
-from eventlet import sleep, GreenPool
-from time import time
-
-import struct
-import select
-
-from .ldp_pdu import LdpPdu, parse_ldp_pdu
-from .ldp_message import LdpHelloMessage
-from .ldp_state_machine import LdpStateMachine
+from eventlet import sleep, spawn, GreenPool, tpool
+from eventlet.hubs import trampoline
+from eventlet.queue import LightQueue, Full
+
+from socket import SHUT_RD
+from time import monotonic
+
+from .ldp_session import LdpSession, SESSIONS_ACTIVE, SEND_QUEUE_BYTES, DECODE_ERRORS
+from .ldp_discovery import AdjacencyTable
+from .discovery_reactor import DiscoveryReactor
+from .ldp_route_db import LdpRouteDb
+from .label_manager import LabelManager, LABELS_ALLOCATED
 from .stream_server import StreamServer
-from .chopper import Chopper
-from .multicast_socket import MulticastSocket
+from .multicast_socket import MAX_BATCH
+from .timer_wheel import TimerWheel
 
 from .error import SocketClosedError
+from .log import get_logger
+from .tracing import Tracer
+
+LOGGER = get_logger("ldp")
 
-def build_byte_string(hex_stream):
-    values = [int(x, 16) for x in map(''.join, zip(*[iter(hex_stream)]*2))]
-    return struct.pack("!" + "B" * len(values), *values)
+def notify(channel):
+    # wakes whoever is waiting on a LightQueue(1) without ever blocking
+    try:
+        channel.put_nowait(None)
+    except Full:
+        pass
+
+class EventletDiscovery(DiscoveryReactor):
+    """A DiscoveryReactor run by two green threads, one reading the socket and one sending Hellos"""
+
+    def __init__(self, *args, **kwargs):
+        super(EventletDiscovery, self).__init__(*args, **kwargs)
+        self.running = False
+        self.eventlets = []
+
+    def run(self):
+        self.bind()
+        self.running = True
+        pool = GreenPool()
+        self.eventlets = [pool.spawn(self.receive), pool.spawn(self.hello_loop)]
+        pool.waitall()
+
+    def receive(self):
+        try:
+            while self.running:
+                try:
+                    # the timeout's only there so we notice running going False
+                    trampoline(self.multicast_socket.fileno(), read=True, timeout=1, timeout_exc=socket.timeout)
+                except socket.timeout:
+                    continue
+                # a full batch means there's probably more queued, let the other green threads in first
+                while self.readable() == MAX_BATCH:
+                    sleep(0)
+
+        except SocketClosedError:
+            pass
+
+    def hello_loop(self):
+        while self.running:
+            self.send_hellos()
+            sleep(self.hello_delay())
+
+    def shutdown(self):
+        self.running = False
+        for eventlet in self.eventlets:
+            eventlet.kill()
+        # closed once nothing's waiting on it, the hub doesn't like fds closed under it
+        super(EventletDiscovery, self).shutdown()
 
 class Ldp(object):
     LISTEN_PORT = 646
     MULTICAST_ADDRESS = '224.0.0.2'
+    HELLO_INTERVAL = 5
+    HELLO_JITTER = 0.1
 
-    def __init__(self, listen_ip):
+    def __init__(self, listen_ip, tracer=None, decode_offload=None, discovery=None):
         self.listen_ip = listen_ip
+        self.decode_offload = decode_offload
+        # an EventletDiscovery shared with other routers, or None for one of our own
+        self.discovery = discovery
+        self.owns_discovery = False
+        # shared by all sessions so the slowest traces are across the whole router
+        self.tracer = tracer or Tracer()
         self.running = False
         self.socket = None
         self.eventlets = []
         self.last_message_id = 0
+        self.sessions = {}
+        self.route_db = LdpRouteDb()
+        self.label_manager = LabelManager()
+        # every adjacency, hold and keepalive timer, driven by one green thread
+        self.timer_wheel = TimerWheel()
+        self.adjacencies = AdjacencyTable(self.timer_wheel, on_down=self.adjacency_down)
 
     def get_message_id(self):
         self.last_message_id += 1
@@ -35,102 +101,153 @@ class Ldp(object):
 
     def run(self):
         self.running = True
+        SEND_QUEUE_BYTES.add_callback(self.send_queue_samples)
+        LABELS_ALLOCATED.add_callback(self.label_samples)
         self.pool = GreenPool()
         self.eventlets = []
 
-        self.eventlets.append(self.pool.spawn(self.handle_packets_in))
-        self.eventlets.append(self.pool.spawn(self.hello_timer))
+        if self.discovery is None:
+            self.discovery = EventletDiscovery(self.MULTICAST_ADDRESS, self.LISTEN_PORT, self.HELLO_INTERVAL, self.HELLO_JITTER)
+            self.owns_discovery = True
+        self.discovery.register(self)
+        if self.owns_discovery:
+            self.eventlets.append(self.pool.spawn(self.discovery.run))
+        self.eventlets.append(self.pool.spawn(self.run_timers))
         self.eventlets.append(self.pool.spawn(self.run_tcp_handler))
 
         self.pool.waitall()
 
     def run_tcp_handler(self):
-        print("Starting TCP socket on %s:%s" % (self.listen_ip, self.LISTEN_PORT))
+        LOGGER.info("Starting TCP socket on %s:%s", self.listen_ip, self.LISTEN_PORT)
         self.stream_server = StreamServer((self.listen_ip, self.LISTEN_PORT), self.handle_tcp)
         self.stream_server.serve_forever()
 
     def handle_tcp(self, socket, address):
         peer_ip, peer_port = address
-        messages_sent = 0
-        print("Got connection from %s:%s" % (peer_ip, peer_port))
-        input_stream = socket.makefile(mode="rb")
-        chopper = Chopper(4, 2, 0, input_stream)
-        state_machine = LdpStateMachine(self.listen_ip, peer_ip)
+        LOGGER.info("Got connection from %s:%s", peer_ip, peer_port)
+        session = LdpSession(self.listen_ip, peer_ip, peer_port, self.get_message_id, tracer=self.tracer, route_db=self.route_db,
+                             label_manager=self.label_manager)
+        send_queue = session.send_queue
+        framer = session.framer
+        data_ready = LightQueue(1)
+        resumed = LightQueue(1)
+        send_queue.on_data = lambda: notify(data_ready)
+        send_queue.on_resume = lambda: notify(resumed)
+        # the writer sends the Notification and then shuts the socket, which wakes the reader
+        session.on_close = send_queue.close
+        session.start_timers(self.timer_wheel)
+        self.sessions[address] = session
+        SESSIONS_ACTIVE.inc()
+        writer = spawn(self.write_session, session, socket, data_ready)
+        try:
+            while not session.closed and not send_queue.closed:
+                # stop reading from a peer that isn't keeping up with what we send it
+                while send_queue.paused and not send_queue.closed:
+                    resumed.get()
+                # one read can drain many PDUs on a busy session
+                bytes_read = framer.recv(socket)
+                # traces start here, so framing and any offload wait show up in them
+                read_at = monotonic()
+                serialised_pdus = framer.buffer_updated(bytes_read)
+                session.pdus_received(serialised_pdus, read_at, self.decode_large_batches(serialised_pdus))
+        except SocketClosedError as e:
+            LOGGER.info("Socket closed from %s:%s", peer_ip, peer_port)
+        except DECODE_ERRORS as e:
+            LOGGER.warning("Couldn't parse PDU from %s:%s: %s", peer_ip, peer_port, e)
+        except Exception:
+            # a broken decode pool or the like; nothing is left to escape the green thread
+            LOGGER.exception("Couldn't handle PDUs from %s:%s", peer_ip, peer_port)
+        finally:
+            session.close()
+            writer.wait()
+            del self.sessions[address]
+            SESSIONS_ACTIVE.dec()
+            LOGGER.info("Closing socket with %s:%s", peer_ip, peer_port)
+            socket.close()
+
+    def decode_large_batches(self, serialised_pdus):
+        if self.decode_offload is None:
+            return None
+        futures = self.decode_offload.submit(serialised_pdus)
+        if not futures:
+            return None
+        # the wait happens on a native thread, so other sessions keep running meanwhile
+        return dict((index, tpool.execute(future.result)) for index, future in futures.items())
+
+    def write_session(self, session, socket, data_ready):
+        # a slow peer only ever blocks this green thread
+        send_queue = session.send_queue
         try:
             while True:
-                sleep(0)
-                serialised_pdu = chopper.next()
-                print("Got PDU from %s:%s" % (peer_ip, peer_port))
-                pdu = parse_ldp_pdu(serialised_pdu)
-                messages = pdu.messages
-                for message in messages:
-                    outbound_messages = state_machine.message_received(message)
-                    outbound_pdus = []
-                    for outbound_message in outbound_messages:
-                        outbound_message.message_id = self.get_message_id()
-                        print("Sending message %s" % outbound_message)
-                        pdu = LdpPdu(1, self.listen_ip, 0, [outbound_message.pack()])
-                        outbound_pdus.append(pdu)
-                    for pdu in outbound_pdus:
-                        socket.send(pdu.pack())
-                if state_machine.state == "NONEXISTENT":
+                data = send_queue.take()
+                traces = session.take_traces()
+                if data:
+                    socket.sendall(data)
+                    send_queue.sent(len(data))
+                    if traces:
+                        session.traces_sent(traces)
+                elif send_queue.closed:
                     break
-        except (SocketClosedError, StopIteration) as e:
-            print("Socket closed from %s:%s" % (peer_ip, peer_port))
-        print("Closing socket with %s:%s" % (peer_ip, peer_port))
-        socket.close()
-
-    def handle_packets_in(self):
-        self.multicast_socket = MulticastSocket(self.MULTICAST_ADDRESS, self.LISTEN_PORT, self.listen_ip)
-        self.multicast_socket.bind()
-
+                else:
+                    data_ready.get()
+        except OSError as e:
+            LOGGER.warning("Couldn't write to %s:%s: %s", session.peer_ip, session.peer_port, e)
+            send_queue.close()
         try:
-            while self.running:
-                sleep(1)
-                while True:
-                    data, address = self.multicast_socket.recv(4096, 10)
-                    if not data:
-                        break
-
-                    pdu = parse_ldp_pdu(data)
-                    messages = pdu.messages
-                    if len(messages) > 1:
-                        print("Weird... got PDU from %s with lots of messages: " % (address, messages))
-                        continue
+            # the reader may be waiting on a peer that's gone quiet
+            socket.shutdown(SHUT_RD)
+        except OSError:
+            pass
 
-                    message = messages[0]
-                    if not isinstance(message, LdpHelloMessage):
-                        print("Got message from %s but it isn't a hello message: %s" % (address, message))
-                        continue
+    def session_queue_depths(self):
+        # also called from the metrics render thread, so it works on a copy of the sessions
+        return dict(("%s:%s" % address, session.queue_depth) for address, session in list(self.sessions.items()))
 
-                    print("Got hello message from %s ID %s" % (address, message.message_id))
+    def dump_traces(self):
+        return {
+            "slowest": self.tracer.slowest_traces(),
+            "sessions": dict(("%s:%s" % address, session.latency_summary()) for address, session in list(self.sessions.items())),
+        }
 
-        except OSError:
-            pass
+    def send_queue_samples(self):
+        return [((self.listen_ip, peer), depth) for peer, depth in self.session_queue_depths().items()]
+
+    def label_samples(self):
+        return [((self.listen_ip, pool), allocated) for pool, (allocated, _) in self.label_manager.utilisation().items()]
+
+    def adjacency_down(self, adjacency):
+        # a session only lasts as long as some Hello adjacency with its peer
+        if any(other.lsr_id == adjacency.lsr_id for other in self.adjacencies):
+            return
+        for session in list(self.sessions.values()):
+            if session.state_machine.peer_lsr_id == adjacency.lsr_id and not session.closed:
+                LOGGER.info("No adjacencies left with %s, closing session with %s:%s", adjacency.lsr_id,
+                            session.peer_ip, session.peer_port)
+                session.shutdown()
+
+    def datagram_received(self, data, datagram):
+        # links are told apart by interface where IP_PKTINFO tells us it
+        source = datagram.interface or datagram.source[0]
+        try:
+            self.adjacencies.hello_received(data, source)
+        except DECODE_ERRORS as e:
+            LOGGER.warning("Couldn't parse discovery packet from %s: %s", datagram.source, e)
 
-    def hello_timer(self):
-        next_timer_at = int(time())
+    def run_timers(self):
         while self.running:
-            sleep(1)
-            if int(time()) > next_timer_at:
-                self.send_hello(self.get_message_id())
-                next_timer_at += 5
-
-    def send_hello(self, message_id):
-        print("Sending hello message")
-        tlvs = {
-            0x0401 : build_byte_string("ac1a016a")
-        }
-        message = LdpHelloMessage(message_id, 15, False, False, tlvs)
-        pdu = LdpPdu(1, self.listen_ip, 0, [message.pack()])
-        if self.multicast_socket:
-            self.multicast_socket.send(pdu.pack())
-        else:
-            print("Not sending; UDP socket dead")
+            sleep(self.timer_wheel.resolution)
+            self.timer_wheel.advance()
 
     def shutdown(self):
         self.running = False
-        self.multicast_socket.shutdown()
+        SEND_QUEUE_BYTES.remove_callback(self.send_queue_samples)
+        LABELS_ALLOCATED.remove_callback(self.label_samples)
+        self.adjacencies.clear()
+
+        if self.discovery:
+            self.discovery.unregister(self)
+            if self.owns_discovery:
+                self.discovery.shutdown()
 
         for eventlet in self.eventlets:
             eventlet.kill()
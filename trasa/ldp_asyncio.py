@@ -0,0 +1,298 @@
+import asyncio
+from time import monotonic
+
+from .ldp_session import LdpSession, SESSIONS_ACTIVE, SEND_QUEUE_BYTES, DECODE_ERRORS
+from .ldp_discovery import AdjacencyTable
+from .discovery_reactor import DiscoveryReactor
+from .ldp_route_db import LdpRouteDb
+from .label_manager import LabelManager, LABELS_ALLOCATED
+from .error import SocketClosedError
+from .log import get_logger
+from .tracing import Tracer
+from .timer_wheel import TimerWheel
+
+LOGGER = get_logger("ldp_asyncio")
+
+class LdpStreamProtocol(asyncio.BufferedProtocol):
+    """Drives one LdpSession from an asyncio transport
+
+    The event loop reads straight into the session's framer through
+    get_buffer()/buffer_updated(). Replies are moved from the send queue to
+    the transport as soon as they're queued. If the transport's own buffer
+    fills, we stop moving them, the send queue backs up past its high
+    watermark and reading pauses until the peer catches up.
+    """
+
+    def __init__(self, ldp):
+        self.ldp = ldp
+        self.transport = None
+        self.session = None
+        self.address = None
+        self.writing_paused = False
+        self.decoding = False
+        # bytes written to the transport that it hadn't sent yet, last we looked
+        self.transport_bytes = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info("peername")[:2]
+        peer_ip, peer_port = self.address
+        LOGGER.info("Got connection from %s:%s", peer_ip, peer_port)
+        self.session = LdpSession(self.ldp.listen_ip, peer_ip, peer_port, self.ldp.get_message_id, tracer=self.ldp.tracer,
+                                   route_db=self.ldp.route_db, label_manager=self.ldp.label_manager)
+        self.session.send_queue.on_data = self.write_queued
+        self.session.send_queue.on_resume = self.resume_reading
+        # the Notification has already gone to the transport, which sends it before closing
+        self.session.on_close = self.transport.close
+        self.session.start_timers(self.ldp.timer_wheel)
+        self.ldp.sessions[self.address] = self.session
+        self.ldp.protocols.add(self)
+        SESSIONS_ACTIVE.inc()
+
+    def get_buffer(self, sizehint):
+        return self.session.framer.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        # traces start here, so framing and any offload wait show up in them
+        read_at = monotonic()
+        serialised_pdus = self.session.framer.buffer_updated(nbytes)
+        decode_offload = self.ldp.decode_offload
+        futures = decode_offload.submit(serialised_pdus) if decode_offload else None
+        if futures:
+            # no more reads until these are done, so the session sees its PDUs in order
+            self.decoding = True
+            self.transport.pause_reading()
+            asyncio.ensure_future(self.offloaded_pdus_received(serialised_pdus, futures, read_at))
+        else:
+            self.pdus_received(serialised_pdus, read_at)
+
+    async def offloaded_pdus_received(self, serialised_pdus, futures, read_at):
+        decoded_pdus = {}
+        try:
+            for index, future in futures.items():
+                decoded_pdus[index] = await asyncio.wrap_future(future)
+        except DECODE_ERRORS as e:
+            LOGGER.warning("Couldn't parse PDU from %s:%s: %s", self.session.peer_ip, self.session.peer_port, e)
+            self.transport.close()
+            return
+        except Exception:
+            # a broken pool or the like; the session can't go on without these PDUs
+            LOGGER.exception("Couldn't decode PDUs from %s:%s", self.session.peer_ip, self.session.peer_port)
+            self.transport.close()
+            return
+        finally:
+            self.decoding = False
+        if self.transport.is_closing():
+            return
+        self.pdus_received(serialised_pdus, read_at, decoded_pdus)
+        self.resume_reading()
+
+    def pdus_received(self, serialised_pdus, read_at=None, decoded_pdus=None):
+        session = self.session
+        try:
+            session.pdus_received(serialised_pdus, read_at, decoded_pdus)
+        except DECODE_ERRORS as e:
+            LOGGER.warning("Couldn't parse PDU from %s:%s: %s", session.peer_ip, session.peer_port, e)
+            self.transport.close()
+            return
+        except Exception:
+            LOGGER.exception("Couldn't handle PDUs from %s:%s", session.peer_ip, session.peer_port)
+            self.transport.close()
+            return
+        if session.closed:
+            session.send_queue.close()
+            # close() still sends whatever the transport has buffered
+            self.transport.close()
+        elif session.send_queue.paused:
+            self.transport.pause_reading()
+
+    def write_queued(self):
+        if self.writing_paused or self.transport.is_closing():
+            return
+        session = self.session
+        data = session.send_queue.take()
+        traces = session.take_traces()
+        if data:
+            self.transport.write(data)
+            self.transport_bytes += len(data)
+            self.transport_sent()
+            if traces:
+                session.traces_sent(traces)
+
+    def transport_sent(self):
+        # whatever has left the transport's buffer has been sent
+        buffered = self.transport.get_write_buffer_size()
+        if buffered < self.transport_bytes:
+            sent, self.transport_bytes = self.transport_bytes - buffered, buffered
+            self.session.send_queue.sent(sent)
+
+    def resume_reading(self):
+        if not self.decoding and not self.session.send_queue.paused and not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def pause_writing(self):
+        self.writing_paused = True
+
+    def resume_writing(self):
+        self.writing_paused = False
+        self.transport_sent()
+        self.write_queued()
+
+    def eof_received(self):
+        LOGGER.info("Socket closed from %s:%s", self.session.peer_ip, self.session.peer_port)
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            LOGGER.warning("Lost connection with %s:%s: %s", self.session.peer_ip, self.session.peer_port, exc)
+        self.session.close()
+        del self.ldp.sessions[self.address]
+        self.ldp.protocols.discard(self)
+        SESSIONS_ACTIVE.dec()
+        LOGGER.info("Closing socket with %s:%s", self.session.peer_ip, self.session.peer_port)
+
+class AsyncDiscovery(DiscoveryReactor):
+    """A DiscoveryReactor driven by the event loop, with a reader on the socket and a loop timer for Hellos"""
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncDiscovery, self).__init__(*args, **kwargs)
+        self.loop = None
+        self.hello_handle = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.bind()
+        # level triggered, so anything left after a full batch is picked up on the next loop iteration
+        self.loop.add_reader(self.multicast_socket.fileno(), self.reader_ready)
+        self.hello_timer()
+
+    def reader_ready(self):
+        try:
+            self.readable()
+        except SocketClosedError:
+            self.shutdown()
+
+    def hello_timer(self):
+        self.send_hellos()
+        self.hello_handle = self.loop.call_later(self.hello_delay(), self.hello_timer)
+
+    def shutdown(self):
+        if self.hello_handle:
+            self.hello_handle.cancel()
+            self.hello_handle = None
+        if self.loop and self.multicast_socket.socket.fileno() >= 0:
+            self.loop.remove_reader(self.multicast_socket.fileno())
+            super(AsyncDiscovery, self).shutdown()
+
+class AsyncLdp(object):
+    """The LDP daemon for one address, run on an asyncio event loop
+
+    Takes the same codec, sessions and state machine as the eventlet Ldp
+    class. Sessions are driven by protocols, hold and keepalive timers
+    share a TimerWheel advanced from a loop timer, and discovery goes
+    through an AsyncDiscovery, which can be shared with other routers on
+    the same loop. It runs on any asyncio loop, uvloop included.
+    """
+
+    LISTEN_PORT = 646
+    MULTICAST_ADDRESS = '224.0.0.2'
+    HELLO_INTERVAL = 5
+    HELLO_JITTER = 0.1
+
+    def __init__(self, listen_ip, tracer=None, decode_offload=None, discovery=None):
+        self.listen_ip = listen_ip
+        self.decode_offload = decode_offload
+        # an AsyncDiscovery shared with other routers, or None for one of our own
+        self.discovery = discovery
+        self.owns_discovery = False
+        self.tracer = tracer or Tracer()
+        self.last_message_id = 0
+        self.sessions = {}
+        self.route_db = LdpRouteDb()
+        self.label_manager = LabelManager()
+        self.timer_wheel = TimerWheel()
+        self.adjacencies = AdjacencyTable(self.timer_wheel, on_down=self.adjacency_down)
+        self.tick_handle = None
+        self.protocols = set()
+        self.server = None
+        self.stopped = None
+
+    def get_message_id(self):
+        self.last_message_id += 1
+        return self.last_message_id
+
+    async def start_tcp(self):
+        LOGGER.info("Starting TCP socket on %s:%s", self.listen_ip, self.LISTEN_PORT)
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: LdpStreamProtocol(self), self.listen_ip, self.LISTEN_PORT)
+
+    async def start_discovery(self):
+        if self.discovery is None:
+            self.discovery = AsyncDiscovery(self.MULTICAST_ADDRESS, self.LISTEN_PORT, self.HELLO_INTERVAL, self.HELLO_JITTER)
+            self.owns_discovery = True
+        self.discovery.register(self)
+        if self.owns_discovery:
+            self.discovery.start()
+
+    async def run(self):
+        self.stopped = asyncio.Event()
+        SEND_QUEUE_BYTES.add_callback(self.send_queue_samples)
+        LABELS_ALLOCATED.add_callback(self.label_samples)
+        self.tick_handle = asyncio.get_running_loop().call_later(self.timer_wheel.resolution, self.tick)
+        await self.start_tcp()
+        await self.start_discovery()
+        await self.stopped.wait()
+
+    def tick(self):
+        self.timer_wheel.advance()
+        self.tick_handle = asyncio.get_running_loop().call_later(self.timer_wheel.resolution, self.tick)
+
+    def adjacency_down(self, adjacency):
+        # a session only lasts as long as some Hello adjacency with its peer
+        if any(other.lsr_id == adjacency.lsr_id for other in self.adjacencies):
+            return
+        for session in list(self.sessions.values()):
+            if session.state_machine.peer_lsr_id == adjacency.lsr_id and not session.closed:
+                LOGGER.info("No adjacencies left with %s, closing session with %s:%s", adjacency.lsr_id,
+                            session.peer_ip, session.peer_port)
+                session.shutdown()
+
+    def datagram_received(self, data, datagram):
+        # links are told apart by interface where IP_PKTINFO tells us it
+        source = datagram.interface or datagram.source[0]
+        try:
+            self.adjacencies.hello_received(data, source)
+        except DECODE_ERRORS as e:
+            LOGGER.warning("Couldn't parse discovery packet from %s: %s", datagram.source, e)
+
+    def session_queue_depths(self):
+        # also called from the metrics render thread, so it works on a copy of the sessions
+        return dict(("%s:%s" % address, session.queue_depth) for address, session in list(self.sessions.items()))
+
+    def dump_traces(self):
+        return {
+            "slowest": self.tracer.slowest_traces(),
+            "sessions": dict(("%s:%s" % address, session.latency_summary()) for address, session in list(self.sessions.items())),
+        }
+
+    def send_queue_samples(self):
+        return [((self.listen_ip, peer), depth) for peer, depth in self.session_queue_depths().items()]
+
+    def label_samples(self):
+        return [((self.listen_ip, pool), allocated) for pool, (allocated, _) in self.label_manager.utilisation().items()]
+
+    def shutdown(self):
+        if self.tick_handle:
+            self.tick_handle.cancel()
+        if self.discovery:
+            self.discovery.unregister(self)
+            if self.owns_discovery:
+                self.discovery.shutdown()
+        if self.server:
+            self.server.close()
+        for protocol in list(self.protocols):
+            protocol.transport.close()
+        if self.stopped and not self.stopped.is_set():
+            SEND_QUEUE_BYTES.remove_callback(self.send_queue_samples)
+            LABELS_ALLOCATED.remove_callback(self.label_samples)
+            self.adjacencies.clear()
+            self.stopped.set()
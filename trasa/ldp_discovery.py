@@ -0,0 +1,174 @@
+import socket
+import struct
+
+from .ldp_pdu import LdpPdu, parse_ldp_pdu
+from .ldp_message import LdpHelloMessage
+from .log import get_logger, DEBUG
+from .metrics import REGISTRY
+
+LOGGER = get_logger("discovery")
+
+HELLOS_RECEIVED = REGISTRY.counter("ldp_hello_packets_received", "LDP Hello packets received over UDP")
+HELLOS_FAST_PATH = REGISTRY.counter("ldp_hello_fast_path", "LDP Hellos from known adjacencies that skipped the full parse")
+ADJACENCIES = REGISTRY.gauge("ldp_adjacencies", "LDP Hello adjacencies currently up")
+
+# also what a hold time of 0 in a link Hello means
+HELLO_HOLD_TIME = 15
+TRANSPORT_ADDRESS_TLV = 0x0401
+
+# PDU header, LDP identifier, message header and the Common Hello Parameters
+# TLV that always comes first in a Hello
+HELLO_PEEK = struct.Struct("!HH4sHHHIHHHH")
+
+def build_byte_string(hex_stream):
+    values = [int(x, 16) for x in map(''.join, zip(*[iter(hex_stream)]*2))]
+    return struct.pack("!" + "B" * len(values), *values)
+
+def build_hello_pdu(listen_ip, message_id):
+    tlvs = {
+        0x0401 : build_byte_string("ac1a016a")
+    }
+    message = LdpHelloMessage(message_id, HELLO_HOLD_TIME, False, False, tlvs)
+    return LdpPdu(1, listen_ip, 0, [message.pack()]).pack()
+
+def peek_hello(data):
+    # (packed LSR ID, label space, hold time) from a packet that's plainly one
+    # Hello, or None if it needs a full parse
+    if len(data) < HELLO_PEEK.size:
+        return None
+    version, pdu_length, packed_lsr_id, label_space_id, message_type, message_length, _, tlv_type, tlv_length, hold_time, \
+        _ = HELLO_PEEK.unpack_from(data)
+    if version != 1 or pdu_length + 4 != len(data) or message_length + 14 != len(data):
+        return None
+    if message_type != LdpHelloMessage.MSG_TYPE or tlv_type & 0x3fff != LdpHelloMessage.MANDATORY_TLVS[0] or tlv_length != 4:
+        return None
+    return packed_lsr_id, label_space_id, hold_time
+
+def parse_hello(data, address):
+    # returns the PDU from a discovery packet, or None if it doesn't hold exactly one Hello
+    pdu = parse_ldp_pdu(data, lazy=True)
+    messages = pdu.messages
+    if not messages:
+        LOGGER.warning("Got PDU from %s with no messages", address)
+        return None
+    if len(messages) > 1:
+        LOGGER.warning("Weird... got PDU from %s with lots of messages: %s", address, len(messages))
+        return None
+
+    message = messages[0]
+    if not isinstance(message, LdpHelloMessage):
+        LOGGER.warning("Got message from %s but it isn't a hello message: %s", address, message)
+        return None
+
+    HELLOS_RECEIVED.child.value += 1
+    if LOGGER.isEnabledFor(DEBUG):
+        LOGGER.debug("Got hello message from %s ID %s", address, message.message_id)
+    return pdu
+
+class Adjacency(object):
+    """A neighbour we're getting Hellos from, on one interface or from one source"""
+
+    __slots__ = ("lsr_id", "label_space_id", "source", "transport_address", "hold_time", "timer")
+
+    def __init__(self, lsr_id, label_space_id, source, transport_address):
+        self.lsr_id = lsr_id
+        self.label_space_id = label_space_id
+        self.source = source
+        # where to open the session to, from the Hello or else its source address
+        self.transport_address = transport_address
+        self.hold_time = None
+        self.timer = None
+
+    def __str__(self):
+        return "%s:%s via %s" % (self.lsr_id, self.label_space_id, self.source)
+
+class AdjacencyTable(object):
+    """Hello adjacencies, keyed by (LSR ID, label space, source)
+
+    source is whatever the engine uses to tell links apart: the interface
+    the Hello came in on, or failing that the address it came from. Each
+    adjacency has a hold timer on the shared TimerWheel, restarted by every
+    Hello, and on_up/on_down are called as adjacencies come and go. A Hello
+    from a neighbour we already know only has its fixed header and Common
+    Hello Parameters TLV read (see peek_hello()), so refreshing one costs
+    a struct unpack, a dict lookup and a timer reschedule.
+    """
+
+    def __init__(self, timer_wheel, local_hold_time=HELLO_HOLD_TIME, on_up=None, on_down=None):
+        self.timer_wheel = timer_wheel
+        self.local_hold_time = local_hold_time
+        self.on_up = on_up
+        self.on_down = on_down
+        self.adjacencies = {}
+
+    def __len__(self):
+        return len(self.adjacencies)
+
+    def __iter__(self):
+        return iter(list(self.adjacencies.values()))
+
+    def get(self, lsr_id, label_space_id, source):
+        return self.adjacencies.get((socket.inet_aton(lsr_id), label_space_id, source))
+
+    def hello_received(self, data, source):
+        # returns the adjacency the Hello was for, or None if it wasn't a usable Hello;
+        # raises ParseError if it couldn't be parsed at all
+        peeked = peek_hello(data)
+        if peeked is not None:
+            packed_lsr_id, label_space_id, hold_time = peeked
+            adjacency = self.adjacencies.get((packed_lsr_id, label_space_id, source))
+            if adjacency is not None:
+                HELLOS_RECEIVED.child.value += 1
+                HELLOS_FAST_PATH.child.value += 1
+                self.refresh(adjacency, hold_time)
+                return adjacency
+
+        pdu = parse_hello(data, source)
+        if pdu is None:
+            return None
+        message = pdu.messages[0]
+        key = (socket.inet_aton(pdu.lsr_id), pdu.label_space_id, source)
+        adjacency = self.adjacencies.get(key)
+        if adjacency is None:
+            transport_address = message.tlvs.get(TRANSPORT_ADDRESS_TLV)
+            transport_address = socket.inet_ntoa(transport_address) if transport_address is not None and len(transport_address) == 4 \
+                else None
+            adjacency = Adjacency(pdu.lsr_id, pdu.label_space_id, source, transport_address)
+            self.adjacencies[key] = adjacency
+            ADJACENCIES.inc()
+            self.refresh(adjacency, message.hold_time)
+            LOGGER.info("Adjacency up with %s", adjacency)
+            if self.on_up is not None:
+                self.on_up(adjacency)
+        else:
+            self.refresh(adjacency, message.hold_time)
+        return adjacency
+
+    def refresh(self, adjacency, hold_time):
+        # we use the smaller of our hold time and theirs
+        if hold_time == 0:
+            hold_time = HELLO_HOLD_TIME
+        hold_time = min(hold_time, self.local_hold_time)
+        adjacency.hold_time = hold_time
+        if adjacency.timer is None:
+            adjacency.timer = self.timer_wheel.schedule(hold_time, self.expired, (adjacency,))
+        else:
+            adjacency.timer.reschedule(hold_time)
+
+    def expired(self, adjacency):
+        LOGGER.info("Adjacency with %s timed out after %ds", adjacency, adjacency.hold_time)
+        self.remove(adjacency)
+
+    def remove(self, adjacency):
+        key = (socket.inet_aton(adjacency.lsr_id), adjacency.label_space_id, adjacency.source)
+        if self.adjacencies.get(key) is not adjacency:
+            return
+        del self.adjacencies[key]
+        adjacency.timer.cancel()
+        ADJACENCIES.dec()
+        if self.on_down is not None:
+            self.on_down(adjacency)
+
+    def clear(self):
+        for adjacency in list(self.adjacencies.values()):
+            self.remove(adjacency)
@@ -1,13 +1,28 @@
 import struct
 import socket
-from .packing_tools import bytes_to_short, bytes_to_integer, short_to_bytes, integer_to_bytes
-from .chopper import Chopper
-from .tlv import parse_tlv, pack_tlv
+import sys
+from .tlv import TLV_HEADER, iterate_tlvs, pack_tlv
 from .identifier import Identifier, parse_identifier
-from io import BytesIO
-from itertools import chain
+from .error import ParseError
+from .packing_tools import UINT32
+from .log import get_logger, DEBUG
 from collections import OrderedDict
 from ipaddress import IPv4Address, IPv4Network
+from array import array
+
+LOGGER = get_logger("codec")
+
+MESSAGE_HEADER = struct.Struct("!HH")
+MESSAGE_ID = struct.Struct("!I")
+
+# the type, length and message ID every message starts with
+MESSAGE_FIXED_LENGTH = MESSAGE_HEADER.size + MESSAGE_ID.size
+
+def unpack_tlv_value(value_struct, value, name):
+    # mandatory TLVs have a fixed length, any other is a malformed message
+    if len(value) != value_struct.size:
+        raise ParseError("Got %s TLV of %d bytes, expected %d" % (name, len(value), value_struct.size))
+    return value_struct.unpack(value)
 
 class LdpMessage(object):
     NOTIFICATION_MESSAGE = 0x001
@@ -15,9 +30,128 @@ class LdpMessage(object):
     INIT_MESSAGE = 0x200
     KEEPALIVE_MESSAGE = 0x201
     ADDRESS_MESSAGE = 0x300
+    ADDRESS_WITHDRAW_MESSAGE = 0x301
     LABEL_MAPPING_MESSAGE = 0x400
 
+    # _serialised_message is only set while a lazily parsed message still
+    # has its TLVs undecoded
+    __slots__ = ("message_id", "tlvs", "_serialised_message")
+
+    # the slots set on a lazy message before it's decoded
+    LAZY_SLOTS = frozenset(("message_id", "_serialised_message"))
+
+    # TLV types that the message class decodes itself, in the order they go
+    # on the wire. Each message class's from_tlvs(message_id, mandatory_tlvs,
+    # tlvs) gets their values in that order, as memoryviews into the receive
+    # buffer
+    MANDATORY_TLVS = ()
+    MANDATORY_TLV_INDEXES = {}
+
+    @classmethod
+    def lazy(cls, message_id, serialised_message):
+        # only the message ID is decoded up front, everything else waits
+        # until one of the message's fields is read
+        message = cls.__new__(cls)
+        message.message_id = message_id
+        message._serialised_message = serialised_message
+        return message
+
+    @property
+    def decoded(self):
+        return self._serialised_message is None
+
+    def decode(self):
+        decoded_message = decode_message_as(type(self), self._serialised_message)
+        # fields written before the decode keep the value they were given
+        written = self.__getstate__()
+        for name, value in decoded_message.__getstate__().items():
+            if name not in written:
+                setattr(self, name, value)
+        self._serialised_message = None
+
+    def written_before_decode(self):
+        # True if a lazy message has had a field set, so its original bytes are out of date
+        for name, descriptor in slot_descriptors(type(self)):
+            if name not in self.LAZY_SLOTS:
+                try:
+                    descriptor.__get__(self)
+                    return True
+                except AttributeError:
+                    pass
+        return False
+
+    def __getstate__(self):
+        # reads the slots directly so that copying or pickling a lazy
+        # message doesn't decode it
+        state = {}
+        for name, descriptor in slot_descriptors(type(self)):
+            try:
+                state[name] = descriptor.__get__(self)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # only reached for slots that aren't set, which on a lazy message
+        # means the TLVs haven't been decoded yet
+        if name == "_serialised_message":
+            return None
+        if name.startswith("__") or self._serialised_message is None:
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+        self.decode()
+        return getattr(self, name)
+
+    def pack_mandatory_tlvs(self):
+        return ()
+
+    def pack(self):
+        if self._serialised_message is not None:
+            if not self.written_before_decode():
+                return pack_undecoded_message(self._serialised_message, self.message_id)
+            self.decode()
+        return pack_message(self.MSG_TYPE, self.message_id, self.MANDATORY_TLVS, self.pack_mandatory_tlvs(), self.tlvs)
+
+SLOT_DESCRIPTORS = {}
+
+def slot_descriptors(cls):
+    descriptors = SLOT_DESCRIPTORS.get(cls)
+    if descriptors is None:
+        descriptors = [(name, klass.__dict__[name]) for klass in cls.__mro__ for name in klass.__dict__.get("__slots__", ())]
+        SLOT_DESCRIPTORS[cls] = descriptors
+    return descriptors
+
+def pack_message(message_type, message_id, mandatory_tlv_types, mandatory_tlvs, tlvs):
+    chunks = [None, MESSAGE_ID.pack(message_id)]
+    message_length = MESSAGE_ID.size
+    for key, value in zip(mandatory_tlv_types, mandatory_tlvs):
+        chunks.append(TLV_HEADER.pack(key, len(value)))
+        chunks.append(value)
+        message_length += TLV_HEADER.size + len(value)
+    for key, value in tlvs.items():
+        chunks.append(TLV_HEADER.pack(key, len(value)))
+        chunks.append(value)
+        message_length += TLV_HEADER.size + len(value)
+    chunks[0] = MESSAGE_HEADER.pack(message_type, message_length)
+
+    return b"".join(chunks)
+
+def pack_undecoded_message(serialised_message, message_id):
+    # forwards the TLVs exactly as they arrived, with the new message ID
+    return b"".join([
+        serialised_message[:MESSAGE_HEADER.size],
+        MESSAGE_ID.pack(message_id),
+        serialised_message[MESSAGE_HEADER.size + MESSAGE_ID.size:]
+    ])
+
 class LdpGenericMessage(LdpMessage):
+    __slots__ = ("message_type",)
+
+    LAZY_SLOTS = LdpMessage.LAZY_SLOTS | frozenset(("message_type",))
+
     def __init__(self, message_type, message_id, tlvs):
         self.message_type = message_type
         self.message_id = message_id
@@ -25,27 +159,29 @@ class LdpGenericMessage(LdpMessage):
 
     @classmethod
     def parse(cls, message_type, serialised_message):
-        message_id, = struct.unpack(
-            "!I",
-            serialised_message[:4]
-        )
-        serialised_tlvs = serialised_message[4:]
-        tlvs = parse_tlvs(serialised_tlvs)
+        if len(serialised_message) < MESSAGE_ID.size:
+            raise ParseError("Got truncated message of %d bytes" % len(serialised_message))
+        message_id, = MESSAGE_ID.unpack_from(serialised_message)
+        tlvs = parse_tlvs(memoryview(serialised_message)[MESSAGE_ID.size:])
         return cls(message_type, message_id, tlvs)
 
-    def pack(self):
-        packed_message_body = struct.pack(
-            "!I",
-            self.message_id
-        ) + pack_tlvs(self.tlvs)
-        message_length = len(packed_message_body)
-        packed_message_header = struct.pack(
-            "!HH",
-            self.message_type,
-            message_length
-        )
+    @classmethod
+    def lazy(cls, message_id, serialised_message):
+        message = super(LdpGenericMessage, cls).lazy(message_id, serialised_message)
+        message.message_type = MESSAGE_HEADER.unpack_from(serialised_message)[0]
+        return message
 
-        return packed_message_header + packed_message_body
+    def decode(self):
+        if not self.written_before_decode():
+            self.tlvs = parse_tlvs(self._serialised_message[MESSAGE_HEADER.size + MESSAGE_ID.size:])
+        self._serialised_message = None
+
+    def pack(self):
+        if self._serialised_message is not None:
+            if not self.written_before_decode():
+                return pack_undecoded_message(self._serialised_message, self.message_id)
+            self.decode()
+        return pack_message(self.message_type, self.message_id, (), (), self.tlvs)
 
     def __str__(self):
         return "LdpGenericMessage: Type: %s, ID: %s, TLVs: %s" % (
@@ -54,33 +190,88 @@ class LdpGenericMessage(LdpMessage):
             self.tlvs
             )
 
-PARSERS = {}
+def decode_message_as(cls, serialised_message):
+    serialised_message = memoryview(serialised_message)
+    message_id, = MESSAGE_ID.unpack_from(serialised_message, MESSAGE_HEADER.size)
+
+    mandatory_tlv_indexes = cls.MANDATORY_TLV_INDEXES
+    mandatory_tlvs = [None] * len(mandatory_tlv_indexes)
+    tlvs = OrderedDict()
+    for key, value in iterate_tlvs(serialised_message, MESSAGE_HEADER.size + MESSAGE_ID.size):
+        index = mandatory_tlv_indexes.get(key)
+        if index is not None and mandatory_tlvs[index] is None:
+            mandatory_tlvs[index] = value
+        else:
+            tlvs[key] = bytes(value)
+
+    if None in mandatory_tlvs:
+        missing_tlv = cls.MANDATORY_TLVS[mandatory_tlvs.index(None)]
+        raise ParseError("%s is missing mandatory TLV 0x%04x" % (cls.__name__, missing_tlv))
+
+    return cls.from_tlvs(message_id, mandatory_tlvs, tlvs)
+
+class LdpMessageCodecRegistry(object):
+    """Maps message types to message classes and decodes messages with them
+
+    The fixed header is read with precompiled structs and the TLVs are
+    walked once: values listed in the class's MANDATORY_TLVS are handed to
+    from_tlvs() as memoryviews, everything else is collected as optional
+    TLVs, and the message object is built directly from that.
+
+    With lazy=True only the header and message ID are read, and the TLVs
+    are decoded the first time one of the message's other fields is used.
+    Unknown message types are always kept undecoded so they can be
+    forwarded as they arrived.
+    """
 
-class LdpMessageParser(object):
     def __init__(self):
-        pass
+        self.message_classes = {}
 
-    def parse(self, serialised_message):
-        message_type, message_length = struct.unpack("!HH", serialised_message[:4])
-        print("Message type: %s, length: %s" % (message_type, message_length))
-        if message_type in PARSERS:
-            return PARSERS[message_type](serialised_message[4:])
+    def register(self, cls):
+        self.message_classes[cls.MSG_TYPE] = cls
+        cls.MANDATORY_TLV_INDEXES = dict((key, index) for index, key in enumerate(cls.MANDATORY_TLVS))
+        return cls
+
+    def decode(self, serialised_message, lazy=False):
+        if len(serialised_message) < MESSAGE_FIXED_LENGTH:
+            raise ParseError("Got truncated message of %d bytes" % len(serialised_message))
+        cls = self.message_classes.get(MESSAGE_HEADER.unpack_from(serialised_message)[0])
+        if cls is None:
+            cls = LdpGenericMessage
+        elif not lazy:
+            return decode_message_as(cls, serialised_message)
+
+        message_id, = MESSAGE_ID.unpack_from(serialised_message, MESSAGE_HEADER.size)
+        return cls.lazy(message_id, serialised_message)
+
+MESSAGE_CODECS = LdpMessageCodecRegistry()
+register_message = MESSAGE_CODECS.register
 
-        return LdpGenericMessage.parse(message_type, serialised_message[4:])
+class LdpMessageParser(object):
+    def __init__(self, registry=MESSAGE_CODECS, lazy=False):
+        self.registry = registry
+        self.lazy = lazy
 
-def register_parser(cls):
-    PARSERS[cls.MSG_TYPE] = cls.parse
-    return cls
+    def parse(self, serialised_message):
+        message = self.registry.decode(serialised_message, self.lazy)
+        if LOGGER.isEnabledFor(DEBUG):
+            LOGGER.debug("Message type: %s, length: %s", *MESSAGE_HEADER.unpack_from(serialised_message))
+        return message
 
 def parse_tlvs(serialised_tlvs):
-    return OrderedDict([parse_tlv(x) for x in Chopper(4, 2, 0, BytesIO(serialised_tlvs))])
+    # values are only copied out of the receive buffer here
+    return OrderedDict([(key, bytes(value)) for key, value in iterate_tlvs(serialised_tlvs)])
 
 def pack_tlvs(tlvs):
     return b"".join([pack_tlv(key, value) for key, value in tlvs.items()])
 
-@register_parser
+@register_message
 class LdpNotificationMessage(LdpMessage):
+    __slots__ = ("fatal", "forward", "status_data", "error_message_id", "error_message_type")
+
     MSG_TYPE = LdpMessage.NOTIFICATION_MESSAGE
+    MANDATORY_TLVS = (0x0300,)
+    STATUS = struct.Struct("!IIH")
 
     def __init__(self, message_id, fatal, forward, status_data, error_message_id, error_message_type, tlvs):
         self.message_id = message_id
@@ -91,37 +282,25 @@ class LdpNotificationMessage(LdpMessage):
         self.error_message_type = error_message_type
         self.tlvs = tlvs
 
-    def build_common_tlvs(self):
-        # handle common TLVs
+    def pack_mandatory_tlvs(self):
         status_code = self.status_data
         if self.fatal:
             status_code += 0x80000000
         if self.forward:
             status_code += 0x40000000
 
-        status_tlv = struct.pack("!IIH", status_code, self.error_message_id, self.error_message_type)
-        return OrderedDict([
-            (0x0300, status_tlv)
-        ])
+        return (self.STATUS.pack(status_code, self.error_message_id, self.error_message_type),)
 
     @classmethod
-    def parse(cls, serialised_message):
-        generic_message = LdpGenericMessage.parse(cls.MSG_TYPE, serialised_message)
-
-        # handle common TLVs
+    def from_tlvs(cls, message_id, mandatory_tlvs, tlvs):
         # TODO handle status TLV when it should be forwarded
-        status_tlv = generic_message.tlvs.pop(0x0300)
-        status_code, error_message_id, error_message_type = struct.unpack("!IIH", status_tlv)
+        status_tlv, = mandatory_tlvs
+        status_code, error_message_id, error_message_type = unpack_tlv_value(cls.STATUS, status_tlv, "Status")
         fatal = (status_code & 0x80000000) >> 31
         forward = (status_code & 0x40000000) >> 30
         status_data = (status_code & 0x3FFFFFFF)
 
-        return cls(generic_message.message_id, fatal, forward, status_data, error_message_id, error_message_type, generic_message.tlvs)
-
-    def pack(self):
-        combined_tlvs = OrderedDict(chain(self.build_common_tlvs().items(), self.tlvs.items()))
-
-        return LdpGenericMessage(self.MSG_TYPE, self.message_id, combined_tlvs).pack()
+        return cls(message_id, fatal, forward, status_data, error_message_id, error_message_type, tlvs)
 
     def __str__(self):
         return "LdpNotificationMessage: ID: %s, fatal: %s, forward: %s, status_data: %s, error_message_id: %s, error_message_type: %s, TLVs: %s" % (
@@ -134,9 +313,13 @@ class LdpNotificationMessage(LdpMessage):
             self.tlvs
             )
 
-@register_parser
+@register_message
 class LdpHelloMessage(LdpMessage):
+    __slots__ = ("hold_time", "targeted", "request_targeted")
+
     MSG_TYPE = LdpMessage.HELLO_MESSAGE
+    MANDATORY_TLVS = (0x0400,)
+    COMMON_HELLO_PARAMETERS = struct.Struct("!HH")
 
     def __init__(self, message_id, hold_time, targeted, request_targeted, tlvs):
         self.message_id = message_id
@@ -145,35 +328,23 @@ class LdpHelloMessage(LdpMessage):
         self.request_targeted = request_targeted
         self.tlvs = tlvs
 
-    def build_common_tlvs(self):
-        # handle common TLVs
+    def pack_mandatory_tlvs(self):
         flags = 0
         if self.targeted:
             flags += 0x8000
         if self.request_targeted:
             flags += 0x4000
 
-        common_hello = struct.pack("!HH", self.hold_time, flags)
-        return OrderedDict([
-            (0x0400, common_hello)
-        ])
+        return (self.COMMON_HELLO_PARAMETERS.pack(self.hold_time, flags),)
 
     @classmethod
-    def parse(cls, serialised_message):
-        generic_message = LdpGenericMessage.parse(cls.MSG_TYPE, serialised_message)
-
-        # handle common TLVs
-        common_hello = generic_message.tlvs.pop(0x0400)
-        hold_time, flags = struct.unpack("!HH", common_hello)
+    def from_tlvs(cls, message_id, mandatory_tlvs, tlvs):
+        common_hello, = mandatory_tlvs
+        hold_time, flags = unpack_tlv_value(cls.COMMON_HELLO_PARAMETERS, common_hello, "Common Hello Parameters")
         targeted = (0x8000 & flags) > 0
         request_targeted = (0x4000 & flags) > 0
 
-        return cls(generic_message.message_id, hold_time, targeted, request_targeted, generic_message.tlvs)
-
-    def pack(self):
-        combined_tlvs = OrderedDict(chain(self.build_common_tlvs().items(), self.tlvs.items()))
-
-        return LdpGenericMessage(self.MSG_TYPE, self.message_id, combined_tlvs).pack()
+        return cls(message_id, hold_time, targeted, request_targeted, tlvs)
 
     def __str__(self):
         return "LdpHelloMessage: ID: %s, Hold time: %s, Targeted: %s, Request targeted: %s, TLVs: %s" % (
@@ -184,9 +355,13 @@ class LdpHelloMessage(LdpMessage):
             self.tlvs
             )
 
-@register_parser
+@register_message
 class LdpInitialisationMessage(LdpMessage):
+    __slots__ = ("protocol_version", "keepalive_time", "flags", "path_vector_limit", "max_pdu_length", "receiver_ldp_identifier")
+
     MSG_TYPE = LdpMessage.INIT_MESSAGE
+    MANDATORY_TLVS = (0x0500,)
+    COMMON_SESSION_PARAMETERS = struct.Struct("!HHBBH6s")
 
     def __init__(self, message_id, protocol_version, keepalive_time, flags, path_vector_limit, max_pdu_length, router_id, label_space_id, tlvs):
         self.message_id = message_id
@@ -198,32 +373,20 @@ class LdpInitialisationMessage(LdpMessage):
         self.receiver_ldp_identifier = Identifier(router_id, label_space_id)
         self.tlvs = tlvs
 
-    def build_common_tlvs(self):
-        # handle common TLVs
-        common_session_parameters = struct.pack(
-            "!HHBBH6s",
+    def pack_mandatory_tlvs(self):
+        return (self.COMMON_SESSION_PARAMETERS.pack(
             self.protocol_version, self.keepalive_time, self.flags, self.path_vector_limit, self.max_pdu_length, self.receiver_ldp_identifier.pack()
-        )
-
-        return OrderedDict([(0x0500, common_session_parameters)])
+        ),)
 
     @classmethod
-    def parse(cls, serialised_message):
-        generic_message = LdpGenericMessage.parse(cls.MSG_TYPE, serialised_message)
-
-        # handle common TLVs
-        common_session_parameters = generic_message.tlvs.pop(0x0500)
-        protocol_version, keepalive_time, flags, path_vector_limit, max_pdu_length, packed_receiver_ldp_identifier = struct.unpack(
-            "!HHBBH6s", common_session_parameters
+    def from_tlvs(cls, message_id, mandatory_tlvs, tlvs):
+        common_session_parameters, = mandatory_tlvs
+        protocol_version, keepalive_time, flags, path_vector_limit, max_pdu_length, packed_receiver_ldp_identifier = unpack_tlv_value(
+            cls.COMMON_SESSION_PARAMETERS, common_session_parameters, "Common Session Parameters"
         )
         receiver_ldp_identifier = parse_identifier(packed_receiver_ldp_identifier)
 
-        return cls(generic_message.message_id, protocol_version, keepalive_time, flags, path_vector_limit, max_pdu_length, receiver_ldp_identifier.router_id, receiver_ldp_identifier.label_space_id, generic_message.tlvs)
-
-    def pack(self):
-        combined_tlvs = OrderedDict(chain(self.build_common_tlvs().items(), self.tlvs.items()))
-
-        return LdpGenericMessage(self.MSG_TYPE, self.message_id, combined_tlvs).pack()
+        return cls(message_id, protocol_version, keepalive_time, flags, path_vector_limit, max_pdu_length, receiver_ldp_identifier.router_id, receiver_ldp_identifier.label_space_id, tlvs)
 
     def __str__(self):
         return "LdpInitialisationMessage: ID: %s, Protocol version: %s, Keepalive time: %s, Flags: %s, PVLim: %s, Max PDU Length: %s, Receiver LDP ID: %s, TLVs: %s" % (
@@ -237,63 +400,99 @@ class LdpInitialisationMessage(LdpMessage):
             self.tlvs
             )
 
-def unpack_address_list_tlv(packed_addresses):
-    family = bytes_to_short(packed_addresses[:2])
+ADDRESS_FAMILY = struct.Struct("!H")
+
+def unpack_address_list_tlv_column(packed_addresses):
+    # decodes the whole list in one pass into a 32 bit array of addresses
+    if len(packed_addresses) < ADDRESS_FAMILY.size:
+        raise ParseError("Got truncated address list: %s" % bytes(packed_addresses))
+    family, = ADDRESS_FAMILY.unpack_from(packed_addresses)
     if family != 1:
-        raise Exception("Address family not supported %s" % packed_addresses)
-    body = packed_addresses[2:]
-    addresses = []
-    while body:
-        data = body[:4]
-        body = body[4:]
-        addresses.append(IPv4Address(data))
+        raise ParseError("Address family not supported %s" % bytes(packed_addresses))
+    body = memoryview(packed_addresses)[ADDRESS_FAMILY.size:]
+    if len(body) % 4:
+        raise ParseError("Address list length %d is not a multiple of 4" % len(body))
+    addresses = array(UINT32)
+    addresses.frombytes(body)
+    if sys.byteorder == "little":
+        addresses.byteswap()
     return addresses
 
-def pack_address_list_tlv(addresses):
+def pack_address_list_tlv_column(addresses):
     # assume IPv4
-    data_chunks = []
-    data_chunks.append(short_to_bytes(1))
-    for address in addresses:
-        data_chunks.append(integer_to_bytes(int(address)))
-    return b''.join(data_chunks)
+    addresses = array(UINT32, addresses)
+    if sys.byteorder == "little":
+        addresses.byteswap()
+    return ADDRESS_FAMILY.pack(1) + addresses.tobytes()
+
+def unpack_address_list_tlv(packed_addresses):
+    return [IPv4Address(address) for address in unpack_address_list_tlv_column(packed_addresses)]
+
+def pack_address_list_tlv(addresses):
+    return pack_address_list_tlv_column([int(address) for address in addresses])
 
-@register_parser
+@register_message
 class LdpAddressMessage(LdpMessage):
+    __slots__ = ("_addresses", "_address_column")
+
     MSG_TYPE = LdpMessage.ADDRESS_MESSAGE
+    MANDATORY_TLVS = (0x0101,)
 
     def __init__(self, message_id, addresses, tlvs):
         self.message_id = message_id
         self.addresses = addresses
         self.tlvs = tlvs
 
-    def build_common_tlvs(self):
-        return OrderedDict([
-            (0x0101, pack_address_list_tlv(self.addresses))
-        ])
-
     @classmethod
-    def parse(cls, serialised_message):
-        generic_message = LdpGenericMessage.parse(cls.MSG_TYPE, serialised_message)
-
-        # handle common TLVs
-        packed_addresses = generic_message.tlvs.pop(0x0101)
-        addresses = unpack_address_list_tlv(packed_addresses)
-
-        return cls(generic_message.message_id, addresses, generic_message.tlvs)
+    def from_address_column(cls, message_id, address_column, tlvs):
+        message = cls(message_id, None, tlvs)
+        message._address_column = address_column
+        return message
+
+    @property
+    def addresses(self):
+        # IPv4Address objects are only built if someone asks for them
+        if self._addresses is None:
+            self._addresses = [IPv4Address(address) for address in self._address_column]
+        return self._addresses
+
+    @addresses.setter
+    def addresses(self, addresses):
+        self._addresses = addresses
+        self._address_column = None
+
+    @property
+    def address_column(self):
+        if self._address_column is None:
+            self._address_column = array(UINT32, [int(address) for address in self._addresses])
+        return self._address_column
+
+    def pack_mandatory_tlvs(self):
+        return (pack_address_list_tlv_column(self.address_column),)
 
-    def pack(self):
-        combined_tlvs = OrderedDict(chain(self.build_common_tlvs().items(), self.tlvs.items()))
-        return LdpGenericMessage(self.MSG_TYPE, self.message_id, combined_tlvs).pack()
+    @classmethod
+    def from_tlvs(cls, message_id, mandatory_tlvs, tlvs):
+        packed_addresses, = mandatory_tlvs
+        return cls.from_address_column(message_id, unpack_address_list_tlv_column(packed_addresses), tlvs)
 
     def __str__(self):
-        return "LdpAddressMessage: ID: %s, Addresses: %s, TLVs: %s" % (
+        return "%s: ID: %s, Addresses: %s, TLVs: %s" % (
+            self.__class__.__name__,
             self.message_id,
             self.addresses,
             self.tlvs
             )
 
-@register_parser
+@register_message
+class LdpAddressWithdrawMessage(LdpAddressMessage):
+    __slots__ = ()
+
+    MSG_TYPE = LdpMessage.ADDRESS_WITHDRAW_MESSAGE
+
+@register_message
 class LdpKeepaliveMessage(LdpMessage):
+    __slots__ = ()
+
     MSG_TYPE = LdpMessage.KEEPALIVE_MESSAGE
 
     def __init__(self, message_id, tlvs):
@@ -301,12 +500,8 @@ class LdpKeepaliveMessage(LdpMessage):
         self.tlvs = tlvs
 
     @classmethod
-    def parse(cls, serialised_message):
-        generic_message = LdpGenericMessage.parse(cls.MSG_TYPE, serialised_message)
-        return cls(generic_message.message_id, generic_message.tlvs)
-
-    def pack(self):
-        return LdpGenericMessage(self.MSG_TYPE, self.message_id, self.tlvs).pack()
+    def from_tlvs(cls, message_id, mandatory_tlvs, tlvs):
+        return cls(message_id, tlvs)
 
     def __str__(self):
         return "LdpKeepaliveMessage: ID: %s, TLVs: %s" % (
@@ -323,44 +518,81 @@ def prefix_byte_length(prefix_length):
 
     return byte_length
 
+PREFIX_FEC_HEADER = struct.Struct("!BHB")
+PREFIX_MASKS = [(0xFFFFFFFF << (32 - prefix_length)) & 0xFFFFFFFF for prefix_length in range(33)]
+
 def pack_prefix(prefix):
     return prefix.network_address.packed[:prefix_byte_length(prefix.prefixlen)]
 
 def pack_fec(prefix):
-    return struct.pack("!BHB", 2, 1, prefix.prefixlen) + pack_prefix(prefix)
+    return PREFIX_FEC_HEADER.pack(2, 1, prefix.prefixlen) + pack_prefix(prefix)
 
 def unpack_fec(fec):
-    fec_type, address_type, prefix_length = struct.unpack("!BHB", fec[:4])
+    networks, prefix_lengths = unpack_fec_tlv_columns(fec, single=True)
+    return IPv4Network((networks[0], prefix_lengths[0]))
+
+def unpack_fec_tlv_columns(packed_fecs, single=False):
+    # walks the TLV once and returns the prefixes as two columns:
+    # 32 bit array of network addresses and array('B') of prefix lengths
+    networks = array(UINT32)
+    prefix_lengths = array('B')
+    packed_fecs = memoryview(packed_fecs)
+    offset = 0
+    end = len(packed_fecs)
+
+    while offset < end:
+        if offset + PREFIX_FEC_HEADER.size > end:
+            raise ParseError("Got truncated FEC element at offset %d" % offset)
+        fec_type, address_type, prefix_length = PREFIX_FEC_HEADER.unpack_from(packed_fecs, offset)
+        if fec_type != 2:
+            raise ParseError("Got bad FEC type: %s" % fec_type)
+        if address_type != 1:
+            raise ParseError("Got bad address type: %s" % address_type)
+        if prefix_length > 32:
+            raise ParseError("Got bad prefix length: %s" % prefix_length)
+
+        offset += PREFIX_FEC_HEADER.size
+        byte_length = prefix_byte_length(prefix_length)
+        if offset + byte_length > end:
+            raise ParseError("Got truncated prefix at offset %d" % offset)
+        network = int.from_bytes(packed_fecs[offset:offset+byte_length], "big") << (32 - 8 * byte_length)
+        networks.append(network & PREFIX_MASKS[prefix_length])
+        prefix_lengths.append(prefix_length)
+        offset += byte_length
+        if single:
+            break
+
+    return networks, prefix_lengths
+
+def pack_fec_tlv_columns(networks, prefix_lengths):
+    # assume IPv4
+    data = bytearray()
+    for network, prefix_length in zip(networks, prefix_lengths):
+        data += PREFIX_FEC_HEADER.pack(2, 1, prefix_length)
+        data += network.to_bytes(4, "big")[:prefix_byte_length(prefix_length)]
+    return bytes(data)
 
-    if fec_type != 2:
-        raise Exception("Got bad FEC type: %s" % fec_type)
-    if address_type != 1:
-        raise Exception("Got bad address type: %s" % address_type)
+def fec_columns_from_prefixes(prefixes):
+    networks = array(UINT32, [int(prefix.network_address) for prefix in prefixes])
+    prefix_lengths = array('B', [prefix.prefixlen for prefix in prefixes])
+    return networks, prefix_lengths
 
-    squashed_prefix = fec[4:4+prefix_byte_length(prefix_length)]
-    prefix = squashed_prefix + (b'\x00' * (4 - len(squashed_prefix)))
-    return IPv4Network(prefix).supernet(new_prefix=prefix_length)
+def prefixes_from_fec_columns(networks, prefix_lengths):
+    return [IPv4Network((network, prefix_length)) for network, prefix_length in zip(networks, prefix_lengths)]
 
 def unpack_fec_tlv(packed_fecs):
-    prefixes = []
-
-    while packed_fecs:
-        prefix = unpack_fec(packed_fecs)
-        packed_fecs = packed_fecs[4+prefix_byte_length(prefix.prefixlen):]
-        prefixes.append(prefix)
-
-    return prefixes
+    return prefixes_from_fec_columns(*unpack_fec_tlv_columns(packed_fecs))
 
 def pack_fec_tlv(prefixes):
-    # assume IPv4
-    data_chunks = []
-    for prefix in prefixes:
-        data_chunks.append(pack_fec(prefix))
-    return b''.join(data_chunks)
+    return pack_fec_tlv_columns(*fec_columns_from_prefixes(prefixes))
 
-@register_parser
+@register_message
 class LdpLabelMappingMessage(LdpMessage):
+    __slots__ = ("_prefixes", "_fec_columns", "label")
+
     MSG_TYPE = LdpMessage.LABEL_MAPPING_MESSAGE
+    MANDATORY_TLVS = (0x0100, 0x0200)
+    GENERIC_LABEL = struct.Struct("!I")
 
     def __init__(self, message_id, prefixes, label, tlvs):
         self.message_id = message_id
@@ -368,32 +600,43 @@ class LdpLabelMappingMessage(LdpMessage):
         self.label = label
         self.tlvs = tlvs
 
-    def build_common_tlvs(self):
-        # handle common TLVs
-        fecs = pack_fec_tlv(self.prefixes)
-        packed_label = integer_to_bytes(self.label)
-        return OrderedDict([
-            (0x0100, fecs),
-            (0x0200, packed_label)
-        ])
-
     @classmethod
-    def parse(cls, serialised_message):
-        generic_message = LdpGenericMessage.parse(cls.MSG_TYPE, serialised_message)
-
-        # handle common TLVs
-        fecs = generic_message.tlvs.pop(0x0100)
-        packed_label = generic_message.tlvs.pop(0x0200)
-        label = bytes_to_integer(packed_label)
-
-        prefixes = unpack_fec_tlv(fecs)
-
-        return cls(generic_message.message_id, prefixes, label, generic_message.tlvs)
+    def from_fec_columns(cls, message_id, networks, prefix_lengths, label, tlvs):
+        message = cls(message_id, None, label, tlvs)
+        message._fec_columns = (networks, prefix_lengths)
+        return message
+
+    @property
+    def prefixes(self):
+        # IPv4Network objects are only built if someone asks for them
+        if self._prefixes is None:
+            self._prefixes = prefixes_from_fec_columns(*self._fec_columns)
+        return self._prefixes
+
+    @prefixes.setter
+    def prefixes(self, prefixes):
+        self._prefixes = prefixes
+        self._fec_columns = None
+
+    @property
+    def fec_columns(self):
+        if self._fec_columns is None:
+            self._fec_columns = fec_columns_from_prefixes(self._prefixes)
+        return self._fec_columns
+
+    def pack_mandatory_tlvs(self):
+        return (
+            pack_fec_tlv_columns(*self.fec_columns),
+            self.GENERIC_LABEL.pack(self.label)
+        )
 
-    def pack(self):
-        combined_tlvs = OrderedDict(chain(self.build_common_tlvs().items(), self.tlvs.items()))
+    @classmethod
+    def from_tlvs(cls, message_id, mandatory_tlvs, tlvs):
+        fecs, packed_label = mandatory_tlvs
+        label, = unpack_tlv_value(cls.GENERIC_LABEL, packed_label, "Generic Label")
+        networks, prefix_lengths = unpack_fec_tlv_columns(fecs)
 
-        return LdpGenericMessage(self.MSG_TYPE, self.message_id, combined_tlvs).pack()
+        return cls.from_fec_columns(message_id, networks, prefix_lengths, label, tlvs)
 
     def __str__(self):
         return "LdpLabelMappingMessage: ID: %s, Prefixes: %s, Label: %s, TLVs: %s" % (
@@ -1,15 +1,18 @@
 import struct
 import socket
 from .packing_tools import bytes_to_short, bytes_to_integer
-from .chopper import Chopper
+from .chopper import BufferChopper
 from .ldp_message import LdpMessageParser
 from .identifier import Identifier, parse_identifier
-from io import BytesIO
+from .error import ParseError
 
-def parse_messages(serialised_messages):
-    parser = LdpMessageParser()
+PDU_HEADER = struct.Struct("!HH")
+PDU_HEADER_WITH_IDENTIFIER = struct.Struct("!HH4sH")
+
+def parse_messages(serialised_messages, lazy=False):
+    parser = LdpMessageParser(lazy=lazy)
     messages = []
-    for serialised_message in Chopper(4, 2, 0, BytesIO(serialised_messages)):
+    for serialised_message in BufferChopper(4, 2, 0, serialised_messages):
         message = parser.parse(serialised_message)
         messages.append(message)
 
@@ -19,8 +22,10 @@ def pack_messages(messages):
     return b"".join(messages)
 
 class LdpPdu(object):
+    __slots__ = ("version", "lsr_id", "label_space_id", "messages")
+
     HEADER_LENGTH = 10
-    
+
     def __init__(self, version, lsr_id, label_space_id, messages):
         self.version = version
         self.lsr_id = lsr_id
@@ -30,8 +35,7 @@ class LdpPdu(object):
     def pack(self):
         packed_pdu_body = Identifier(self.lsr_id, self.label_space_id).pack() + pack_messages(self.messages)
         pdu_length = len(packed_pdu_body)
-        packed_pdu_header = struct.pack(
-            "!HH",
+        packed_pdu_header = PDU_HEADER.pack(
             self.version,
             pdu_length,
         )
@@ -46,9 +50,85 @@ class LdpPdu(object):
             self.label_space_id),
             [str(x) for x in self.messages])
 
-def parse_ldp_pdu(serialised_pdu):
-    version, pdu_length, packed_identifier = struct.unpack("!HH6s", serialised_pdu[:LdpPdu.HEADER_LENGTH])
-    identifier = parse_identifier(packed_identifier)
-    serialised_messages = serialised_pdu[LdpPdu.HEADER_LENGTH:]
-    messages = parse_messages(serialised_messages)
-    return LdpPdu(version, identifier.router_id, identifier.label_space_id, messages)
+class LdpPduBuilder(object):
+    """Packs outbound messages into as few PDUs as the max PDU length allows
+
+    Messages are added already packed. When the next message won't fit in
+    the open PDU, that PDU is closed and a new one started. The closed PDUs
+    are kept as a list of buffers and written out together by flush(), so a
+    batch of replies costs one send instead of one per message.
+    """
+
+    DEFAULT_MAX_PDU_LENGTH = 4096
+    DEFAULT_FLUSH_THRESHOLD = 65536
+
+    def __init__(self, lsr_id, label_space_id, max_pdu_length=0, flush_threshold=DEFAULT_FLUSH_THRESHOLD, version=1):
+        self.version = version
+        self.packed_identifier = Identifier(lsr_id, label_space_id).pack()
+        self.max_pdu_length = max_pdu_length
+        self.flush_threshold = flush_threshold
+        self.chunks = []
+        self.pending_bytes = 0
+        self.pdu_count = 0
+        self.open_messages = []
+        self.open_length = 0
+
+    @property
+    def max_pdu_length(self):
+        return self._max_pdu_length
+
+    @max_pdu_length.setter
+    def max_pdu_length(self, max_pdu_length):
+        # 0 means the default, as it does in the Initialization message
+        self._max_pdu_length = max_pdu_length or self.DEFAULT_MAX_PDU_LENGTH
+
+    def add(self, packed_message):
+        # returns True once enough is queued that the caller should flush
+        # (the PDU length field counts the identifier but not the version and length)
+        open_pdu_length = len(self.packed_identifier) + self.open_length
+        if self.open_messages and open_pdu_length + len(packed_message) > self._max_pdu_length:
+            self.close_pdu()
+        self.open_messages.append(packed_message)
+        self.open_length += len(packed_message)
+        return self.queued_bytes >= self.flush_threshold
+
+    @property
+    def queued_bytes(self):
+        if not self.open_messages:
+            return self.pending_bytes
+        return self.pending_bytes + PDU_HEADER.size + len(self.packed_identifier) + self.open_length
+
+    def close_pdu(self):
+        if not self.open_messages:
+            return
+        pdu_length = len(self.packed_identifier) + self.open_length
+        self.chunks.append(PDU_HEADER.pack(self.version, pdu_length))
+        self.chunks.append(self.packed_identifier)
+        self.chunks.extend(self.open_messages)
+        self.pending_bytes += PDU_HEADER.size + pdu_length
+        self.pdu_count += 1
+        self.open_messages = []
+        self.open_length = 0
+
+    def take(self):
+        # closes the open PDU and hands back everything queued as one buffer
+        self.close_pdu()
+        data = b"".join(self.chunks)
+        self.chunks = []
+        self.pending_bytes = 0
+        self.pdu_count = 0
+        return data
+
+    def flush(self, socket):
+        data = self.take()
+        if data:
+            socket.sendall(data)
+        return len(data)
+
+def parse_ldp_pdu(serialised_pdu, lazy=False):
+    serialised_pdu = memoryview(serialised_pdu)
+    if len(serialised_pdu) < LdpPdu.HEADER_LENGTH:
+        raise ParseError("Got truncated PDU of %d bytes" % len(serialised_pdu))
+    version, pdu_length, packed_lsr_id, label_space_id = PDU_HEADER_WITH_IDENTIFIER.unpack_from(serialised_pdu)
+    messages = parse_messages(serialised_pdu[LdpPdu.HEADER_LENGTH:], lazy)
+    return LdpPdu(version, socket.inet_ntoa(packed_lsr_id), label_space_id, messages)
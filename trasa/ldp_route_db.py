@@ -1,9 +1,110 @@
+from array import array
+from ipaddress import IPv4Network
+
+from .binding_store import BindingStore
+
 class LdpRouteDb(object):
+    """Label Information Base: the label bindings we know about, per FEC and per peer
+
+    A binding is a (FEC, peer, label) triple, where the FEC is an IPv4 prefix
+    given as an int network and a prefix length. Bindings are kept in a
+    BindingStore, columns of arrays chained per FEC and per peer, so a full
+    table from one peer costs a few tens of bytes a binding, a FEC's
+    bindings are found in O(1) and a peer's are withdrawn in O(k). Peers
+    are interned to small ints in the order we first hear from them.
+
+    Routes we originate ourselves are bindings from LOCAL_PEER. The older
+    add_route()/remove_route()/routes interface works on those.
+    """
+
+    LOCAL_PEER = "0.0.0.0"
+
     def __init__(self):
-        self.routes = set()
+        self.peer_indexes = {}
+        self.peer_lsr_ids = []
+        self.store = BindingStore()
+
+    def __len__(self):
+        return len(self.store)
+
+    def peer_index(self, lsr_id):
+        index = self.peer_indexes.get(lsr_id)
+        if index is None:
+            index = self.peer_indexes[lsr_id] = len(self.peer_lsr_ids)
+            self.peer_lsr_ids.append(lsr_id)
+        return index
+
+    def add_binding(self, network, prefix_length, lsr_id, label):
+        # a new mapping for the same FEC from the same peer replaces the old one
+        self.store.insert(network, prefix_length, self.peer_index(lsr_id), label)
+
+    def add_bindings(self, networks, prefix_lengths, lsr_id, label):
+        # takes the FEC columns from a Label Mapping message as they are
+        self.store.insert_columns(networks, prefix_lengths, self.peer_index(lsr_id), label)
+
+    def remove_binding(self, network, prefix_length, lsr_id):
+        # returns False if there was no such binding
+        peer = self.peer_indexes.get(lsr_id)
+        if peer is None:
+            return False
+        return self.store.delete(network, prefix_length, peer)
+
+    def remove_bindings(self, networks, prefix_lengths, lsr_id):
+        # takes the FEC columns from a Label Withdraw message, returns how many bindings went
+        peer = self.peer_indexes.get(lsr_id)
+        if peer is None:
+            return 0
+        return self.store.delete_columns(networks, prefix_lengths, peer)
+
+    def withdraw_peer(self, lsr_id):
+        # drops every binding from a peer, e.g. when its session goes down, and returns how many
+        peer = self.peer_indexes.get(lsr_id)
+        if peer is None:
+            return 0
+        return self.store.delete_peer(peer)
+
+    def label_for(self, network, prefix_length, lsr_id):
+        peer = self.peer_indexes.get(lsr_id)
+        if peer is None:
+            return None
+        return self.store.label_for(network, prefix_length, peer)
+
+    def bindings_for(self, network, prefix_length):
+        # [(lsr_id, label)] for one FEC, newest first
+        peer_lsr_ids = self.peer_lsr_ids
+        return [(peer_lsr_ids[peer], label) for peer, label in self.store.fec_rows(network, prefix_length)]
+
+    def peer_bindings(self, lsr_id):
+        # (network, prefix_length, label) for every binding from one peer
+        peer = self.peer_indexes.get(lsr_id)
+        if peer is None:
+            return []
+        return self.store.peer_rows(peer)
+
+    @property
+    def fec_keys(self):
+        # the FEC (network << 8 | prefix_length) of every row in the store, free ones included
+        return array('Q', [network << 8 | prefix_length
+                           for network, prefix_length in zip(self.store.networks, self.store.prefix_lengths)])
+
+    def __iter__(self):
+        # (network, prefix_length, lsr_id, label) in prefix order
+        networks, prefix_lengths, peers, labels = self.store.snapshot()
+        rows = sorted(range(len(peers)), key=lambda row: (networks[row], prefix_lengths[row], peers[row]))
+        for row in rows:
+            yield networks[row], prefix_lengths[row], self.peer_lsr_ids[peers[row]], labels[row]
 
     def add_route(self, route):
-        self.routes.add(route)
+        prefix, label = route
+        self.add_binding(int(prefix.network_address), prefix.prefixlen, self.LOCAL_PEER, label)
 
     def remove_route(self, route):
-        self.routes.remove(route)
+        prefix, label = route
+        if self.label_for(int(prefix.network_address), prefix.prefixlen, self.LOCAL_PEER) != label:
+            raise KeyError(route)
+        self.remove_binding(int(prefix.network_address), prefix.prefixlen, self.LOCAL_PEER)
+
+    @property
+    def routes(self):
+        return set((IPv4Network((network, prefix_length)), label)
+                   for network, prefix_length, label in self.peer_bindings(self.LOCAL_PEER))
@@ -0,0 +1,227 @@
+from .ldp_pdu import LdpPduBuilder, parse_ldp_pdu
+from .ldp_state_machine import LdpStateMachine
+from .event import EventTimerExpired
+from .framer import PduFramer
+from .send_queue import SendQueue
+from .log import get_logger, DEBUG
+from .metrics import REGISTRY
+from .error import ParseError
+from .tracing import Tracer, PduTrace, summarise_latencies
+from time import monotonic
+import struct
+
+LOGGER = get_logger("session")
+
+PDUS_RECEIVED = REGISTRY.counter("ldp_pdus_received", "LDP PDUs received over TCP")
+PDU_RECEIVED_BYTES = REGISTRY.histogram("ldp_pdu_received_bytes", "Size of LDP PDUs received over TCP")
+MESSAGES_RECEIVED = REGISTRY.counter("ldp_messages_received", "LDP messages received over TCP", ("type",))
+PDUS_SENT = REGISTRY.counter("ldp_pdus_sent", "LDP PDUs queued for sending over TCP")
+BYTES_SENT = REGISTRY.counter("ldp_bytes_sent", "Bytes of LDP PDUs queued for sending over TCP")
+MESSAGES_SENT = REGISTRY.counter("ldp_messages_sent", "LDP messages queued for sending over TCP", ("type",))
+PARSE_ERRORS = REGISTRY.counter("ldp_parse_errors", "LDP PDUs or messages that couldn't be decoded")
+PACK_ERRORS = REGISTRY.counter("ldp_pack_errors", "LDP messages that couldn't be encoded")
+# kept up to date by whichever engine drives the sessions
+SESSIONS_ACTIVE = REGISTRY.gauge("ldp_sessions_active", "LDP TCP sessions currently open")
+SEND_QUEUE_BYTES = REGISTRY.gauge("ldp_send_queue_bytes", "Bytes waiting in each session's send queue", ("local", "peer"))
+
+HOLD_TIMER = "hold"
+KEEPALIVE_TIMER = "keepalive"
+# keepalives go out every third of the keepalive time, less up to this fraction
+KEEPALIVE_JITTER = 0.1
+
+# what decoding a peer's PDUs can raise, counted as parse errors and left to the engine to close the session on
+DECODE_ERRORS = (ParseError, struct.error)
+
+class LdpSession(object):
+    """One LDP session with a peer, independent of how its socket is driven
+
+    Inbound PDUs go through the state machine, the replies are coalesced
+    into PDUs and the packed PDUs land in the session's send queue. Reading
+    the socket and draining the send queue are left to the engine.
+    """
+
+    def __init__(self, local_ip, peer_ip, peer_port, get_message_id, send_queue=None, tracer=None, route_db=None,
+                 label_manager=None):
+        self.local_ip = local_ip
+        self.peer_ip = peer_ip
+        self.peer_port = peer_port
+        self.get_message_id = get_message_id
+        self.framer = PduFramer()
+        self.state_machine = LdpStateMachine(local_ip, peer_ip, route_db, label_manager)
+        self.pdu_builder = LdpPduBuilder(local_ip, 0, self.state_machine.max_pdu_length)
+        self.send_queue = send_queue or SendQueue()
+        self.tracer = tracer or Tracer()
+        # the trace for the PDU being processed, if it was sampled
+        self.trace = None
+        self.unqueued_traces = []
+        self.queued_traces = []
+        self.stage_latencies = {}
+        self.hold_timer = None
+        self.keepalive_timer = None
+        # called when a timer takes the session down, so the engine can drop the connection
+        self.on_close = None
+
+    @property
+    def closed(self):
+        return self.state_machine.state == "NONEXISTENT"
+
+    def close(self):
+        # the connection is gone: stop the writer and forget what the peer told us
+        self.send_queue.close()
+        self.stop_timers()
+        state_machine = self.state_machine
+        if state_machine.route_db is not None and state_machine.peer_lsr_id is not None:
+            state_machine.route_db.withdraw_peer(state_machine.peer_lsr_id)
+
+    @property
+    def queue_depth(self):
+        return self.send_queue.queued_bytes
+
+    def pdus_received(self, serialised_pdus, read_at=None, decoded_pdus=None):
+        # read_at is when the engine read these off the socket, now if it doesn't say.
+        # decoded_pdus maps positions in serialised_pdus to PDUs that were already
+        # decoded elsewhere (see DecodeOffload), the rest are parsed here
+        tracer = self.tracer
+        if tracer.sample_every and read_at is None:
+            read_at = monotonic()
+        for index, serialised_pdu in enumerate(serialised_pdus):
+            if LOGGER.isEnabledFor(DEBUG):
+                LOGGER.debug("Got PDU from %s:%s", self.peer_ip, self.peer_port)
+            PDUS_RECEIVED.child.value += 1
+            PDU_RECEIVED_BYTES.child.observe(len(serialised_pdu))
+            if tracer.sample_every and tracer.sample():
+                self.trace = PduTrace("%s:%s" % (self.peer_ip, self.peer_port), len(serialised_pdu), read_at)
+                # time since the socket read: framing, any offload wait, and earlier PDUs from the same read
+                self.trace.stamp("batch")
+            try:
+                pdu = decoded_pdus.get(index) if decoded_pdus else None
+                if pdu is None:
+                    pdu = parse_ldp_pdu(serialised_pdu, lazy=True)
+                if self.trace is not None:
+                    self.trace.stamp("parse")
+                if self.state_machine.peer_lsr_id is None:
+                    # the LIB is per LSR, not per transport address
+                    self.state_machine.peer_lsr_id = pdu.lsr_id
+                for message in pdu.messages:
+                    self.message_received(message)
+            except DECODE_ERRORS:
+                PARSE_ERRORS.child.value += 1
+                raise
+            finally:
+                if self.trace is not None:
+                    self.unqueued_traces.append(self.trace)
+                    self.trace = None
+            if self.closed:
+                break
+        # replies to everything in this batch go out together
+        self.queue_pdus()
+        if self.hold_timer is not None and not self.closed:
+            self.peer_heard()
+
+    def queue_pdus(self):
+        self.pdu_builder.close_pdu()
+        pdu_count = self.pdu_builder.pdu_count
+        data = self.pdu_builder.take()
+        # traces are queued first, as an asyncio writer takes the data inside put()
+        if self.unqueued_traces:
+            for trace in self.unqueued_traces:
+                trace.stamp("queue")
+                if not data:
+                    # nothing to send, so the trace ends here
+                    self.tracer.finish(trace, self.stage_latencies)
+            if data:
+                self.queued_traces.extend(self.unqueued_traces)
+            self.unqueued_traces = []
+        if data:
+            PDUS_SENT.child.value += pdu_count
+            BYTES_SENT.child.value += len(data)
+            self.send_queue.put(data)
+
+    def take_traces(self):
+        # called by the writer straight after it takes data off the send queue,
+        # so these are the traces whose replies are in that data
+        traces = self.queued_traces
+        if traces:
+            self.queued_traces = []
+            for trace in traces:
+                trace.stamp("dequeue")
+        return traces
+
+    def traces_sent(self, traces):
+        for trace in traces:
+            trace.stamp("send")
+            self.tracer.finish(trace, self.stage_latencies)
+
+    def latency_summary(self):
+        return summarise_latencies(self.stage_latencies)
+
+    def message_received(self, message):
+        MESSAGES_RECEIVED.labels(type(message).__name__).value += 1
+        outbound_messages = self.state_machine.message_received(message)
+        if self.trace is not None:
+            self.trace.stamp("state_machine")
+        self.pdu_builder.max_pdu_length = self.state_machine.max_pdu_length
+        for outbound_message in outbound_messages:
+            self.send_message(outbound_message)
+
+    def start_timers(self, timer_wheel):
+        keepalive_time = self.state_machine.keepalive_time
+        self.hold_timer = timer_wheel.schedule(keepalive_time, self.timer_expired, (EventTimerExpired(HOLD_TIMER),))
+        self.keepalive_timer = timer_wheel.schedule_periodic(keepalive_time / 3, self.timer_expired,
+                                                             (EventTimerExpired(KEEPALIVE_TIMER),), KEEPALIVE_JITTER)
+
+    def stop_timers(self):
+        if self.hold_timer is not None:
+            self.hold_timer.cancel()
+            self.keepalive_timer.cancel()
+            self.hold_timer = self.keepalive_timer = None
+
+    def peer_heard(self):
+        # any PDU restarts the hold timer; the keepalive time may have just been negotiated down
+        keepalive_time = self.state_machine.keepalive_time
+        self.hold_timer.reschedule(keepalive_time)
+        if self.keepalive_timer.interval != keepalive_time / 3:
+            self.keepalive_timer.interval = keepalive_time / 3
+            self.keepalive_timer.reschedule(keepalive_time / 3)
+
+    def timer_expired(self, event):
+        for outbound_message in self.state_machine.timer_expired(event):
+            self.send_message(outbound_message)
+        self.queue_pdus()
+        if self.closed:
+            self.stop_timers()
+            if self.on_close is not None:
+                self.on_close()
+
+    def shutdown(self):
+        # sends the peer a Shutdown Notification and has the engine drop the connection
+        for outbound_message in self.state_machine.shutdown():
+            self.send_message(outbound_message)
+        self.queue_pdus()
+        self.stop_timers()
+        if self.on_close is not None:
+            self.on_close()
+
+    def send_message(self, message):
+        message.message_id = self.get_message_id()
+        if LOGGER.isEnabledFor(DEBUG):
+            LOGGER.debug("Sending message %s", message)
+        try:
+            packed_message = message.pack()
+        except (struct.error, ValueError, OverflowError):
+            PACK_ERRORS.child.value += 1
+            raise
+        MESSAGES_SENT.labels(type(message).__name__).value += 1
+        if self.trace is not None:
+            self.trace.stamp("pack")
+        if self.pdu_builder.add(packed_message):
+            self.queue_pdus()
+
+    def __str__(self):
+        return "LdpSession: %s -> %s:%s, state: %s, queued bytes: %s" % (
+            self.local_ip,
+            self.peer_ip,
+            self.peer_port,
+            self.state_machine.state,
+            self.queue_depth
+            )
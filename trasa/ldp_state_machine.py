@@ -3,17 +3,52 @@ from .ldp_pdu import LdpPdu
 from ipaddress import IPv4Address, IPv4Network
 from copy import copy
 from functools import reduce
+from .log import get_logger, DEBUG
+from .metrics import REGISTRY
+from .label_manager import LabelManager
+
+LOGGER = get_logger("state_machine")
+
+STATE_TRANSITIONS = REGISTRY.counter("ldp_state_transitions", "LDP session state machine transitions", ("from_state", "to_state"))
 
 class LdpStateMachine:
-    def __init__(self, local_ip, remote_ip):
+    DEFAULT_MAX_PDU_LENGTH = 4096
+    DEFAULT_KEEPALIVE_TIME = 180
+    # status codes for our Notifications
+    STATUS_SHUTDOWN = 0x0a
+    STATUS_KEEPALIVE_EXPIRED = 0x14
+
+    def __init__(self, local_ip, remote_ip, route_db=None, label_manager=None):
         self.local_ip = local_ip
         self.remote_ip = remote_ip
+        # label bindings learnt from the peer go in here, keyed by its LSR ID
+        self.route_db = route_db
+        # from the header of the PDU carrying the peer's Initialization, which the session hands us
+        self.peer_lsr_id = None
+        # where the labels we advertise come from, shared by every session so a FEC
+        # gets the same label whichever peer it goes to
+        self.label_manager = label_manager or LabelManager()
 
         self.initialised = False
-        self.state = "INITIALISED"
+        self._state = "INITIALISED"
+        # we advertise 0 (the default), so the session uses the smaller of that and the peer's value
+        self.max_pdu_length = self.DEFAULT_MAX_PDU_LENGTH
+        # likewise the smaller of ours and the peer's; the session's hold and keepalive timers follow it
+        self.keepalive_time = self.DEFAULT_KEEPALIVE_TIME
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if state != self._state:
+            STATE_TRANSITIONS.labels(self._state, state).value += 1
+        self._state = state
 
     def message_received(self, message):
-        print("Message: %s" % message)
+        if LOGGER.isEnabledFor(DEBUG):
+            LOGGER.debug("Message: %s", message)
         if self.state == "INITIALISED":
             return self.handle_message_initialised_state(message)
         if self.state == "OPENREC":
@@ -27,11 +62,16 @@ class LdpStateMachine:
         outbound_messages = []
         # simple mode - when we get an initialisation message send one back
         if isinstance(message, LdpInitialisationMessage):
+            # anything up to 255 also means the default
+            if message.max_pdu_length > 255:
+                self.max_pdu_length = min(message.max_pdu_length, self.DEFAULT_MAX_PDU_LENGTH)
+            if message.keepalive_time:
+                self.keepalive_time = min(message.keepalive_time, self.DEFAULT_KEEPALIVE_TIME)
             # send back init message
             reply_message = LdpInitialisationMessage(
                 0,
                 1,
-                180,
+                self.DEFAULT_KEEPALIVE_TIME,
                 0,
                 0,
                 0,
@@ -39,11 +79,11 @@ class LdpStateMachine:
                 0,
                 {}
             )
-            print("Replying to initialisation message with our own message: %s" % reply_message)
+            LOGGER.info("Replying to initialisation message from %s with our own message: %s", self.remote_ip, reply_message)
             outbound_messages.append(reply_message)
             self.state = "OPENREC"
         else:
-            reply_message = LdpNotificationMessage(0, 1, 0, 0x0a, message.message_id, message.MSG_TYPE, {})
+            reply_message = LdpNotificationMessage(0, 1, 0, self.STATUS_SHUTDOWN, message.message_id, message.MSG_TYPE, {})
             outbound_messages.append(reply_message)
             self.state = "NONEXISTENT"
 
@@ -66,13 +106,13 @@ class LdpStateMachine:
                     IPv4Network('10.0.0.8/30'),
                     IPv4Network('8.8.0.0/16')
                 ]
-                label = 3
 
                 address_message = LdpAddressMessage(0, addresses, tlvs)
-                label_mapping_message = LdpLabelMappingMessage(0, prefixes, label, tlvs)
-
                 outbound_messages.append(address_message)
-                outbound_messages.append(label_mapping_message)
+                # one label per FEC, so one mapping each
+                for prefix in prefixes:
+                    label = self.label_manager.label_for_fec(int(prefix.network_address), prefix.prefixlen)
+                    outbound_messages.append(LdpLabelMappingMessage(0, [prefix], label, tlvs))
                 self.initialised = True
             self.state = "OPERATIONAL"
 
@@ -83,5 +123,28 @@ class LdpStateMachine:
         if isinstance(message, LdpKeepaliveMessage):
             reply_message = copy(message)
             outbound_messages.append(reply_message)
+        elif isinstance(message, LdpLabelMappingMessage) and self.route_db is not None:
+            networks, prefix_lengths = message.fec_columns
+            self.route_db.add_bindings(networks, prefix_lengths, self.peer_lsr_id, message.label)
+
+        return outbound_messages
+
+    def shutdown(self):
+        # we're closing the session ourselves, so we tell the peer why
+        outbound_messages = []
+        if self.state != "NONEXISTENT":
+            outbound_messages.append(LdpNotificationMessage(0, 1, 0, self.STATUS_SHUTDOWN, 0, 0, {}))
+            self.state = "NONEXISTENT"
+
+        return outbound_messages
+
+    def timer_expired(self, event):
+        outbound_messages = []
+        if event.timer_name == "hold" and self.state != "NONEXISTENT":
+            LOGGER.warning("Nothing heard from %s for %ds, closing the session", self.remote_ip, self.keepalive_time)
+            outbound_messages.append(LdpNotificationMessage(0, 1, 0, self.STATUS_KEEPALIVE_EXPIRED, 0, 0, {}))
+            self.state = "NONEXISTENT"
+        elif event.timer_name == "keepalive" and self.state == "OPERATIONAL":
+            outbound_messages.append(LdpKeepaliveMessage(0, {}))
 
         return outbound_messages
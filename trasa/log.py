@@ -0,0 +1,43 @@
+import logging
+import logging.handlers
+import queue
+
+# hot paths guard their debug calls with LOGGER.isEnabledFor(DEBUG) so
+# that nothing is formatted, or even called, while debug logging is off
+DEBUG = logging.DEBUG
+
+def get_logger(subsystem):
+    return logging.getLogger("trasa.%s" % subsystem)
+
+class QueueLogging(object):
+    """Moves log output off the event loop
+
+    Records are put on an unbounded queue by a QueueHandler on the "trasa"
+    logger and written out by the real handlers on a listener thread, so a
+    slow terminal or disk can't stall the event loop.
+    """
+
+    def __init__(self, handlers, level=logging.INFO, logger_name="trasa"):
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = logging.handlers.QueueHandler(self.queue)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.logger = logging.getLogger(logger_name)
+        self.level = level
+
+    def start(self):
+        self.logger.addHandler(self.queue_handler)
+        self.logger.setLevel(self.level)
+        self.listener.start()
+
+    def stop(self):
+        self.logger.removeHandler(self.queue_handler)
+        self.listener.stop()
+
+def start_queue_logging(level=logging.INFO, handlers=None):
+    if handlers is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+        handlers = [handler]
+    queue_logging = QueueLogging(handlers, level)
+    queue_logging.start()
+    return queue_logging
@@ -0,0 +1,226 @@
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+import threading
+
+class Counter(object):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield name + "_total", "", self.value
+
+class Gauge(object):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self, name):
+        yield name, "", self.value
+
+class Histogram(object):
+    __slots__ = ("upper_bounds", "bucket_counts", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        # one extra bucket for +Inf
+        self.bucket_counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.bucket_counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name):
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self.upper_bounds, self.bucket_counts):
+            cumulative_count += bucket_count
+            yield name + "_bucket", 'le="%s"' % format_value(upper_bound), cumulative_count
+        yield name + "_bucket", 'le="+Inf"', self.count
+        yield name + "_sum", "", self.sum
+        yield name + "_count", "", self.count
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def format_labels(label_names, label_values):
+    return ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(label_names, label_values))
+
+class MetricFamily(object):
+    """A named metric, optionally split by labels
+
+    labels() returns the child metric for one set of label values and
+    caches it, so the hot path can hold on to the child and bump it
+    directly. A family without labels proxies inc()/set()/observe() to its
+    single child.
+    """
+
+    def __init__(self, name, help_text, metric_type, label_names, factory):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children = {}
+        self.callbacks = []
+        if not self.label_names:
+            self.child = self.labels()
+
+    def labels(self, *label_values):
+        child = self.children.get(label_values)
+        if child is None:
+            if len(label_values) != len(self.label_names):
+                raise ValueError("%s takes labels %s, got %s" % (self.name, self.label_names, label_values))
+            child = self.children[label_values] = self.factory()
+        return child
+
+    def remove(self, *label_values):
+        self.children.pop(label_values, None)
+
+    def add_callback(self, callback):
+        # callback() returns (label_values, value) pairs, read when the metrics are rendered
+        self.callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+    def inc(self, amount=1):
+        self.child.inc(amount)
+
+    def dec(self, amount=1):
+        self.child.dec(amount)
+
+    def set(self, value):
+        self.child.set(value)
+
+    def observe(self, value):
+        self.child.observe(value)
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.help_text),
+            "# TYPE %s %s" % (self.name, self.metric_type),
+        ]
+        for label_values, child in list(self.children.items()):
+            child_labels = format_labels(self.label_names, label_values)
+            for sample_name, sample_labels, value in child.samples(self.name):
+                labels = ",".join(x for x in (child_labels, sample_labels) if x)
+                if labels:
+                    lines.append("%s{%s} %s" % (sample_name, labels, format_value(value)))
+                else:
+                    lines.append("%s %s" % (sample_name, format_value(value)))
+        for callback in list(self.callbacks):
+            for label_values, value in callback():
+                lines.append("%s{%s} %s" % (self.name, format_labels(self.label_names, label_values), format_value(value)))
+        return lines
+
+class MetricsRegistry(object):
+    """Holds every metric family and renders them in Prometheus text format"""
+
+    DEFAULT_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+
+    def __init__(self):
+        self.families = {}
+
+    def register(self, name, help_text, metric_type, label_names, factory):
+        family = self.families.get(name)
+        if family is not None:
+            if family.metric_type != metric_type or family.label_names != tuple(label_names):
+                raise ValueError("Metric %s is already registered as a different metric" % name)
+            return family
+        family = self.families[name] = MetricFamily(name, help_text, metric_type, label_names, factory)
+        return family
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(name, help_text, "counter", label_names, Counter)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self.register(name, help_text, "gauge", label_names, Gauge)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, label_names=()):
+        upper_bounds = tuple(sorted(buckets))
+        return self.register(name, help_text, "histogram", label_names, lambda: Histogram(upper_bounds))
+
+    def render(self):
+        lines = []
+        for name in sorted(self.families):
+            lines.extend(self.families[name].render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class UnixMetricsHTTPServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # HTTP handlers expect a (host, port) client address
+        request, _ = super(UnixMetricsHTTPServer, self).get_request()
+        return request, ("local", 0)
+
+class MetricsServer(object):
+    """Serves a registry over HTTP for Prometheus to scrape
+
+    address is either a (host, port) tuple or the path of a Unix socket.
+    The server runs on its own thread, so scrapes never wait on the event
+    loop.
+    """
+
+    def __init__(self, registry, address):
+        self.registry = registry
+        self.address = address
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        if isinstance(self.address, str):
+            self.server = UnixMetricsHTTPServer(self.address, MetricsRequestHandler)
+        else:
+            self.server = ThreadingHTTPServer(self.address, MetricsRequestHandler)
+            self.server.daemon_threads = True
+        self.server.registry = self.registry
+        self.thread = threading.Thread(target=self.server.serve_forever, name="trasa-metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+def parse_metrics_address(address_string):
+    # "host:port" for TCP, anything starting with / for a Unix socket
+    if address_string.startswith("/"):
+        return address_string
+    host, port = address_string.rsplit(":", 1)
+    return (host.strip("[]"), int(port))
@@ -1,49 +1,157 @@
-from eventlet.green import socket
+import errno
 import select
+import socket
+import struct
 
-class MulticastSocket:
-    def __init__(self, multicast_group, port, listen_ip):
+from .error import SocketClosedError
+from .log import get_logger
+
+LOGGER = get_logger("multicast_socket")
+
+# not every Python exposes it, this is Linux's value
+IP_PKTINFO = getattr(socket, "IP_PKTINFO", 8)
+# struct in_pktinfo: interface index, local address, header destination address
+PKTINFO = struct.Struct("=i4s4s")
+
+MAX_DATAGRAM = 65535
+# datagrams read per drain(), so a flood can't starve everything else
+MAX_BATCH = 64
+
+class Datagram(object):
+    """Where a received datagram came from and went to"""
+
+    __slots__ = ("source", "interface", "local_address", "destination")
+
+    def __init__(self, source, interface, local_address, destination):
+        # (address, port) it came from
+        self.source = source
+        # name of the interface it came in on, None without IP_PKTINFO
+        self.interface = interface
+        # our address on that interface, and the address it was sent to
+        self.local_address = local_address
+        self.destination = destination
+
+class MulticastSocket(object):
+    """A non-blocking UDP socket joined to a multicast group on one or more interfaces
+
+    Nothing here blocks or waits: the engine waits for the socket to be
+    readable (a trampoline on eventlet, add_reader() on asyncio) and then
+    calls drain(), which reads every queued datagram, up to MAX_BATCH, into
+    one preallocated buffer. IP_PKTINFO tells us which interface each
+    datagram came in on and which of our addresses that is, so a single
+    socket can serve several interfaces.
+    """
+
+    def __init__(self, multicast_group, port, listen_ips):
         self.multicast_group = multicast_group
         self.port = port
-        self.listen_ip = listen_ip
+        # one address or a list of them, each on the interface to join the group on
+        self.listen_ips = [listen_ips] if isinstance(listen_ips, str) else list(listen_ips)
         self.socket = None
         self.poller = None
+        self.pktinfo = False
+        self.buffer = bytearray(MAX_DATAGRAM)
+        self.view = memoryview(self.buffer)
+        self.interface_names = {}
 
     def bind(self):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.socket.bind((self.multicast_group, self.port))
-        self.socket.setsockopt(
-            socket.SOL_IP, socket.IP_ADD_MEMBERSHIP,
-            socket.inet_aton(self.multicast_group) + socket.inet_aton(self.listen_ip)
-        )
+        for listen_ip in self.listen_ips:
+            self.join(listen_ip)
+        try:
+            self.socket.setsockopt(socket.IPPROTO_IP, IP_PKTINFO, 1)
+            self.pktinfo = True
+        except OSError as e:
+            LOGGER.warning("No IP_PKTINFO, can't tell interfaces apart: %s", e)
+        self.socket.setblocking(False)
 
+        # only ever polled with no timeout, to see why we were woken
         self.poller = select.poll()
-        self.poller.register(self.socket,
-                          select.POLLIN |
-                          select.POLLPRI |
-                          select.POLLERR |
-                          select.POLLHUP |
-                          select.POLLNVAL)
-
-    def recv(self, size, timeout):
-        events = self.poller.poll(timeout)
-        if events:
-            while events:
-                if len(events) > 1:
-                    raise Exception("Too many events returned from poller")
-                fd, event = events[0]
-                if event == select.POLLERR or event == select.POLLHUP or event == select.POLLNVAL:
-                    # should do something proper here, it's probably a dead socket or something
-                    raise Exception("Socket error")
-                if event == select.POLLIN:
-                    data, address = self.socket.recvfrom(size)
-                    return data, address # this is awful, find a better way to get the data out and return something
-        return None, None
-
-    def send(self, data):
-        address = (self.multicast_group, self.port)
-        self.socket.sendto(data, address)
+        self.poller.register(self.socket, select.POLLIN | select.POLLERR | select.POLLHUP | select.POLLNVAL)
 
-    def shutdown(self):
-        self.socket.close()
+    def join(self, listen_ip):
+        try:
+            self.socket.setsockopt(
+                socket.SOL_IP, socket.IP_ADD_MEMBERSHIP,
+                socket.inet_aton(self.multicast_group) + socket.inet_aton(listen_ip)
+            )
+        except OSError as e:
+            # another of our addresses is on the same interface, which is already in the group
+            if e.errno != errno.EADDRINUSE:
+                raise
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def interface_name(self, index):
+        name = self.interface_names.get(index)
+        if name is None:
+            try:
+                name = socket.if_indextoname(index)
+            except OSError:
+                name = str(index)
+            self.interface_names[index] = name
+        return name
+
+    def check_events(self):
+        # raises SocketClosedError if the socket's dead, and clears any pending error
+        if self.socket is None or self.socket.fileno() < 0:
+            raise SocketClosedError("Multicast socket closed")
+        for _, event in self.poller.poll(0):
+            if event & select.POLLNVAL or event & select.POLLHUP:
+                raise SocketClosedError("Multicast socket closed")
+            if event & select.POLLERR:
+                # usually an ICMP error from something we sent, reading SO_ERROR clears it
+                error = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    LOGGER.warning("Error on multicast socket: %s", errno.errorcode.get(error, error))
+
+    def drain(self, handler, limit=MAX_BATCH):
+        """Calls handler(data, datagram) for each queued datagram, up to limit reads, and returns how many reads there were
 
+        data is a memoryview of the shared buffer, only good until the handler returns.
+        """
+
+        self.check_events()
+        sock = self.socket
+        view = self.view
+        ancillary_size = socket.CMSG_SPACE(PKTINFO.size) if self.pktinfo else 0
+        count = 0
+        while count < limit:
+            try:
+                length, ancillary, _, source = sock.recvmsg_into((view,), ancillary_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                if e.errno in (errno.EBADF, errno.ENOTSOCK):
+                    raise SocketClosedError("Multicast socket closed")
+                # a queued ICMP error, which costs us nothing but a log line
+                LOGGER.warning("Error reading multicast socket: %s", e)
+                count += 1
+                continue
+            count += 1
+            interface = local_address = destination = None
+            for level, cmsg_type, cmsg_data in ancillary:
+                if level == socket.IPPROTO_IP and cmsg_type == IP_PKTINFO and len(cmsg_data) >= PKTINFO.size:
+                    index, local_address, destination = PKTINFO.unpack_from(cmsg_data)
+                    interface = self.interface_name(index)
+                    local_address = socket.inet_ntoa(local_address)
+                    destination = socket.inet_ntoa(destination)
+            handler(view[:length], Datagram(source, interface, local_address, destination))
+        return count
+
+    def send(self, data, listen_ip=None):
+        # out of the interface with listen_ip on it, or the first one we joined on
+        listen_ip = listen_ip or self.listen_ips[0]
+        try:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(listen_ip))
+            self.socket.sendto(data, (self.multicast_group, self.port))
+        except BlockingIOError:
+            # the next Hello will be along soon enough
+            LOGGER.warning("Multicast socket send buffer full, dropped a packet to %s", listen_ip)
+
+    def shutdown(self):
+        if self.socket is not None:
+            self.socket.close()
@@ -1,3 +1,4 @@
+from array import array
 import struct
 
 def bytes_to_short(bytes_):
@@ -15,3 +16,8 @@ def short_to_bytes(short):
 def integer_to_bytes(integer):
     bytes_ = struct.pack("!I", integer)
     return bytes_
+
+# array typecode for 32 bit unsigned ints, so columns can go to and from
+# network byte order with frombytes() and tobytes()
+UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+assert array(UINT32).itemsize == 4
@@ -0,0 +1,195 @@
+"""Path-compressed binary trie for longest-prefix match over IP prefixes"""
+
+class PrefixTrieNode(object): # pylint: disable=too-few-public-methods
+    """One branch point or stored prefix in a PrefixTrie
+
+    value holds the node's bits, cleared past length. prefix is None for a
+    branch point that has nothing stored at it.
+    """
+
+    __slots__ = ("value", "length", "zero", "one", "prefix", "item")
+
+    def __init__(self, value, length):
+        self.value = value
+        self.length = length
+        self.zero = None
+        self.one = None
+        self.prefix = None
+        self.item = None
+
+def common_length(value, other_value, length, bit_length):
+    """Number of leading bits two values share, up to length"""
+
+    difference = value ^ other_value
+    if not difference:
+        return length
+    return min(bit_length - difference.bit_length(), length)
+
+class PrefixTrie(object):
+    """Maps IP4Prefix and IP6Prefix keys to items, with longest-prefix match
+
+    A Patricia trie per address family: a node only exists where a prefix
+    is stored or where two stored prefixes diverge, so a lookup follows at
+    most one node per stored prefix that covers it and never walks single
+    bits. Keys are stored by network(), so host bits set past the prefix
+    length are ignored. Iteration is in prefix order, IPv4 before IPv6.
+    """
+
+    def __init__(self):
+        self.roots = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, prefix):
+        node = self.find(prefix)
+        return node is not None and node.prefix is not None
+
+    def __getitem__(self, prefix):
+        node = self.find(prefix)
+        if node is None or node.prefix is None:
+            raise KeyError(prefix)
+        return node.item
+
+    def get(self, prefix, default=None):
+        """Exact match, or default if the prefix isn't stored"""
+
+        node = self.find(prefix)
+        if node is None or node.prefix is None:
+            return default
+        return node.item
+
+    def __setitem__(self, prefix, item):
+        prefix = prefix.network()
+        bit_length = prefix.BIT_LENGTH
+        value, length = prefix.value, prefix.length
+        node = self.roots.get(prefix.INET_TYPE)
+        if node is None:
+            node = self.roots[prefix.INET_TYPE] = PrefixTrieNode(0, 0)
+        while node.length < length:
+            bit = value >> (bit_length - node.length - 1) & 1
+            child = node.one if bit else node.zero
+            if child is None:
+                child = PrefixTrieNode(value, length)
+                self.set_child(node, bit, child)
+                node = child
+                break
+            common = common_length(value, child.value, min(length, child.length), bit_length)
+            if common == child.length:
+                node = child
+                continue
+            # the new prefix sits above the child, or they diverge part way down it
+            branch = PrefixTrieNode(value >> (bit_length - common) << (bit_length - common), common)
+            self.set_child(branch, child.value >> (bit_length - common - 1) & 1, child)
+            self.set_child(node, bit, branch)
+            if common == length:
+                node = branch
+            else:
+                node = PrefixTrieNode(value, length)
+                self.set_child(branch, value >> (bit_length - common - 1) & 1, node)
+            break
+        if node.prefix is None:
+            self.size += 1
+        node.prefix = prefix
+        node.item = item
+
+    def __delitem__(self, prefix):
+        prefix = prefix.network()
+        path = self.path_to(prefix)
+        if not path or path[-1].length != prefix.length or path[-1].prefix is None:
+            raise KeyError(prefix)
+        node = path[-1]
+        node.prefix = None
+        node.item = None
+        self.size -= 1
+        # drop branch points that no longer join two subtrees, the root stays
+        while len(path) > 1:
+            node = path.pop()
+            if node.prefix is not None or (node.zero is not None and node.one is not None):
+                break
+            parent = path[-1]
+            self.set_child(parent, node.value >> (prefix.BIT_LENGTH - parent.length - 1) & 1, node.zero or node.one)
+
+    @staticmethod
+    def set_child(node, bit, child):
+        if bit:
+            node.one = child
+        else:
+            node.zero = child
+
+    def path_to(self, key):
+        """Nodes from the root down to the deepest one covering key"""
+
+        bit_length = key.BIT_LENGTH
+        value = key.value
+        length = getattr(key, "length", bit_length)
+        path = []
+        node = self.roots.get(key.INET_TYPE)
+        while node is not None and node.length <= length:
+            shift = bit_length - node.length
+            if value >> shift != node.value >> shift:
+                break
+            path.append(node)
+            if node.length == bit_length:
+                break
+            node = node.one if value >> (shift - 1) & 1 else node.zero
+        return path
+
+    def find(self, prefix):
+        prefix = prefix.network()
+        path = self.path_to(prefix)
+        if path and path[-1].length == prefix.length:
+            return path[-1]
+        return None
+
+    def longest_match(self, key):
+        """(prefix, item) for the longest stored prefix covering an address or prefix, or None"""
+
+        for node in reversed(self.path_to(key)):
+            if node.prefix is not None:
+                return node.prefix, node.item
+        return None
+
+    def covering(self, key):
+        """[(prefix, item)] for every stored prefix covering an address or prefix, shortest first"""
+
+        return [(node.prefix, node.item) for node in self.path_to(key) if node.prefix is not None]
+
+    def subtree(self, prefix):
+        """(prefix, item) for every stored prefix within prefix, itself included, in prefix order"""
+
+        prefix = prefix.network()
+        bit_length = prefix.BIT_LENGTH
+        shift = bit_length - prefix.length
+        node = self.roots.get(prefix.INET_TYPE)
+        while node is not None and node.length < prefix.length:
+            if prefix.value >> (bit_length - node.length) != node.value >> (bit_length - node.length):
+                return
+            node = node.one if prefix.value >> (bit_length - node.length - 1) & 1 else node.zero
+        if node is None or node.value >> shift != prefix.value >> shift:
+            return
+        for item in self.walk(node):
+            yield item
+
+    @staticmethod
+    def walk(node):
+        # preorder with zero before one is (value, length) order
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.prefix is not None:
+                yield node.prefix, node.item
+            if node.one is not None:
+                stack.append(node.one)
+            if node.zero is not None:
+                stack.append(node.zero)
+
+    def items(self):
+        for inet_type in sorted(self.roots):
+            for item in self.walk(self.roots[inet_type]):
+                yield item
+
+    def __iter__(self):
+        for prefix, _ in self.items():
+            yield prefix
@@ -0,0 +1,80 @@
+from collections import deque
+
+class SendQueue(object):
+    """Bounded queue of outbound data for one session
+
+    Data is queued by whoever processes the session's inbound messages and
+    drained by a separate writer, so a peer with a full TCP window only
+    holds up its own writer. Bytes stay counted from put() until the writer
+    reports them sent(), so data taken but still on its way to the socket
+    counts too. Once the count reaches the high watermark the queue is
+    paused, and the session should stop reading from that peer until the
+    writer brings it back down to the low watermark.
+
+    The queue doesn't block or sleep itself. Engines get told about new data
+    and about resuming through the on_data and on_resume callbacks.
+    """
+
+    DEFAULT_HIGH_WATERMARK = 256 * 1024
+    DEFAULT_LOW_WATERMARK = 64 * 1024
+
+    def __init__(self, high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=DEFAULT_LOW_WATERMARK):
+        if low_watermark > high_watermark:
+            raise ValueError("Low watermark %d is above high watermark %d" % (low_watermark, high_watermark))
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.buffers = deque()
+        self.queued_bytes = 0
+        self.paused = False
+        self.closed = False
+        self.pause_count = 0
+        self.on_data = None
+        self.on_resume = None
+
+    def __len__(self):
+        return self.queued_bytes
+
+    def put(self, data):
+        # returns True if the queue is now paused
+        if self.closed:
+            # the writer has stopped so there's nowhere for this to go
+            return False
+        if data:
+            self.buffers.append(data)
+            self.queued_bytes += len(data)
+            if not self.paused and self.queued_bytes >= self.high_watermark:
+                self.paused = True
+                self.pause_count += 1
+            if self.on_data is not None:
+                self.on_data()
+        return self.paused
+
+    def take(self):
+        # hands back everything queued as one buffer, which still counts until it's sent()
+        if not self.buffers:
+            return b""
+        if len(self.buffers) == 1:
+            data = self.buffers.popleft()
+        else:
+            data = b"".join(self.buffers)
+            self.buffers.clear()
+        return data
+
+    def sent(self, nbytes):
+        # the writer has handed nbytes of what it took to the socket
+        self.queued_bytes -= nbytes
+        self.resume_if_drained()
+
+    def resume_if_drained(self):
+        if self.paused and self.queued_bytes <= self.low_watermark:
+            self.paused = False
+            if self.on_resume is not None:
+                self.on_resume()
+
+    def close(self):
+        # the writer finishes sending what's queued and then stops
+        self.closed = True
+        if self.on_data is not None:
+            self.on_data()
+        if self.on_resume is not None:
+            self.on_resume()
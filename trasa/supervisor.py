@@ -0,0 +1,191 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import http.client
+from time import monotonic
+
+from .log import get_logger
+from .metrics import REGISTRY
+
+LOGGER = get_logger("supervisor")
+
+# metrics about the supervisor and its worker processes, as opposed to the
+# ldp_ ones each worker exports about the protocol
+PROCESS_METRIC_PREFIX = "trasa_"
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super(UnixHTTPConnection, self).__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+def fetch_metrics(path, timeout=2.0):
+    connection = UnixHTTPConnection(path, timeout)
+    try:
+        connection.request("GET", "/metrics")
+        return connection.getresponse().read().decode("utf-8")
+    finally:
+        connection.close()
+
+def add_label(sample_line, name, value):
+    label = '%s="%s"' % (name, value)
+    brace = sample_line.find("{")
+    space = sample_line.find(" ")
+    if brace != -1 and brace < space:
+        return "%s%s,%s" % (sample_line[:brace+1], label, sample_line[brace+1:])
+    return "%s{%s}%s" % (sample_line[:space], label, sample_line[space:])
+
+def merge_metrics(rendered_by_worker):
+    # takes (worker, rendered) pairs, worker None for samples that get no label;
+    # each family has to come out in one block, so samples from every worker are
+    # grouped under the family's HELP and TYPE lines
+    families = {}
+    for worker, rendered in rendered_by_worker:
+        family = None
+        for line in rendered.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = families.setdefault(line.split(" ", 3)[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line and not line.startswith("#") and family is not None:
+                if worker is not None:
+                    line = add_label(line, "worker", worker)
+                family[1].append(line)
+    lines = []
+    for name in sorted(families):
+        header, samples = families[name]
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n" if lines else ""
+
+class Worker(object):
+    def __init__(self, index, config, metrics_path):
+        self.index = index
+        self.config = config
+        self.metrics_path = metrics_path
+        self.process = None
+        self.started_at = None
+        self.restart_delay = 0
+        self.restart_at = None
+
+def run_worker(target, config):
+    # a new process group, so a Ctrl-C at the terminal only reaches the
+    # supervisor, which passes it on once
+    os.setpgrp()
+    target(config)
+
+class Supervisor(object):
+    """Runs one worker process per config and keeps them running
+
+    Each worker gets its own config, with a Unix socket metrics_address
+    under a private directory. The supervisor scrapes those sockets and
+    serves every worker's metrics together, labelled by worker, from its
+    own render(), along with its own metrics about the workers, which are
+    named with PROCESS_METRIC_PREFIX. SIGINT is passed on to the workers.
+    A worker that exits before shutdown is restarted, and one that keeps
+    dying waits longer between restarts.
+    """
+
+    POLL_INTERVAL = 0.5
+    MIN_RESTART_DELAY = 1.0
+    MAX_RESTART_DELAY = 30.0
+    # a worker that stayed up this long gets its restart delay reset
+    STABLE_TIME = 60.0
+    SHUTDOWN_TIMEOUT = 10.0
+
+    def __init__(self, target, worker_configs, context=None):
+        self.target = target
+        self.context = context or multiprocessing.get_context("spawn")
+        self.metrics_dir = tempfile.mkdtemp(prefix="trasa-")
+        self.workers = []
+        for index, config in enumerate(worker_configs):
+            metrics_path = os.path.join(self.metrics_dir, "worker-%d.sock" % index)
+            config = dict(config, metrics_address=metrics_path)
+            self.workers.append(Worker(index, config, metrics_path))
+        self.running = False
+        # registered here rather than at import, as workers import this module too
+        self.worker_restarts = REGISTRY.counter(PROCESS_METRIC_PREFIX + "worker_restarts", "Worker processes restarted after exiting", ("worker",))
+        self.workers_running = REGISTRY.gauge(PROCESS_METRIC_PREFIX + "workers_running", "Worker processes currently running")
+
+    def start_worker(self, worker):
+        if os.path.exists(worker.metrics_path):
+            # left behind by a worker that crashed
+            os.unlink(worker.metrics_path)
+        worker.process = self.context.Process(target=run_worker, args=(self.target, worker.config),
+                                              name="trasa-worker-%d" % worker.index)
+        worker.process.start()
+        worker.started_at = monotonic()
+        worker.restart_at = None
+        self.workers_running.inc()
+        LOGGER.info("Started worker %d as pid %d", worker.index, worker.process.pid)
+
+    def run(self):
+        self.running = True
+        try:
+            for worker in self.workers:
+                self.start_worker(worker)
+            while self.running:
+                self.poll()
+        finally:
+            self.stop_workers()
+            # the workers' metrics sockets went in here
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def poll(self):
+        sentinels = [worker.process.sentinel for worker in self.workers if worker.restart_at is None]
+        multiprocessing.connection.wait(sentinels, self.POLL_INTERVAL)
+        now = monotonic()
+        for worker in self.workers:
+            if not self.running:
+                return
+            if worker.restart_at is None and worker.process.exitcode is not None:
+                self.worker_exited(worker, now)
+            if worker.restart_at is not None and now >= worker.restart_at:
+                self.worker_restarts.labels(str(worker.index)).inc()
+                self.start_worker(worker)
+
+    def worker_exited(self, worker, now):
+        worker.process.join()
+        self.workers_running.dec()
+        if now - worker.started_at >= self.STABLE_TIME:
+            worker.restart_delay = self.MIN_RESTART_DELAY
+        else:
+            worker.restart_delay = min(max(worker.restart_delay * 2, self.MIN_RESTART_DELAY), self.MAX_RESTART_DELAY)
+        worker.restart_at = now + worker.restart_delay
+        LOGGER.warning("Worker %d exited with %s, restarting in %.1fs", worker.index, worker.process.exitcode, worker.restart_delay)
+
+    def shutdown(self):
+        # safe to call from a signal handler: run() stops the workers once its poll returns
+        self.running = False
+
+    def stop_workers(self):
+        live_workers = [worker for worker in self.workers if worker.restart_at is None and worker.process.is_alive()]
+        for worker in live_workers:
+            os.kill(worker.process.pid, signal.SIGINT)
+        deadline = monotonic() + self.SHUTDOWN_TIMEOUT
+        for worker in live_workers:
+            worker.process.join(max(deadline - monotonic(), 0))
+            if worker.process.is_alive():
+                LOGGER.warning("Worker %d didn't stop in time, terminating it", worker.index)
+                worker.process.terminate()
+                worker.process.join()
+        self.workers_running.set(0)
+
+    def render(self):
+        rendered_by_worker = [(None, REGISTRY.render())]
+        for worker in self.workers:
+            if worker.restart_at is not None:
+                continue
+            try:
+                rendered_by_worker.append((worker.index, fetch_metrics(worker.metrics_path)))
+            except OSError as e:
+                LOGGER.debug("Couldn't scrape worker %d: %s", worker.index, e)
+        return merge_metrics(rendered_by_worker)
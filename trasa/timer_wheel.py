@@ -0,0 +1,162 @@
+from random import Random
+from time import monotonic
+
+from .log import get_logger
+
+LOGGER = get_logger("timer_wheel")
+
+# 64 slots a level, 4 levels: at the default 100ms tick that's 6.4s, 6.8min,
+# 7.3h then 19.4 days, and longer delays are cut down to that
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+WHEEL_LEVELS = 4
+MAX_TICKS = (1 << (WHEEL_BITS * WHEEL_LEVELS)) - 1
+
+class Timer(object):
+    """One scheduled callback, from TimerWheel.schedule()/schedule_periodic()"""
+
+    __slots__ = ("wheel", "callback", "args", "interval", "jitter", "expires", "bucket")
+
+    def __init__(self, wheel, callback, args, interval, jitter):
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        # seconds between firings for a periodic timer, None for a one shot
+        self.interval = interval
+        self.jitter = jitter
+        # the tick it's due on
+        self.expires = None
+        # the wheel slot it's in, None once it's fired or been cancelled
+        self.bucket = None
+
+    @property
+    def active(self):
+        return self.bucket is not None
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+    def reschedule(self, delay):
+        self.wheel.reschedule(self, delay)
+
+class TimerWheel(object):
+    """Hierarchical timing wheel (Varghese and Lauck) for many coarse timers
+
+    Time moves in ticks of resolution seconds. Level 0 has a slot per tick
+    for the next 64 ticks, level 1 a slot per 64 ticks and so on. A timer
+    goes in the slot for its expiry at the lowest level that reaches that
+    far, and as the wheel turns, each higher level slot is cascaded down
+    into the level below when its time comes round. Slots are sets, so
+    schedule, cancel and reschedule are all O(1), and advance() costs O(1)
+    per tick plus the timers it moves or fires. Tens of thousands of
+    sessions and adjacencies can share one wheel driven by a single
+    thread or loop callback calling advance().
+
+    Periodic timers can be jittered: each period is shortened by up to
+    jitter times the interval, so timers started together drift apart.
+    """
+
+    DEFAULT_RESOLUTION = 0.1
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, clock=monotonic, random=None):
+        self.resolution = resolution
+        self.clock = clock
+        self.random = random or Random()
+        self.started_at = clock()
+        self.current_tick = 0
+        self.levels = [[set() for _ in range(WHEEL_SIZE)] for _ in range(WHEEL_LEVELS)]
+        self.timer_count = 0
+
+    def __len__(self):
+        return self.timer_count
+
+    def ticks_until(self, delay):
+        # never due on a tick that's already been run
+        ticks = int((self.clock() - self.started_at + delay) / self.resolution) + 1 - self.current_tick
+        return min(max(ticks, 1), MAX_TICKS)
+
+    def period(self, timer):
+        interval = timer.interval
+        if timer.jitter:
+            interval -= interval * timer.jitter * self.random.random()
+        return interval
+
+    def schedule(self, delay, callback, args=()):
+        """Calls callback(*args) in delay seconds"""
+
+        timer = Timer(self, callback, args, None, 0)
+        self.insert(timer, self.current_tick + self.ticks_until(delay))
+        return timer
+
+    def schedule_periodic(self, interval, callback, args=(), jitter=0, first_delay=None):
+        """Calls callback(*args) every interval seconds, starting after first_delay (one jittered interval by default)"""
+
+        timer = Timer(self, callback, args, interval, jitter)
+        delay = self.period(timer) if first_delay is None else first_delay
+        self.insert(timer, self.current_tick + self.ticks_until(delay))
+        return timer
+
+    def cancel(self, timer):
+        if timer.bucket is not None:
+            timer.bucket.discard(timer)
+            timer.bucket = None
+            self.timer_count -= 1
+
+    def reschedule(self, timer, delay):
+        """Moves a timer, cancelled or fired ones included, to go off in delay seconds"""
+
+        self.cancel(timer)
+        self.insert(timer, self.current_tick + self.ticks_until(delay))
+
+    def insert(self, timer, expires):
+        timer.expires = expires
+        ticks = expires - self.current_tick
+        level = 0
+        while ticks >= 1 << (WHEEL_BITS * (level + 1)) and level < WHEEL_LEVELS - 1:
+            level += 1
+        bucket = self.levels[level][(expires >> (WHEEL_BITS * level)) & WHEEL_MASK]
+        bucket.add(timer)
+        timer.bucket = bucket
+        self.timer_count += 1
+
+    def cascade(self, level):
+        # moves a higher level slot's timers down now that they're within its reach
+        bucket = self.levels[level][(self.current_tick >> (WHEEL_BITS * level)) & WHEEL_MASK]
+        timers = list(bucket)
+        bucket.clear()
+        for timer in timers:
+            self.timer_count -= 1
+            self.insert(timer, timer.expires)
+        return (self.current_tick >> (WHEEL_BITS * level)) & WHEEL_MASK == 0
+
+    def advance(self, now=None):
+        """Runs every tick up to now and returns how many timers fired"""
+
+        if now is None:
+            now = self.clock()
+        target_tick = int((now - self.started_at) / self.resolution)
+        fired = 0
+        while self.current_tick < target_tick:
+            self.current_tick += 1
+            if self.current_tick & WHEEL_MASK == 0:
+                level = 1
+                while self.cascade(level) and level < WHEEL_LEVELS - 1:
+                    level += 1
+            bucket = self.levels[0][self.current_tick & WHEEL_MASK]
+            # popped one at a time, so a callback can cancel another timer due on this tick
+            while bucket:
+                timer = bucket.pop()
+                timer.bucket = None
+                self.timer_count -= 1
+                if timer.interval is not None:
+                    # counted from this tick rather than the clock, so a late advance() doesn't push it back
+                    ticks = int(self.period(timer) / self.resolution + 0.5)
+                    self.insert(timer, self.current_tick + min(max(ticks, 1), MAX_TICKS))
+                try:
+                    timer.callback(*timer.args)
+                except Exception: # pylint: disable=broad-except
+                    # one bad callback mustn't strand the rest of the tick's timers
+                    LOGGER.exception("Timer callback %s failed", timer.callback)
+                fired += 1
+        return fired
@@ -1,13 +1,22 @@
 import struct
 import socket
 from .packing_tools import bytes_to_short, bytes_to_integer
+from .chopper import BufferChopper
+
+TLV_HEADER = struct.Struct("!HH")
 
 def pack_tlv(key, value):
-    return struct.pack("!HH", key, len(value)) + value
+    return TLV_HEADER.pack(key, len(value)) + value
 
 def parse_tlv(tlv):
-    key, value_length = struct.unpack("!HH", tlv[:4])
-    value = tlv[4:]
+    key, value_length = TLV_HEADER.unpack_from(tlv)
+    value = tlv[TLV_HEADER.size:]
     if len(value) != value_length:
         raise Exception("Got TLV with value of bad length: %s" % tlv)
     return key, value
+
+def iterate_tlvs(buffer, offset=0, end=None):
+    # yields (key, value) with value as a memoryview into buffer
+    for tlv in BufferChopper(4, 2, 0, buffer, offset, end):
+        key, value_length = TLV_HEADER.unpack_from(tlv)
+        yield key, tlv[TLV_HEADER.size:]
@@ -0,0 +1,95 @@
+from time import monotonic
+from itertools import count
+import heapq
+
+from .metrics import Histogram
+
+# seconds, from 10us up to 1s
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+class PduTrace(object):
+    """Timestamps for one PDU on its way through a session
+
+    Every stamp() records when a stage finished, so the time spent in a
+    stage is the gap since the stamp before it. Stages can be stamped more
+    than once (one state_machine and pack stamp per message) and their gaps
+    are added up.
+    """
+
+    __slots__ = ("session_name", "length", "stamps")
+
+    def __init__(self, session_name, length, read_at):
+        self.session_name = session_name
+        self.length = length
+        self.stamps = [("read", read_at)]
+
+    def stamp(self, stage):
+        self.stamps.append((stage, monotonic()))
+
+    @property
+    def total(self):
+        return self.stamps[-1][1] - self.stamps[0][1]
+
+    def stage_durations(self):
+        durations = {}
+        previous = self.stamps[0][1]
+        for stage, timestamp in self.stamps[1:]:
+            durations[stage] = durations.get(stage, 0.0) + timestamp - previous
+            previous = timestamp
+        return durations
+
+    def to_dict(self):
+        return {
+            "session": self.session_name,
+            "length": self.length,
+            "total": self.total,
+            "stages": self.stage_durations(),
+        }
+
+class Tracer(object):
+    """Opt-in, sampled latency tracing for inbound PDUs
+
+    One PDU in every sample_every is traced, and 0 turns tracing off. A
+    disabled tracer costs sessions one attribute check per PDU. Finished
+    traces feed the session's per-stage histograms, and the slowest ones
+    are kept so they can be dumped later.
+    """
+
+    def __init__(self, sample_every=0, slowest_count=32):
+        self.sample_every = sample_every
+        self.slowest_count = slowest_count
+        self.countdown = sample_every
+        # min-heap on total time, so the fastest of the kept traces is the one to go
+        self.slowest = []
+        self.sequence = count()
+        self.traces_finished = 0
+
+    def sample(self):
+        self.countdown -= 1
+        if self.countdown > 0:
+            return False
+        self.countdown = self.sample_every
+        return True
+
+    def finish(self, trace, stage_latencies):
+        for stage, duration in trace.stage_durations().items():
+            histogram = stage_latencies.get(stage)
+            if histogram is None:
+                histogram = stage_latencies[stage] = Histogram(STAGE_BUCKETS)
+            histogram.observe(duration)
+        self.traces_finished += 1
+        entry = (trace.total, next(self.sequence), trace)
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, entry)
+        elif entry[0] > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def slowest_traces(self):
+        return [entry[2].to_dict() for entry in sorted(self.slowest, reverse=True)]
+
+def summarise_latencies(stage_latencies):
+    return dict((stage, {
+        "count": histogram.count,
+        "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+        "buckets": dict(zip([str(x) for x in histogram.upper_bounds] + ["+Inf"], histogram.bucket_counts)),
+    }) for stage, histogram in stage_latencies.items())